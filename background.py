@@ -0,0 +1,224 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import get_instrumentation
+
+# Rows handed to the UI per batch, and how often the Tk thread checks for results (ms)
+DEFAULT_BATCH_SIZE = 500
+POLL_INTERVAL = 25
+
+# How often the Tk thread checks for callbacks posted from other threads while
+# no task is running (ms)
+IDLE_POLL_INTERVAL = 250
+
+
+class QueryTask:
+    """Handle for a submitted query that the UI can cancel"""
+
+    def __init__(self, key, quiet=False):
+        self.key = key
+        self.quiet = quiet
+        self._cancelled = threading.Event()
+        self._report = None
+        self.started = time.perf_counter()
+        self.rows = 0
+
+    def report_progress(self, value):
+        """Pass value to the task's on_progress callback on the Tk thread"""
+        if self._report is not None:
+            self._report(value)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+
+class QueryExecutor:
+    """Run database reads and row formatting on worker threads
+
+    Results are passed back to the Tk thread through a queue polled with
+    root.after, because Tk widgets may only be touched from the thread
+    running the mainloop. Submitting a new task with the same key cancels
+    the previous one, and any of its results still queued are dropped.
+
+    Each task's time from submission to its final result is recorded as
+    "task:<key>", and the time its callbacks spend updating widgets as
+    "ui:<key>". Quiet tasks, such as periodic checks, are left out of both
+    and of the busy count; their statements are still timed. Polling
+    slows to IDLE_POLL_INTERVAL while no task is running but never stops,
+    so callbacks posted from other threads are always delivered.
+    """
+
+    def __init__(self, root, max_workers=4, batch_size=DEFAULT_BATCH_SIZE):
+        self.root = root
+        self.batch_size = batch_size
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="easylogipro-query")
+        self._results = queue.Queue()
+        self._latest = {}
+        self._active = set()
+        self._busy_listeners = []
+        self._poll_lock = threading.Lock()
+        self._poll_id = None
+        self._poll_interval = None
+        self._wake = False
+        self._closed = False
+        # Keep a slow poll going so callbacks posted between tasks are delivered
+        self._schedule_poll(IDLE_POLL_INTERVAL)
+
+    def add_busy_listener(self, callback):
+        """Call callback(active_task_count) on the Tk thread whenever it changes"""
+        self._busy_listeners.append(callback)
+
+    def submit(self, key, work, on_result=None, on_batch=None, on_error=None, on_progress=None, quiet=False):
+        """Run work(task) on a worker thread
+
+        With on_batch, work must return an iterable of rows; they are passed
+        to on_batch(rows) in batches as they are produced, followed by
+        on_result(None). Otherwise the return value of work is passed to
+        on_result(value). Exceptions are passed to on_error(exception), and
+        values given to task.report_progress() to on_progress(value). A
+        quiet task does not show as busy and its callbacks are not timed.
+        """
+        previous = self._latest.get(key)
+        if previous is not None:
+            previous.cancel()
+            self._active.discard(previous)
+
+        task = QueryTask(key, quiet)
+        if on_progress is not None:
+            task._report = lambda value: self._results.put((task, on_progress, value, False))
+        self._latest[key] = task
+        self._active.add(task)
+        self._notify_busy()
+
+        self._pool.submit(self._run, task, work, on_result, on_batch, on_error)
+        self._schedule_poll()
+        return task
+
+    def post(self, callback, value=None):
+        """Call callback(value) on the Tk thread; safe to call from any thread
+
+        Called on the Tk thread, this schedules a poll like submit does.
+        Other threads may not call root.after; their callbacks are picked
+        up by the poll that always runs, within IDLE_POLL_INTERVAL ms while
+        no task is running, and a flag makes a post that races with a poll
+        get another one at once.
+        """
+        self._results.put((None, callback, value, False))
+        if threading.current_thread() is threading.main_thread():
+            self._schedule_poll()
+        else:
+            with self._poll_lock:
+                self._wake = True
+
+    def cancel(self, key):
+        """Cancel the running task with the given key, if any"""
+        task = self._latest.get(key)
+        if task is not None:
+            task.cancel()
+            self._finish(task)
+
+    def shutdown(self):
+        self._closed = True
+        if self._poll_id is not None:
+            self.root.after_cancel(self._poll_id)
+            self._poll_id = None
+        for task in list(self._active):
+            task.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, task, work, on_result, on_batch, on_error):
+        result = None
+        try:
+            if task.cancelled:
+                return
+            result = work(task)
+
+            if on_batch is not None:
+                batch = []
+                for row in result:
+                    if task.cancelled:
+                        return
+                    batch.append(row)
+                    if len(batch) >= self.batch_size:
+                        self._results.put((task, on_batch, batch, False))
+                        batch = []
+                if batch:
+                    self._results.put((task, on_batch, batch, False))
+                result = None
+
+            self._results.put((task, on_result, result, True))
+        except Exception as e:
+            self._results.put((task, on_error, e, True))
+        finally:
+            # Release the cursor behind a generator that was abandoned early
+            if hasattr(result, 'close'):
+                result.close()
+
+    def _schedule_poll(self, interval=POLL_INTERVAL):
+        """Make sure a poll is due within interval ms; Tk thread only"""
+        if self._closed:
+            return
+        if self._poll_id is not None:
+            if self._poll_interval <= interval:
+                return
+            self.root.after_cancel(self._poll_id)
+        self._poll_interval = interval
+        self._poll_id = self.root.after(interval, self._poll)
+
+    def _poll(self):
+        """Deliver queued results on the Tk thread"""
+        self._poll_id = None
+        with self._poll_lock:
+            self._wake = False
+        try:
+            while True:
+                task, callback, value, final = self._results.get_nowait()
+                if task is None:
+                    callback(value)
+                    continue
+                if final:
+                    self._finish(task)
+                if task.cancelled:
+                    continue
+                if callback is not None:
+                    if task.quiet:
+                        callback(value)
+                    else:
+                        self._deliver(task, callback, value)
+                if final and not task.quiet:
+                    get_instrumentation().record(f"task:{task.key}", time.perf_counter() - task.started,
+                                                 task.rows)
+        except queue.Empty:
+            pass
+        finally:
+            with self._poll_lock:
+                woken = self._wake
+            self._schedule_poll(POLL_INTERVAL if self._active or woken else IDLE_POLL_INTERVAL)
+
+    def _deliver(self, task, callback, value):
+        """Run a callback on the Tk thread, timing the widget updates it makes"""
+        rows = len(value) if isinstance(value, list) else None
+        started = time.perf_counter()
+        try:
+            callback(value)
+        finally:
+            get_instrumentation().record(f"ui:{task.key}", time.perf_counter() - started, rows)
+            task.rows += rows or 0
+
+    def _finish(self, task):
+        if self._latest.get(task.key) is task:
+            del self._latest[task.key]
+        if task in self._active:
+            self._active.discard(task)
+            self._notify_busy()
+
+    def _notify_busy(self):
+        active = sum(1 for task in self._active if not task.quiet)
+        for callback in list(self._busy_listeners):
+            callback(active)
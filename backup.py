@@ -0,0 +1,333 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import zipfile
+from datetime import datetime
+
+from database import get_db, configure
+
+# Where backups are written, how many incremental backups follow each full
+# backup, and how many full backups (with their incrementals) are kept
+BACKUP_DIR = 'backups'
+INCREMENTALS_PER_FULL = 6
+KEEP_FULL_BACKUPS = 4
+
+# Bytes of the per-page digest stored in each backup
+PAGE_HASH_SIZE = 16
+
+BACKUP_PREFIX = 'easylogipro_'
+BACKUP_SUFFIX = '.zip'
+
+
+class BackupError(Exception):
+    """Raised when a backup is missing, damaged or does not match its manifest"""
+
+
+def _page_hash(page):
+    return hashlib.blake2b(page, digest_size=PAGE_HASH_SIZE).digest()
+
+
+def _remove_database_files(path):
+    """Delete a temporary database along with any journal files SQLite left next to it"""
+    for suffix in ('', '-journal', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def list_backups(backup_dir=BACKUP_DIR):
+    """Return the paths of all backups in backup_dir, oldest first"""
+    if not os.path.isdir(backup_dir):
+        return []
+    names = sorted(name for name in os.listdir(backup_dir)
+                   if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX))
+    return [os.path.join(backup_dir, name) for name in names]
+
+
+def read_manifest(path):
+    """Return the manifest of a backup, with its page hashes under 'hashes'"""
+    try:
+        with zipfile.ZipFile(path) as zf:
+            manifest = json.loads(zf.read('manifest.json'))
+            manifest['hashes'] = zf.read('hashes.bin')
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        raise BackupError(f"Cannot read backup {path}: {e}")
+    return manifest
+
+
+def backup_chain(path):
+    """Return (path, manifest) for the full backup behind path and each incremental up to it"""
+    chain = []
+    while path is not None:
+        manifest = read_manifest(path)
+        chain.append((path, manifest))
+        parent = manifest.get('parent')
+        if parent is None:
+            break
+        path = os.path.join(os.path.dirname(path), parent)
+        if not os.path.exists(path):
+            raise BackupError(f"Backup {manifest['name']} depends on missing backup {parent}")
+    chain.reverse()
+    return chain
+
+
+def _write_backup(snapshot_path, path, page_size, parent, progress=None):
+    """Compress the pages of a snapshot that differ from the parent backup into path"""
+    parent_hashes = parent['hashes'] if parent is not None else None
+    page_count = os.path.getsize(snapshot_path) // page_size
+    hashes = bytearray()
+    changed = []
+
+    temp_path = path + ".part"
+    try:
+        with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            with open(snapshot_path, 'rb') as snapshot, zf.open('pages.bin', 'w', force_zip64=True) as pages:
+                for number in range(page_count):
+                    page = snapshot.read(page_size)
+                    digest = _page_hash(page)
+                    hashes += digest
+
+                    offset = number * PAGE_HASH_SIZE
+                    if parent_hashes is None or parent_hashes[offset:offset + PAGE_HASH_SIZE] != digest:
+                        pages.write(page)
+                        changed.append(number)
+
+                    if progress is not None and number % 1024 == 0:
+                        progress("Compressing", number, page_count)
+
+            zf.writestr('hashes.bin', bytes(hashes))
+            manifest = {
+                'name': os.path.basename(path),
+                'kind': 'full' if parent is None else 'incremental',
+                'parent': parent['name'] if parent is not None else None,
+                'sequence': parent['sequence'] + 1 if parent is not None else 0,
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'page_size': page_size,
+                'page_count': page_count,
+                # A full backup holds every page in order
+                'changed': changed if parent is not None else None,
+            }
+            zf.writestr('manifest.json', json.dumps(manifest))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return manifest
+
+
+def create_backup(db=None, backup_dir=BACKUP_DIR, full=False, incrementals_per_full=INCREMENTALS_PER_FULL,
+                  keep_full=KEEP_FULL_BACKUPS, progress=None):
+    """Back up the database and return the path of the new backup
+
+    A consistent snapshot is first taken with the online backup API. Its
+    pages are then compared with the page hashes of the latest backup and
+    only the pages that changed are stored, deflate-compressed. Every
+    incrementals_per_full backups (or when full is set) a new full backup
+    starts a fresh chain, and only the newest keep_full chains are kept.
+    progress(stage, done, total) is called as the backup proceeds.
+    """
+    db = db or get_db()
+    os.makedirs(backup_dir, exist_ok=True)
+
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    snapshot_path = os.path.join(backup_dir, f".snapshot_{stamp}.db")
+
+    try:
+        page_size = db.backup(snapshot_path, progress=(lambda done, total: progress("Copying", done, total))
+                              if progress is not None else None)
+
+        parent = None
+        backups = list_backups(backup_dir)
+        if backups and not full:
+            try:
+                parent = read_manifest(backups[-1])
+            except BackupError:
+                parent = None
+            # Start a new chain after enough incrementals or if the page size changed
+            if parent is not None and (parent['sequence'] >= incrementals_per_full
+                                       or parent['page_size'] != page_size):
+                parent = None
+
+        kind = 'full' if parent is None else 'incr'
+        path = os.path.join(backup_dir, f"{BACKUP_PREFIX}{stamp}_{kind}{BACKUP_SUFFIX}")
+        suffix = 1
+        while os.path.exists(path):
+            path = os.path.join(backup_dir, f"{BACKUP_PREFIX}{stamp}_{kind}_{suffix}{BACKUP_SUFFIX}")
+            suffix += 1
+
+        _write_backup(snapshot_path, path, page_size, parent, progress)
+    finally:
+        _remove_database_files(snapshot_path)
+
+    prune_backups(backup_dir, keep_full)
+    return path
+
+
+def prune_backups(backup_dir=BACKUP_DIR, keep_full=KEEP_FULL_BACKUPS):
+    """Delete all but the newest keep_full full backups and their incrementals"""
+    backups = list_backups(backup_dir)
+    fulls = []
+    for path in backups:
+        try:
+            if read_manifest(path)['kind'] == 'full':
+                fulls.append(path)
+        except BackupError:
+            continue
+
+    if len(fulls) <= keep_full:
+        return []
+
+    # Everything before the oldest full backup being kept belongs to a dropped chain
+    removed = backups[:backups.index(fulls[-keep_full])]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def rebuild_database(path, target_path, progress=None):
+    """Reassemble the database stored in a backup chain into target_path
+
+    Returns the manifest of the backup at path.
+    """
+    chain = backup_chain(path)
+    final = chain[-1][1]
+    page_size = final['page_size']
+
+    try:
+        with open(target_path, 'wb') as target:
+            for step, (backup_path, manifest) in enumerate(chain):
+                if manifest['page_size'] != page_size:
+                    raise BackupError(f"Backup {manifest['name']} has a different page size")
+
+                numbers = manifest['changed'] if manifest['changed'] is not None else range(manifest['page_count'])
+                with zipfile.ZipFile(backup_path) as zf, zf.open('pages.bin') as pages:
+                    for number in numbers:
+                        page = pages.read(page_size)
+                        if len(page) != page_size:
+                            raise BackupError(f"Backup {manifest['name']} is truncated")
+                        target.seek(number * page_size)
+                        target.write(page)
+
+                if progress is not None:
+                    progress("Rebuilding", step + 1, len(chain))
+
+            target.truncate(final['page_count'] * page_size)
+    except zipfile.BadZipFile as e:
+        raise BackupError(f"Backup {path} is damaged: {e}")
+
+    return final
+
+
+def _check_database(path, manifest, progress=None):
+    """Compare a rebuilt database with its manifest and run SQLite's integrity check"""
+    page_size = manifest['page_size']
+    hashes = manifest['hashes']
+
+    with open(path, 'rb') as rebuilt:
+        for number in range(manifest['page_count']):
+            offset = number * PAGE_HASH_SIZE
+            if _page_hash(rebuilt.read(page_size)) != hashes[offset:offset + PAGE_HASH_SIZE]:
+                raise BackupError(f"Page {number + 1} of {manifest['name']} does not match its checksum")
+            if progress is not None and number % 1024 == 0:
+                progress("Verifying", number, manifest['page_count'])
+
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchall()
+    except sqlite3.DatabaseError as e:
+        raise BackupError(f"{manifest['name']} is not a valid database: {e}")
+    finally:
+        conn.close()
+
+    if result != [('ok',)]:
+        raise BackupError(f"{manifest['name']} failed the integrity check: {result[0][0]}")
+
+
+def verify_backup(path, progress=None):
+    """Rebuild a backup in a temporary file and check it, raising BackupError if it is damaged
+
+    Returns the manifest of the verified backup.
+    """
+    temp_path = path + ".verify"
+    try:
+        manifest = rebuild_database(path, temp_path, progress)
+        _check_database(temp_path, manifest, progress)
+    finally:
+        _remove_database_files(temp_path)
+    return manifest
+
+
+def restore_backup(path, db=None, progress=None):
+    """Verify a backup and copy it over the live database
+
+    Returns the manifest of the restored backup.
+    """
+    from migrations import migrate
+
+    db = db or get_db()
+    temp_path = path + ".restore"
+    try:
+        manifest = rebuild_database(path, temp_path, progress)
+        _check_database(temp_path, manifest, progress)
+        db.restore(temp_path, progress=(lambda done, total: progress("Restoring", done, total))
+                   if progress is not None else None)
+    finally:
+        _remove_database_files(temp_path)
+
+    # Backups taken by older versions are brought up to the current schema
+    migrate(db)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Back up, verify and restore the EasyLogiPro database")
+    parser.add_argument('--db', help="database file (default: $EASYLOGIPRO_DB or easylogipro.db)")
+    parser.add_argument('--dir', default=BACKUP_DIR, help="backup directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backup_parser = commands.add_parser('backup', help="take a backup")
+    backup_parser.add_argument('--full', action='store_true', help="start a new full backup chain")
+    backup_parser.add_argument('--keep', type=int, default=KEEP_FULL_BACKUPS,
+                               help="full backups to keep, with their incrementals")
+    commands.add_parser('list', help="list backups")
+    verify_parser = commands.add_parser('verify', help="check that a backup can be restored")
+    verify_parser.add_argument('backup', nargs='?', help="backup file (default: the latest)")
+    restore_parser = commands.add_parser('restore', help="replace the database with a backup")
+    restore_parser.add_argument('backup', help="backup file")
+
+    args = parser.parse_args(argv)
+    db = configure(args.db) if args.db else get_db()
+
+    try:
+        if args.command == 'backup':
+            print(create_backup(db, args.dir, full=args.full, keep_full=args.keep))
+        elif args.command == 'list':
+            for path in list_backups(args.dir):
+                manifest = read_manifest(path)
+                changed = manifest['page_count'] if manifest['changed'] is None else len(manifest['changed'])
+                print(f"{manifest['name']}\t{manifest['kind']}\t{changed}/{manifest['page_count']} pages")
+        elif args.command == 'verify':
+            backups = list_backups(args.dir)
+            path = args.backup or (backups[-1] if backups else None)
+            if path is None:
+                raise BackupError(f"No backups in {args.dir}")
+            manifest = verify_backup(path)
+            print(f"{manifest['name']}: OK ({manifest['page_count']} pages)")
+        elif args.command == 'restore':
+            manifest = restore_backup(args.backup, db)
+            print(f"Restored {manifest['name']} to {db.path}")
+    except BackupError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,399 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from database import Database
+from migrations import MIGRATIONS, LATEST_VERSION, migrate, schema_version
+from exporters import export_query_to_csv
+from formatting import (format_aging, format_balance, format_inventory_item, format_maintenance_record,
+                        format_payment, format_trip, format_trip_report_row, format_transaction, to_day_number)
+from paging import KeysetPager
+from trip_filters import TripFilter
+import reports
+
+# Where generated databases are kept between runs, and the stored baseline results
+BENCH_DATA_DIR = 'bench_data'
+BASELINE_PATH = 'benchmark_baseline.json'
+
+DEFAULT_SCALES = (10_000,)
+DEFAULT_SEED = 42
+DEFAULT_REPEAT = 3
+
+# A benchmark regresses when its time or peak memory exceeds the baseline by more than
+# this fraction; slowdowns under MIN_SLOWDOWN seconds are timer noise and never count
+DEFAULT_TOLERANCE = 0.25
+MIN_SLOWDOWN = 0.01
+
+# Rows generated per transaction
+GENERATE_BATCH_SIZE = 50_000
+
+# Generated data: trips end on this date and span this many days
+LAST_DATE = date(2024, 12, 31)
+DATE_SPAN_DAYS = 3 * 365
+
+TOWNS = ['Dar es Salaam', 'Arusha', 'Mwanza', 'Dodoma', 'Mbeya', 'Morogoro', 'Tanga', 'Moshi',
+         'Tabora', 'Kigoma', 'Iringa', 'Mtwara', 'Songea', 'Musoma', 'Shinyanga', 'Singida']
+CARGO_TYPES = ['Cement', 'Fuel', 'Maize', 'Rice', 'Sugar', 'Fertilizer', 'Timber', 'Steel',
+               'Containers', 'Coffee', 'Cotton', 'Livestock Feed', 'Building Materials', 'Beverages']
+SERVICES = ['Oil change', 'Tyre replacement', 'Brake pads', 'Engine service', 'Gearbox repair',
+            'Wheel alignment', 'Battery replacement', 'Clutch plate', 'Radiator flush', 'Annual inspection']
+ITEMS = ['Tyre', 'Engine Oil', 'Oil Filter', 'Air Filter', 'Brake Pad', 'Battery', 'Fuel Filter',
+         'Wiper Blade', 'Headlamp', 'Fan Belt', 'Spark Plug', 'Coolant', 'Grease', 'Tarpaulin', 'Strap']
+
+
+def table_sizes(scale):
+    """Return the rows generated per table for a scale, which is the number of trips"""
+    return {
+        'trips': scale,
+        'customer_transactions': scale // 2,
+        'maintenance': max(scale // 20, 1),
+        'inventory': max(min(scale // 100, 50_000), 1),
+    }
+
+
+def _day(rng):
+    return (LAST_DATE - timedelta(days=rng.randrange(DATE_SPAN_DAYS))).isoformat()
+
+
+def _amount(rng, low, high):
+    return round(rng.uniform(low, high), 2)
+
+
+def _generate_trips(rng, count):
+    # Driver, client and route pools grow with the data, as they would in a real fleet
+    drivers = [f"Driver {i:05d}" for i in range(max(count // 2000, 20))]
+    clients = [f"Client {i:05d} Ltd" for i in range(max(count // 500, 50))]
+    routes = [f"{a} - {b}" for a in TOWNS for b in TOWNS if a != b]
+
+    for _ in range(count):
+        income = _amount(rng, 200_000, 5_000_000)
+        yield (_day(rng), rng.choice(clients), rng.choice(CARGO_TYPES), rng.choice(routes),
+               income, round(income * rng.uniform(0.15, 0.45), 2), rng.choice(drivers))
+
+
+def _generate_transactions(rng, count):
+    customers = [f"Client {i:05d} Ltd" for i in range(max(count // 250, 50))]
+
+    for _ in range(count):
+        # Roughly two invoices for every payment
+        if rng.random() < 0.65:
+            yield (rng.choice(customers), _day(rng), _amount(rng, 100_000, 3_000_000), 0.0)
+        else:
+            yield (rng.choice(customers), _day(rng), 0.0, _amount(rng, 100_000, 3_000_000))
+
+
+def _generate_maintenance(rng, count):
+    plates = [f"T {i:03d} {chr(65 + i % 26)}{chr(65 + i // 26 % 26)}{chr(65 + i // 676 % 26)}"
+              for i in range(max(count // 50, 10))]
+
+    for _ in range(count):
+        yield (rng.choice(plates), _day(rng), rng.choice(SERVICES), _amount(rng, 20_000, 2_000_000))
+
+
+def _generate_inventory(rng, count):
+    for i in range(count):
+        purchase = _amount(rng, 5_000, 800_000)
+        yield (f"{ITEMS[i % len(ITEMS)]} {i:05d}", rng.randrange(0, 200), purchase,
+               round(purchase * rng.uniform(1.1, 1.6), 2))
+
+
+GENERATORS = [
+    ('trips', '''INSERT INTO trips (date, client_name, cargo_type, route, trip_income, fuel_expenses, driver_name)
+                 VALUES (?, ?, ?, ?, ?, ?, ?)''', _generate_trips),
+    ('customer_transactions', '''INSERT INTO customer_transactions (customer_name, date, amount_owed, amount_paid)
+                                 VALUES (?, ?, ?, ?)''', _generate_transactions),
+    ('maintenance', '''INSERT INTO maintenance (vehicle_plate_number, service_date, description, cost)
+                       VALUES (?, ?, ?, ?)''', _generate_maintenance),
+    ('inventory', '''INSERT INTO inventory (item_name, quantity, purchase_price, sale_price)
+                     VALUES (?, ?, ?, ?)''', _generate_inventory),
+]
+
+
+def generate_database(path, scale, seed=DEFAULT_SEED, progress=None):
+    """Create a database at path filled with deterministic synthetic data
+
+    The same scale and seed always produce the same rows. Rows are
+    inserted into the base tables before the later migrations run, so the
+    indexes, summaries and search index are built once in bulk by the
+    migrations' own backfills instead of row by row through the triggers.
+    progress(table, rows_done, rows_total) is called after each batch.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+
+    db = Database(path)
+    try:
+        version, _, create_base_tables = MIGRATIONS[0]
+        with db.transaction() as cursor:
+            create_base_tables(cursor)
+            cursor.execute(f"PRAGMA user_version = {version}")
+
+        rng = random.Random(seed)
+        sizes = table_sizes(scale)
+        for table, sql, generate in GENERATORS:
+            rows = generate(rng, sizes[table])
+            done = 0
+            while done < sizes[table]:
+                batch = [row for _, row in zip(range(GENERATE_BATCH_SIZE), rows)]
+                with db.transaction() as cursor:
+                    cursor.executemany(sql, batch)
+                done += len(batch)
+                if progress is not None:
+                    progress(table, done, sizes[table])
+
+        migrate(db)
+    finally:
+        db.close()
+
+
+def bench_database(scale, seed=DEFAULT_SEED, data_dir=BENCH_DATA_DIR, progress=None):
+    """Return an open database for a scale, generating it on first use"""
+    path = os.path.join(data_dir, f"easylogipro_{scale}_{seed}.db")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        generate_database(path + ".part", scale, seed, progress)
+        os.replace(path + ".part", path)
+
+    db = Database(path)
+    if schema_version(db) < LATEST_VERSION:
+        migrate(db)
+    return db
+
+
+# Each benchmark repeats what a GUI path does, minus the Treeview, and returns the rows it produced
+
+def _first_trip_page(db, trip_filter):
+    where, params = trip_filter.where()
+    pager = KeysetPager(db, "trips", reports.TRIP_COLUMNS, key=("date", "id"), where=where, params=params)
+    rows = [format_trip(trip) for trip in pager.first_page()]
+    db.query_one(*trip_filter.summary_query())
+    return len(rows)
+
+
+def bench_load_trips(db, workdir):
+    rows = _first_trip_page(db, TripFilter())
+    db.query("SELECT name FROM drivers ORDER BY name")
+    return rows
+
+
+def bench_filter_trips(db, workdir):
+    # A month of one cargo type, then a client over the whole range, then a word search
+    client = db.query_one("SELECT client_name FROM trips ORDER BY id LIMIT 1")[0]
+    return (_first_trip_page(db, TripFilter(date_from='2024-06-01', date_to='2024-06-30', cargo='Cement'))
+            + _first_trip_page(db, TripFilter(client=client))
+            + _first_trip_page(db, TripFilter(search='cement arusha')))
+
+
+def bench_load_driver_payments(db, workdir):
+    rows = [format_payment(payment) for payment in db.query(reports.PAYMENTS_QUERY)]
+    reports.driver_payment_totals(db)
+    return len(rows)
+
+
+def bench_load_transactions(db, workdir):
+    return sum(1 for _ in map(format_transaction, db.reader.execute(reports.TRANSACTIONS_QUERY)))
+
+
+def bench_load_balances(db, workdir):
+    return sum(1 for row in db.reader.execute(reports.BALANCES_QUERY) if format_balance(*row))
+
+
+def bench_load_aging(db, workdir):
+    # The window query itself; the GUI's cache would answer repeats without it
+    as_of = to_day_number(LAST_DATE)
+    return sum(1 for _ in map(format_aging, db.reader.execute(reports.AGING_QUERY, (as_of,))))
+
+
+def bench_load_maintenance(db, workdir):
+    return sum(1 for _ in map(format_maintenance_record, db.reader.execute(reports.MAINTENANCE_QUERY)))
+
+
+def bench_load_inventory(db, workdir):
+    rows = sum(1 for _ in map(format_inventory_item, db.reader.execute(reports.INVENTORY_QUERY)))
+    reports.low_stock_items(db=db)
+    return rows
+
+
+def bench_export_trips_csv(db, workdir):
+    pager = KeysetPager(db, "trips", reports.TRIP_COLUMNS, key=("date", "id"))
+    return export_query_to_csv(db, *pager.query(), os.path.join(workdir, "trips.csv"), reports.TRIP_HEADERS,
+                               format_row=format_trip)
+
+
+def bench_export_trips_pdf(db, workdir):
+    from reportlab.lib.pagesizes import landscape, letter
+    from pdf_reports import export_query_to_pdf
+
+    # One month of trips, so the PDF stays a realistic size at every scale
+    where, params = TripFilter(date_from='2024-06-01', date_to='2024-06-30').where()
+    pager = KeysetPager(db, "trips", reports.TRIP_COLUMNS, key=("date", "id"), where=where, params=params)
+    return export_query_to_pdf(db, *pager.query(), os.path.join(workdir, "trips.pdf"), "Trip Report",
+                               reports.TRIP_HEADERS[1:], format_row=format_trip_report_row,
+                               col_widths=[2, 3, 2, 4, 2, 2, 3], subtotals={4: 5, 5: 6},
+                               pagesize=landscape(letter))
+
+
+def bench_export_payments_pdf(db, workdir):
+    from pdf_reports import export_query_to_pdf
+
+    return export_query_to_pdf(db, reports.PAYMENTS_QUERY, (), os.path.join(workdir, "payments.pdf"),
+                               "Driver Payments Report", reports.PAYMENT_HEADERS, format_row=format_payment,
+                               col_widths=[3, 2, 2, 2, 2], subtotals={1: 1, 2: 2, 3: 3, 4: 4}, count_columns=(1,),
+                               trailer=[reports.driver_payment_totals(db)])
+
+
+BENCHMARKS = {
+    'load_trips': bench_load_trips,
+    'filter_trips': bench_filter_trips,
+    'load_driver_payments': bench_load_driver_payments,
+    'load_transactions': bench_load_transactions,
+    'load_balances': bench_load_balances,
+    'load_aging': bench_load_aging,
+    'load_maintenance': bench_load_maintenance,
+    'load_inventory': bench_load_inventory,
+    'export_trips_csv': bench_export_trips_csv,
+    'export_trips_pdf': bench_export_trips_pdf,
+    'export_payments_pdf': bench_export_payments_pdf,
+}
+
+
+def run_benchmark(benchmark, db, workdir, repeat=DEFAULT_REPEAT):
+    """Time a benchmark and measure its peak Python memory
+
+    A warm-up run first loads modules and fills SQLite's page cache, then
+    one run measures the peak with tracemalloc (which would slow down the
+    timed runs), and the time is the fastest of repeat further runs.
+    Returns {'rows', 'seconds', 'median_seconds', 'peak_kib'}.
+    """
+    rows = benchmark(db, workdir)
+
+    tracemalloc.start()
+    try:
+        benchmark(db, workdir)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        benchmark(db, workdir)
+        timings.append(time.perf_counter() - start)
+
+    return {'rows': rows, 'seconds': round(min(timings), 6), 'median_seconds': round(statistics.median(timings), 6),
+            'peak_kib': round(peak / 1024, 1)}
+
+
+def run_suite(scale, names=None, seed=DEFAULT_SEED, repeat=DEFAULT_REPEAT, data_dir=BENCH_DATA_DIR,
+              progress=None, report=None):
+    """Run the named benchmarks (default: all) at one scale and return {name: result}"""
+    db = bench_database(scale, seed, data_dir, progress)
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for name in names or BENCHMARKS:
+                results[name] = run_benchmark(BENCHMARKS[name], db, workdir, repeat)
+                if report is not None:
+                    report(name, results[name])
+    finally:
+        db.close()
+    return results
+
+
+def load_baseline(path=BASELINE_PATH):
+    """Return the stored baseline as {scale: {name: result}}, or {} if there is none"""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """Merge results ({scale: {name: result}}) into the stored baseline"""
+    baseline = load_baseline(path)
+    for scale, benchmarks in results.items():
+        baseline.setdefault(str(scale), {}).update(benchmarks)
+
+    with open(path + ".part", 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+    os.replace(path + ".part", path)
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Compare results with the baseline and return (regressions, missing)
+
+    regressions has a message for every benchmark slower or larger than
+    its baseline by more than tolerance, and missing one for every
+    benchmark with no baseline to compare against.
+    """
+    regressions, missing = [], []
+    for scale, benchmarks in results.items():
+        for name, result in benchmarks.items():
+            base = baseline.get(str(scale), {}).get(name)
+            if base is None:
+                missing.append(f"{name} at {scale:,} rows")
+                continue
+            slowdown = result['seconds'] - base['seconds']
+            if slowdown > base['seconds'] * tolerance and slowdown > MIN_SLOWDOWN:
+                regressions.append(f"{name} at {scale:,} rows: {result['seconds'] * 1000:.1f} ms, "
+                                   f"baseline {base['seconds'] * 1000:.1f} ms (+{slowdown / base['seconds']:.0%})")
+            if result['peak_kib'] > base['peak_kib'] * (1 + tolerance):
+                regressions.append(f"{name} at {scale:,} rows: peak {result['peak_kib']:,.0f} KiB, "
+                                   f"baseline {base['peak_kib']:,.0f} KiB")
+    return regressions, missing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark EasyLogiPro's load, filter and export paths "
+                                                 "on generated data")
+    parser.add_argument('--scale', type=int, nargs='+', default=list(DEFAULT_SCALES),
+                        help="number of trips to generate; other tables are sized from it (default: 10000)")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="timed runs per benchmark")
+    parser.add_argument('--data-dir', default=BENCH_DATA_DIR, help="where generated databases are kept")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline results file")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown or memory growth before a regression is reported (default: 0.25)")
+    args = parser.parse_args(argv)
+
+    def progress(table, done, total):
+        print(f"  generating {table}: {done:,}/{total:,}", file=sys.stderr)
+
+    def report(name, result):
+        print(f"{name:<24}{result['rows']:>12,} rows{result['seconds'] * 1000:>12.1f} ms"
+              f"{result['peak_kib']:>12,.0f} KiB")
+
+    results = {}
+    for scale in args.scale:
+        print(f"Scale {scale:,} trips (seed {args.seed})")
+        results[scale] = run_suite(scale, args.only, args.seed, args.repeat, args.data_dir, progress, report)
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions, missing = compare(results, load_baseline(args.baseline), args.tolerance)
+    for message in missing:
+        print(f"WARNING no baseline for {message} in {args.baseline}; not compared", file=sys.stderr)
+    for message in regressions:
+        print(f"REGRESSION {message}", file=sys.stderr)
+
+    compared = sum(len(benchmarks) for benchmarks in results.values()) - len(missing)
+    if not compared:
+        print("ERROR nothing was compared; store a baseline first with --save-baseline", file=sys.stderr)
+        return 1
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
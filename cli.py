@@ -0,0 +1,218 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import date
+
+from database import configure, get_db
+from migrations import LATEST_VERSION, invalid_dates_warning, migrate, schema_version
+from exporters import export_query_to_csv
+from formatting import (format_aging, format_amount, format_date, format_payment, format_trip, to_day_number,
+                        to_minor_units)
+import reports
+
+# Exit statuses: success, failure, and a report that found something needing attention
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_ALERT = 2
+
+FORMATS = ("csv", "json", "pdf")
+
+
+def _write_csv(db, sql, params, headers, output, format_row=None, trailer=()):
+    if output:
+        return export_query_to_csv(db, sql, params, output, headers, format_row=format_row, trailer=trailer)
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(headers)
+    written = 0
+    for row in db.reader.execute(sql, params):
+        writer.writerow(format_row(row) if format_row is not None else row)
+        written += 1
+    writer.writerows(trailer)
+    return written
+
+
+def _write_json(db, sql, params, output):
+    """Write the rows of a query as a JSON array of objects keyed by column name"""
+    cursor = db.reader.execute(sql, params)
+    columns = [column[0] for column in cursor.description]
+    out = open(output, 'w', encoding='utf-8') if output else sys.stdout
+    written = 0
+    try:
+        out.write("[")
+        for row in cursor:
+            out.write(("," if written else "") + "\n  " + json.dumps(dict(zip(columns, row))))
+            written += 1
+        out.write("\n]\n")
+    finally:
+        cursor.close()
+        if output:
+            out.close()
+    return written
+
+
+def write_report(args, db, sql, params, title, headers, format_row=None, trailer=(), **pdf_options):
+    """Write a query in the format chosen on the command line and return the row count"""
+    if args.format == "json":
+        # Raw values, so scripts get numbers rather than formatted text; amounts are in
+        # minor units and dates are day numbers
+        return _write_json(db, sql, params, args.output)
+
+    if args.format == "pdf":
+        from pdf_reports import export_query_to_pdf
+        if not args.output:
+            raise ValueError("PDF reports need --output")
+        return export_query_to_pdf(db, sql, params, args.output, title, headers, format_row=format_row,
+                                   trailer=trailer, **pdf_options)
+
+    return _write_csv(db, sql, params, headers, args.output, format_row, trailer)
+
+
+def driver_payments(args, db):
+    write_report(args, db, reports.PAYMENTS_QUERY, (), "Driver Payments Report", reports.PAYMENT_HEADERS,
+                 format_row=format_payment, trailer=[reports.driver_payment_totals(db)],
+                 col_widths=[3, 2, 2, 2, 2], subtotals={1: 1, 2: 2, 3: 3, 4: 4}, count_columns=(1,))
+    return EXIT_OK
+
+
+def trips(args, db):
+    from paging import KeysetPager
+    from trip_filters import TripFilter
+
+    trip_filter = TripFilter(date_from=args.date_from, date_to=args.date_to, driver=args.driver,
+                             client=args.client, cargo=args.cargo, route=args.route,
+                             min_income=args.min_income, max_income=args.max_income,
+                             min_expenses=args.min_expenses, max_expenses=args.max_expenses,
+                             search=args.search)
+    where, params = trip_filter.where()
+    sql, params = KeysetPager(db, "trips", reports.TRIP_COLUMNS, key=("date", "id"),
+                              where=where, params=params).query()
+
+    if args.format == "pdf":
+        from reportlab.lib.pagesizes import landscape, letter
+        from formatting import format_trip_report_row
+        write_report(args, db, sql, params, "Trip Report", reports.TRIP_HEADERS[1:],
+                     format_row=format_trip_report_row, col_widths=[2, 3, 2, 4, 2, 2, 3],
+                     subtotals={4: 5, 5: 6}, pagesize=landscape(letter))
+    else:
+        write_report(args, db, sql, params, "Trip Report", reports.TRIP_HEADERS, format_row=format_trip)
+    return EXIT_OK
+
+
+def customer_balances(args, db):
+    write_report(args, db, reports.BALANCES_QUERY, (), "Customer Balances", reports.BALANCE_HEADERS,
+                 format_row=lambda row: (row[0], format_amount(row[1])), subtotals={1: 1})
+
+    if args.alert_over is not None:
+        over = db.query_one("SELECT COUNT(*) FROM customer_balances WHERE balance > ?", (args.alert_over,))[0]
+        if over:
+            print(f"{over} customer(s) owe more than {format_amount(args.alert_over)}", file=sys.stderr)
+            return EXIT_ALERT
+    return EXIT_OK
+
+
+def aging(args, db):
+    as_of = to_day_number(args.as_of if args.as_of is not None else date.today())
+    write_report(args, db, reports.AGING_QUERY, (as_of,), f"Customer Aging as of {format_date(as_of)}",
+                 reports.AGING_HEADERS, format_row=format_aging, col_widths=[3, 2, 2, 2, 2, 2],
+                 subtotals={1: 1, 2: 2, 3: 3, 4: 4, 5: 5})
+    return EXIT_OK
+
+
+def low_stock(args, db):
+    if args.threshold is None:
+        sql, params, level = reports.LOW_STOCK_QUERY, (), "their reorder level"
+    else:
+        sql, params, level = reports.LOW_STOCK_THRESHOLD_QUERY, (args.threshold,), f"{args.threshold}"
+
+    count = write_report(args, db, sql, params, "Low Stock Items", reports.LOW_STOCK_HEADERS)
+    if count:
+        print(f"{count} item(s) at or below {level}", file=sys.stderr)
+        return EXIT_ALERT
+    return EXIT_OK
+
+
+def rollups(args, db):
+    from rollups import format_period, period_totals_query
+
+    sql, params = period_totals_query(args.granularity, args.dimension, args.key, args.date_from, args.date_to)
+    write_report(args, db, sql, params, f"Trip Totals by {args.granularity.title()}",
+                 ["Period", args.dimension.title(), "Trips", "Income (TZS)", "Expenses (TZS)", "Net (TZS)"],
+                 format_row=lambda row: ((format_period(row[0], args.granularity),) + row[1:3]
+                                         + tuple(format_amount(value) for value in row[3:])),
+                 subtotals={2: 2, 3: 3, 4: 4, 5: 5}, count_columns=(2,))
+    return EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="EasyLogiPro reports without the GUI")
+    parser.add_argument("--db", help="database file (default: $EASYLOGIPRO_DB or easylogipro.db)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_command(name, handler, help_text):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--format", choices=FORMATS, default="csv")
+        command.add_argument("--output", "-o", help="file to write (default: standard output; required for pdf)")
+        command.set_defaults(handler=handler)
+        return command
+
+    add_command("driver-payments", driver_payments, "per-driver trip totals and payments")
+
+    command = add_command("trips", trips, "trips matching the given filters, newest first")
+    command.add_argument("--from", dest="date_from", help="first date, YYYY-MM-DD")
+    command.add_argument("--to", dest="date_to", help="last date, YYYY-MM-DD")
+    for name in ("driver", "client", "cargo", "route", "search"):
+        command.add_argument(f"--{name}")
+    for name in ("min-income", "max-income", "min-expenses", "max-expenses"):
+        command.add_argument(f"--{name}", type=to_minor_units)
+
+    command = add_command("customer-balances", customer_balances, "customers with a non-zero balance")
+    command.add_argument("--alert-over", type=to_minor_units, metavar="AMOUNT",
+                         help=f"exit with status {EXIT_ALERT} if any customer owes more than AMOUNT")
+
+    command = add_command("aging", aging, "amounts owed per customer by age: 0-30, 31-60, 61-90, over 90 days")
+    command.add_argument("--as-of", type=to_day_number, metavar="DATE", help="age as of this date (default: today)")
+
+    command = add_command("low-stock", low_stock,
+                          f"inventory at or below its reorder level; exits with status {EXIT_ALERT} if any")
+    command.add_argument("--threshold", type=int, help="compare every item with this quantity instead")
+
+    command = add_command("rollups", rollups, "trip totals per day, week or month")
+    command.add_argument("--granularity", choices=("day", "week", "month"), default="month")
+    command.add_argument("--dimension", choices=("all", "driver", "client", "route"), default="all")
+    command.add_argument("--key", help="a single driver, client or route")
+    command.add_argument("--from", dest="date_from", help="first date, YYYY-MM-DD")
+    command.add_argument("--to", dest="date_to", help="last date, YYYY-MM-DD")
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # Reports written to standard output are UTF-8 too, not the locale's code page
+    sys.stdout.reconfigure(encoding='utf-8')
+    db = configure(args.db) if args.db else get_db()
+
+    try:
+        # Only take the write lock when the schema actually needs upgrading
+        if schema_version(db) < LATEST_VERSION:
+            warning = invalid_dates_warning(db, migrate(db))
+            if warning:
+                print(f"warning: {warning}", file=sys.stderr)
+        return args.handler(args, db)
+    except BrokenPipeError:
+        # The reader (head, grep -q, ...) stopped early; not an error. Point stdout
+        # at devnull so the flush at exit does not fail again.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_OK
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,20 @@
 
 import tkinter as tk
+from datetime import date
 from tkinter import ttk, messagebox
-import sqlite3
 from tkcalendar import DateEntry
+from database import get_db
+from migrations import rebuild_customer_balances
+from reports import BALANCES_QUERY, CUSTOMER_TRANSACTIONS_QUERY, TRANSACTIONS_QUERY
+from formatting import format_aging, format_balance, format_date, format_transaction, to_day_number, to_minor_units
+from ledger import get_ledger_cache
+from background import QueryExecutor
+from treeview_utils import upsert_row, remove_row
 
 class CustomerLedger:
-    def __init__(self, parent):
+    def __init__(self, parent, executor=None):
         self.parent = parent
+        self.executor = executor or QueryExecutor(parent)
         
         # Create a notebook for transactions and balances tabs
         self.notebook = ttk.Notebook(parent)
@@ -15,17 +23,30 @@ class CustomerLedger:
         # Create tabs
         self.transactions_tab = ttk.Frame(self.notebook)
         self.balances_tab = ttk.Frame(self.notebook)
+        self.aging_tab = ttk.Frame(self.notebook)
         
         self.notebook.add(self.transactions_tab, text="Transactions")
         self.notebook.add(self.balances_tab, text="Customer Balances")
+        self.notebook.add(self.aging_tab, text="Aging")
         
-        # Initialize both tabs
+        # Initialize the tabs
         self.setup_transactions_tab()
         self.setup_balances_tab()
+        self.setup_aging_tab()
         
-        # Initial data load
+        # Initial data load; balances and aging load the first time their tab is shown
+        self.balances_loaded = False
+        self.aging_loaded = False
+        self.transactions_version = None
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         self.load_transactions()
-        self.load_balances()
+    
+    def on_tab_changed(self, event=None):
+        selected = self.notebook.select()
+        if not self.balances_loaded and selected == str(self.balances_tab):
+            self.load_balances()
+        elif not self.aging_loaded and selected == str(self.aging_tab):
+            self.load_aging()
     
     def setup_transactions_tab(self):
         # Create frames
@@ -77,6 +98,9 @@ class CustomerLedger:
         self.clear_button = ttk.Button(button_frame, text="Clear Form", command=self.clear_form)
         self.clear_button.pack(side=tk.LEFT, padx=5, pady=5)
         
+        self.refresh_button = ttk.Button(button_frame, text="Refresh", command=self.refresh_transactions)
+        self.refresh_button.pack(side=tk.RIGHT, padx=5, pady=5)
+        
         # Create Treeview for transactions
         columns = ("id", "customer_name", "date", "amount_owed", "amount_paid", "balance")
         self.tree = ttk.Treeview(table_frame, columns=columns, show="headings", selectmode="browse")
@@ -87,7 +111,7 @@ class CustomerLedger:
         self.tree.heading("date", text="Date")
         self.tree.heading("amount_owed", text="Amount Owed ($)")
         self.tree.heading("amount_paid", text="Amount Paid ($)")
-        self.tree.heading("balance", text="Balance ($)")
+        self.tree.heading("balance", text="Running Balance ($)")
         
         # Set column widths
         self.tree.column("id", width=40)
@@ -118,6 +142,9 @@ class CustomerLedger:
         self.refresh_btn = ttk.Button(control_frame, text="Refresh Balances", command=self.load_balances)
         self.refresh_btn.pack(side=tk.LEFT, padx=5, pady=5)
         
+        self.rebuild_btn = ttk.Button(control_frame, text="Check & Rebuild Balances", command=self.rebuild_balances)
+        self.rebuild_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        
         table_frame = ttk.LabelFrame(self.balances_tab, text="Customer Balances")
         table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
@@ -138,78 +165,217 @@ class CustomerLedger:
         self.balance_tree.configure(yscroll=scrollbar.set)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.balance_tree.pack(fill=tk.BOTH, expand=True)
+        
+        # Configure tags
+        self.balance_tree.tag_configure('positive', foreground='red')
+        self.balance_tree.tag_configure('negative', foreground='green')
+    
+    def setup_aging_tab(self):
+        control_frame = ttk.Frame(self.aging_tab)
+        control_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        self.refresh_aging_btn = ttk.Button(control_frame, text="Refresh Aging", command=self.load_aging)
+        self.refresh_aging_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        
+        self.aging_label = ttk.Label(control_frame, text="")
+        self.aging_label.pack(side=tk.LEFT, padx=10)
+        
+        table_frame = ttk.LabelFrame(self.aging_tab, text="Outstanding Balances by Age")
+        table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        # Create Treeview for the aging report
+        columns = ("customer_name", "days_0_30", "days_31_60", "days_61_90", "days_over_90", "total")
+        self.aging_tree = ttk.Treeview(table_frame, columns=columns, show="headings", selectmode="browse")
+        
+        # Set column headings
+        self.aging_tree.heading("customer_name", text="Customer Name")
+        self.aging_tree.heading("days_0_30", text="0-30 Days ($)")
+        self.aging_tree.heading("days_31_60", text="31-60 Days ($)")
+        self.aging_tree.heading("days_61_90", text="61-90 Days ($)")
+        self.aging_tree.heading("days_over_90", text="Over 90 Days ($)")
+        self.aging_tree.heading("total", text="Total ($)")
+        
+        # Set column widths
+        self.aging_tree.column("customer_name", width=200)
+        for column in columns[1:]:
+            self.aging_tree.column(column, width=120)
+        
+        # Add scrollbar
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.aging_tree.yview)
+        self.aging_tree.configure(yscroll=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.aging_tree.pack(fill=tk.BOTH, expand=True)
     
     def load_transactions(self):
         # Clear existing items
         for item in self.tree.get_children():
             self.tree.delete(item)
         
-        # Connect to the database
-        conn = sqlite3.connect('easylogipro.db')
-        cursor = conn.cursor()
-        
-        # Get all transactions ordered by date
-        cursor.execute("SELECT * FROM customer_transactions ORDER BY date DESC")
-        transactions = cursor.fetchall()
+        loaded = {}
         
-        # Add transactions to treeview
-        for transaction in transactions:
-            t_id, customer_name, date, amount_owed, amount_paid = transaction
-            
-            # Calculate balance for this transaction
-            balance = amount_owed - amount_paid
+        def fetch_transactions(task):
+            # Note the ledger version first, so a change made during the load is not missed
+            loaded['version'] = get_ledger_cache().version()
             
-            owed_formatted = f"{float(amount_owed):.2f}"
-            paid_formatted = f"{float(amount_paid):.2f}"
-            balance_formatted = f"{float(balance):.2f}"
+            # Get all transactions ordered by date, with running balances
+            rows = get_db().iterate(TRANSACTIONS_QUERY)
             
-            self.tree.insert("", tk.END, values=(t_id, customer_name, date, owed_formatted, 
-                                               paid_formatted, balance_formatted))
+            for transaction in rows:
+                yield self.format_transaction(transaction)
+        
+        def add_transactions(rows):
+            # Add transactions to treeview
+            for values in rows:
+                # A transaction saved while the load runs is already shown, up to date
+                if not self.tree.exists(str(values[0])):
+                    self.tree.insert("", tk.END, iid=str(values[0]), values=values)
+        
+        def done(result):
+            self.transactions_version = loaded.get('version')
         
-        conn.close()
+        # Query and format on a worker thread, filling the tree in batches
+        self.transactions_version = None
+        self.executor.submit(
+            "ledger-transactions", fetch_transactions, on_batch=add_transactions, on_result=done,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to load transactions: {str(e)}"))
+    
+    def refresh_transactions(self):
+        """Reload the transactions, unless the ledger has not changed since they were loaded"""
+        if self.transactions_version is not None and get_ledger_cache().version() == self.transactions_version:
+            return
+        self.load_transactions()
+    
+    def format_transaction(self, transaction):
+        return format_transaction(transaction)
+    
+    def show_transaction(self, transaction):
+        """Insert or move a single transaction to its place in the tree"""
+        values = self.format_transaction(transaction)
+        upsert_row(self.tree, str(values[0]), values,
+                   sort_key=lambda row: (str(row[2]), int(row[0])), descending=True)
+    
+    def refresh_running_balances(self, customer_name, changed_id=None):
+        """Show a customer's transaction changed_id, and their running balances, after a change"""
+        for transaction in get_db().query(CUSTOMER_TRANSACTIONS_QUERY, (str(customer_name),)):
+            if str(transaction[0]) == str(changed_id):
+                self.show_transaction(transaction)
+            elif self.tree.exists(str(transaction[0])):
+                self.tree.set(str(transaction[0]), "balance", self.format_transaction(transaction)[5])
+        
+        self.invalidate_aging()
     
     def load_balances(self):
+        self.balances_loaded = True
+        
         # Clear existing items
         for item in self.balance_tree.get_children():
             self.balance_tree.delete(item)
         
-        try:
-            # Connect to the database
-            conn = sqlite3.connect('easylogipro.db')
-            cursor = conn.cursor()
-            
-            # Get customer balances
-            cursor.execute('''
-            SELECT 
-                customer_name,
-                SUM(amount_owed) - SUM(amount_paid) as balance
-            FROM customer_transactions
-            GROUP BY customer_name
-            ORDER BY balance DESC
-            ''')
-            
-            balances = cursor.fetchall()
+        def fetch_balances(task):
+            # Get customer balances from the cache maintained by the ledger triggers
+            rows = get_db().iterate(BALANCES_QUERY)
             
+            for customer_name, amount in rows:
+                yield self.format_balance(customer_name, amount)
+        
+        def add_balances(rows):
             # Add balances to treeview
-            for balance in balances:
-                customer_name, amount = balance
+            for customer_name, values, tag in rows:
+                if not self.balance_tree.exists(customer_name):
+                    self.balance_tree.insert("", tk.END, iid=customer_name, values=values, tags=(tag,))
+        
+        # Query and format on a worker thread, filling the tree in batches
+        self.executor.submit(
+            "ledger-balances", fetch_balances, on_batch=add_balances,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to load customer balances: {str(e)}"))
+    
+    def format_balance(self, customer_name, amount):
+        # Use red for positive balances (money owed)
+        tag = 'positive' if amount > 0 else 'negative'
+        
+        return customer_name, format_balance(customer_name, amount), tag
+    
+    def refresh_customer_balance(self, customer_name):
+        """Update one customer's row in the balances tab from the cache"""
+        if not self.balances_loaded:
+            return  # The full load on first showing the tab will include it
+        
+        customer_name = str(customer_name)
+        if self.balance_tree.exists(customer_name):
+            self.balance_tree.delete(customer_name)
+        
+        db = get_db()
+        row = db.query_one("SELECT balance FROM customer_balances WHERE customer_name=?", (customer_name,))
+        
+        # Only show customers with non-zero balance
+        if row is None or row[0] == 0:
+            return
+        amount = row[0]
+        
+        # Position among the rows shown, in the same order as load_balances
+        index = db.query_one('''
+        SELECT COUNT(*) FROM customer_balances
+        WHERE balance != 0
+          AND (balance > ? OR (balance = ? AND customer_name < ?))
+        ''', (amount, amount, customer_name))[0]
+        
+        customer_name, values, tag = self.format_balance(customer_name, amount)
+        self.balance_tree.insert("", index, iid=customer_name, values=values, tags=(tag,))
+    
+    def load_aging(self):
+        self.aging_loaded = True
+        
+        # Clear existing items
+        for item in self.aging_tree.get_children():
+            self.aging_tree.delete(item)
+        
+        as_of = to_day_number(date.today())
+        self.aging_label.config(text=f"As of {format_date(as_of)}")
+        
+        def fetch_aging(task):
+            # Computed by the window query, or taken from the cache if the ledger is unchanged
+            for row in get_ledger_cache().aging(as_of):
+                yield format_aging(row)
+        
+        def add_aging(rows):
+            for values in rows:
+                self.aging_tree.insert("", tk.END, iid=values[0], values=values)
+        
+        self.executor.submit(
+            "ledger-aging", fetch_aging, on_batch=add_aging,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to load aging report: {str(e)}"))
+    
+    def invalidate_aging(self):
+        """Reload the aging report if it is showing, or on its next showing"""
+        self.aging_loaded = False
+        if self.notebook.select() == str(self.aging_tab):
+            self.load_aging()
+    
+    def rebuild_balances(self):
+        """Check the balance cache against the ledger and rebuild it"""
+        try:
+            db = get_db()
+            
+            with db.transaction() as cursor:
+                cursor.execute("SELECT customer_name, balance FROM customer_balances")
+                cached = dict(cursor.fetchall())
+                
+                rebuild_customer_balances(cursor)
                 
-                # Only show customers with non-zero balance
-                if amount != 0:
-                    amount_formatted = f"{float(amount):.2f}"
-                    
-                    # Use red for positive balances (money owed)
-                    tag = 'positive' if amount > 0 else 'negative'
-                    
-                    self.balance_tree.insert("", tk.END, values=(customer_name, amount_formatted), tags=(tag,))
+                cursor.execute("SELECT customer_name, balance FROM customer_balances")
+                rebuilt = dict(cursor.fetchall())
             
-            # Configure tags
-            self.balance_tree.tag_configure('positive', foreground='red')
-            self.balance_tree.tag_configure('negative', foreground='green')
+            mismatched = [name for name in set(cached) | set(rebuilt)
+                          if cached.get(name, 0) != rebuilt.get(name, 0)]
+            
+            self.load_balances()
             
-            conn.close()
+            if mismatched:
+                messagebox.showwarning("Balances Rebuilt", f"Corrected {len(mismatched)} customer balance(s):\n\n" + "\n".join(sorted(mismatched)[:20]))
+            else:
+                messagebox.showinfo("Balances Checked", "All customer balances match the ledger.")
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to load customer balances: {str(e)}")
+            messagebox.showerror("Error", f"Failed to rebuild customer balances: {str(e)}")
     
     def clear_form(self):
         self.customer_entry.delete(0, tk.END)
@@ -231,12 +397,18 @@ class CustomerLedger:
             
             # Check if amounts are valid numbers
             try:
-                float(self.owed_entry.get())
-                float(self.paid_entry.get())
+                to_minor_units(self.owed_entry.get())
+                to_minor_units(self.paid_entry.get())
             except ValueError:
                 messagebox.showerror("Validation Error", "Amounts must be valid numbers!")
                 return False
             
+            try:
+                to_day_number(self.date_entry.get())
+            except ValueError as e:
+                messagebox.showerror("Validation Error", str(e))
+                return False
+            
             return True
         except Exception as e:
             messagebox.showerror("Error", f"Validation error: {str(e)}")
@@ -249,26 +421,19 @@ class CustomerLedger:
         try:
             # Get values from form
             customer_name = self.customer_entry.get()
-            date = self.date_entry.get()
-            amount_owed = float(self.owed_entry.get())
-            amount_paid = float(self.paid_entry.get())
-            
-            # Connect to database
-            conn = sqlite3.connect('easylogipro.db')
-            cursor = conn.cursor()
+            date = to_day_number(self.date_entry.get())
+            amount_owed = to_minor_units(self.owed_entry.get())
+            amount_paid = to_minor_units(self.paid_entry.get())
             
             # Insert new transaction
-            cursor.execute('''
+            transaction_id = get_db().execute('''
             INSERT INTO customer_transactions (customer_name, date, amount_owed, amount_paid)
             VALUES (?, ?, ?, ?)
             ''', (customer_name, date, amount_owed, amount_paid))
             
-            conn.commit()
-            conn.close()
-            
-            # Refresh transactions and balances
-            self.load_transactions()
-            self.load_balances()
+            # Show the new transaction and the affected customer's balances
+            self.refresh_running_balances(customer_name, transaction_id)
+            self.refresh_customer_balance(customer_name)
             self.clear_form()
             messagebox.showinfo("Success", "Transaction added successfully!")
             
@@ -308,36 +473,32 @@ class CustomerLedger:
         try:
             # Get selected item
             selected_item = self.tree.selection()[0]
-            transaction_id = self.tree.item(selected_item, "values")[0]
+            transaction_id, old_customer_name = self.tree.item(selected_item, "values")[:2]
             
             # Get updated values
             customer_name = self.customer_entry.get()
-            date = self.date_entry.get()
-            amount_owed = float(self.owed_entry.get())
-            amount_paid = float(self.paid_entry.get())
+            date = to_day_number(self.date_entry.get())
+            amount_owed = to_minor_units(self.owed_entry.get())
+            amount_paid = to_minor_units(self.paid_entry.get())
             
             # Confirm update
             confirm = messagebox.askyesno("Confirm Update", "Are you sure you want to update this transaction?")
             if not confirm:
                 return
             
-            # Connect to database
-            conn = sqlite3.connect('easylogipro.db')
-            cursor = conn.cursor()
-            
             # Update transaction
-            cursor.execute('''
+            get_db().execute('''
             UPDATE customer_transactions
             SET customer_name=?, date=?, amount_owed=?, amount_paid=?
             WHERE id=?
             ''', (customer_name, date, amount_owed, amount_paid, transaction_id))
             
-            conn.commit()
-            conn.close()
-            
-            # Refresh transactions and balances
-            self.load_transactions()
-            self.load_balances()
+            # Update the transaction in place and the affected customers' balances
+            self.refresh_running_balances(customer_name, transaction_id)
+            self.refresh_customer_balance(old_customer_name)
+            if customer_name != old_customer_name:
+                self.refresh_running_balances(old_customer_name)
+                self.refresh_customer_balance(customer_name)
             self.clear_form()
             messagebox.showinfo("Success", "Transaction updated successfully!")
             
@@ -348,26 +509,20 @@ class CustomerLedger:
         try:
             # Get selected item
             selected_item = self.tree.selection()[0]
-            transaction_id = self.tree.item(selected_item, "values")[0]
+            transaction_id, customer_name = self.tree.item(selected_item, "values")[:2]
             
             # Confirm deletion
             confirm = messagebox.askyesno("Confirm Deletion", "Are you sure you want to delete this transaction?")
             if not confirm:
                 return
             
-            # Connect to database
-            conn = sqlite3.connect('easylogipro.db')
-            cursor = conn.cursor()
-            
             # Delete transaction
-            cursor.execute("DELETE FROM customer_transactions WHERE id=?", (transaction_id,))
+            get_db().execute("DELETE FROM customer_transactions WHERE id=?", (transaction_id,))
             
-            conn.commit()
-            conn.close()
-            
-            # Refresh transactions and balances
-            self.load_transactions()
-            self.load_balances()
+            # Remove the transaction and refresh the affected customer's balances
+            remove_row(self.tree, selected_item)
+            self.refresh_running_balances(customer_name)
+            self.refresh_customer_balance(customer_name)
             self.clear_form()
             messagebox.showinfo("Success", "Transaction deleted successfully!")
             
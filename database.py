@@ -0,0 +1,309 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from instrumentation import get_instrumentation, statement_name
+
+# Database file used when nothing else is configured
+DEFAULT_DB_PATH = os.environ.get('EASYLOGIPRO_DB', 'easylogipro.db')
+
+# Number of compiled statements each connection keeps cached
+STATEMENT_CACHE_SIZE = 256
+
+# Concurrent mode: how long a writer waits for the lock in total, how long
+# each attempt blocks inside SQLite, and how much of the file readers map
+DEFAULT_BUSY_TIMEOUT = 10.0
+LOCK_RETRY_INTERVAL = 0.25
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024
+
+# Online backups copy this many pages per step and pause between steps (seconds)
+# so writers are never locked out for long
+BACKUP_STEP_PAGES = 1024
+BACKUP_STEP_PAUSE = 0.005
+
+# Rows fetched at a time by Database.iterate
+ITERATE_CHUNK_SIZE = 500
+
+# Statements SQLite has a query plan for; schema changes and pragmas have none
+_PLANNED_STATEMENT = re.compile(r"\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH|VALUES)\b", re.IGNORECASE)
+
+
+def _is_busy(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class _TimedCursor:
+    """Writer cursor handed out by Database.transaction
+
+    execute and executemany are recorded like the Database methods;
+    everything else is the underlying sqlite3 cursor's. Slow statements
+    are explained on the writer, inside the open transaction: the
+    thread's reader could be kept waiting by the very lock it holds.
+    """
+
+    def __init__(self, db, cursor):
+        self._db = db
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        started = time.perf_counter()
+        self._cursor.execute(sql, params)
+        self._db._record(sql, params, time.perf_counter() - started, max(self._cursor.rowcount, 0),
+                         conn=self._cursor.connection)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        # The parameters may be a generator, so only the statement is logged
+        started = time.perf_counter()
+        self._cursor.executemany(sql, seq_of_params)
+        get_instrumentation().record(statement_name(sql), time.perf_counter() - started,
+                                     max(self._cursor.rowcount, 0), sql=sql)
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class Database:
+    """Long-lived reader and writer connections shared by every module"""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self.concurrent = False
+        self.busy_timeout = DEFAULT_BUSY_TIMEOUT
+        self.mmap_size = 0
+        self._lock_wait_listeners = []
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        self._configure_connection(conn)
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    def _configure_connection(self, conn):
+        if not self.concurrent:
+            return
+        conn.execute(f"PRAGMA busy_timeout = {int(LOCK_RETRY_INTERVAL * 1000)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+
+    def enable_concurrent_mode(self, busy_timeout=DEFAULT_BUSY_TIMEOUT, mmap_size=DEFAULT_MMAP_SIZE):
+        """Switch to write-ahead logging so several instances can share the file
+
+        Readers no longer block writers, writers retry for up to busy_timeout
+        seconds before giving up, and reads go through a memory map of the
+        database file.
+        """
+        self.concurrent = True
+        self.busy_timeout = busy_timeout
+        self.mmap_size = mmap_size
+
+        with self._connections_lock:
+            connections = list(self._connections)
+        for conn in connections:
+            self._configure_connection(conn)
+
+        with self._write_lock:
+            conn = self.writer
+            mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+            conn.execute("PRAGMA synchronous = NORMAL")
+        return mode
+
+    def add_lock_wait_listener(self, callback):
+        """Call callback(waited_seconds, acquired) while a writer waits for the lock"""
+        self._lock_wait_listeners.append(callback)
+
+    def _notify_lock_wait(self, waited, acquired):
+        for callback in list(self._lock_wait_listeners):
+            try:
+                callback(waited, acquired)
+            except Exception:
+                pass
+
+    def _begin(self, conn):
+        """Start a write transaction, retrying while another writer holds the lock"""
+        started = time.monotonic()
+        waited = 0.0
+        while True:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                break
+            except sqlite3.OperationalError as e:
+                waited = time.monotonic() - started
+                if not self.concurrent or not _is_busy(e) or waited >= self.busy_timeout:
+                    raise
+                self._notify_lock_wait(waited, False)
+        if waited:
+            self._notify_lock_wait(time.monotonic() - started, True)
+
+    @property
+    def reader(self):
+        """Read-only connection owned by the calling thread"""
+        conn = getattr(self._local, 'reader', None)
+        if conn is None:
+            conn = self._connect()
+            # Autocommit so a finished read never holds a shared lock
+            conn.isolation_level = None
+            conn.execute("PRAGMA query_only = ON")
+            self._local.reader = conn
+        return conn
+
+    @property
+    def writer(self):
+        """The single connection all writes go through"""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            return self._writer
+
+    def explain(self, sql, params=(), conn=None):
+        """Return the steps of SQLite's query plan for a statement, one string each
+
+        The plan comes from the calling thread's reader unless another
+        connection is given. Statements without a plan return no steps.
+        """
+        if not _PLANNED_STATEMENT.match(sql):
+            return []
+        return [row[3] for row in (conn or self.reader).execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+    def _record(self, sql, params, seconds, rows, conn=None):
+        get_instrumentation().record(statement_name(sql), seconds, rows, sql=sql, params=params,
+                                     explain=lambda: self.explain(sql, params, conn))
+
+    def query(self, sql, params=()):
+        """Run a read query and return all rows"""
+        started = time.perf_counter()
+        rows = self.reader.execute(sql, params).fetchall()
+        self._record(sql, params, time.perf_counter() - started, len(rows))
+        return rows
+
+    def query_one(self, sql, params=()):
+        """Run a read query and return the first row"""
+        started = time.perf_counter()
+        row = self.reader.execute(sql, params).fetchone()
+        self._record(sql, params, time.perf_counter() - started, 0 if row is None else 1)
+        return row
+
+    def iterate(self, sql, params=(), chunk_size=ITERATE_CHUNK_SIZE):
+        """Run a read query and yield its rows as they are fetched
+
+        Only the time spent in SQLite is recorded, not the time the caller
+        spends on each row.
+        """
+        cursor = self.reader.execute(sql, params)
+        elapsed, rows = 0.0, 0
+        try:
+            while True:
+                started = time.perf_counter()
+                chunk = cursor.fetchmany(chunk_size)
+                elapsed += time.perf_counter() - started
+                if not chunk:
+                    break
+                rows += len(chunk)
+                yield from chunk
+        finally:
+            cursor.close()
+            self._record(sql, params, elapsed, rows)
+
+    @contextmanager
+    def transaction(self):
+        """Run a block of writes on the writer connection and commit once"""
+        with self._write_lock:
+            conn = self.writer
+            self._begin(conn)
+            cursor = conn.cursor()
+            try:
+                yield _TimedCursor(self, cursor)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def execute(self, sql, params=()):
+        """Run a single write statement and return the last inserted row id"""
+        with self.transaction() as cursor:
+            cursor.execute(sql, params)
+            return cursor.lastrowid
+
+    def backup(self, target_path, progress=None):
+        """Copy a consistent snapshot of the database to target_path
+
+        Uses SQLite's online backup API, copying BACKUP_STEP_PAGES pages
+        at a time from the calling thread's reader so writes can continue
+        between steps. progress(copied_pages, total_pages) is called after
+        each step. Returns the page size of the copy.
+        """
+        def step(status, remaining, total):
+            if progress is not None:
+                progress(total - remaining, total)
+
+        target = sqlite3.connect(target_path)
+        try:
+            self.reader.backup(target, pages=BACKUP_STEP_PAGES, progress=step, sleep=BACKUP_STEP_PAUSE)
+            return target.execute("PRAGMA page_size").fetchone()[0]
+        finally:
+            target.close()
+
+    def restore(self, source_path, progress=None):
+        """Replace the contents of the database with the database at source_path
+
+        The copy goes through the writer connection with the online backup
+        API, so other connections see either the old or the new database.
+        """
+        def step(status, remaining, total):
+            if progress is not None:
+                progress(total - remaining, total)
+
+        source = sqlite3.connect(source_path)
+        try:
+            with self._write_lock:
+                source.backup(self.writer, pages=BACKUP_STEP_PAGES, progress=step)
+        finally:
+            source.close()
+
+    def close(self):
+        """Close every connection opened by this database"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._writer = None
+        self._local = threading.local()
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def configure(path):
+    """Point the application at a different database file"""
+    global _database
+    with _database_lock:
+        if _database is not None:
+            _database.close()
+        _database = Database(path)
+        return _database
+
+
+def get_db():
+    """Return the shared database, opening it on first use"""
+    global _database
+    with _database_lock:
+        if _database is None:
+            _database = Database()
+        return _database
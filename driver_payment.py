@@ -1,14 +1,17 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import sqlite3
-import csv
-import os
-from datetime import datetime
+from database import get_db
+from background import QueryExecutor
+from formatting import format_payment
+from reports import PAYMENTS_QUERY, PAYMENTS_COUNT_QUERY, PAYMENT_HEADERS, driver_payment_totals
+from export_jobs import ExportJobManager
 
 class DriverPayment:
-    def __init__(self, parent):
+    def __init__(self, parent, executor=None, export_jobs=None):
         self.parent = parent
+        self.executor = executor or QueryExecutor(parent)
+        self.export_jobs = export_jobs or ExportJobManager(parent)
         
         # Create widgets
         self.create_widgets()
@@ -58,71 +61,30 @@ class DriverPayment:
         self.tree.pack(fill=tk.BOTH, expand=True)
     
     def load_driver_payments(self):
+        # Query and format on a worker thread, then fill the tree in one go
+        self.executor.submit(
+            "driver-payments", lambda task: (self.fetch_driver_payments(), self.calculate_totals()),
+            on_result=lambda result: self.show_driver_payments(*result),
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to load driver payments: {str(e)}"))
+    
+    def fetch_driver_payments(self):
+        # Per-driver totals maintained by the trips triggers
+        return [format_payment(payment) for payment in get_db().query(PAYMENTS_QUERY)]
+    
+    def calculate_totals(self):
+        return driver_payment_totals()
+    
+    def show_driver_payments(self, rows, totals):
         # Clear existing items
         for item in self.tree.get_children():
             self.tree.delete(item)
         
-        try:
-            # Connect to the database
-            conn = sqlite3.connect('easylogipro.db')
-            cursor = conn.cursor()
-            
-            # Query to calculate driver payments from trip data
-            cursor.execute('''
-            SELECT 
-                driver_name,
-                COUNT(*) as trip_count,
-                SUM(trip_income) as total_income,
-                SUM(fuel_expenses) as total_expenses,
-                (SUM(trip_income) - SUM(fuel_expenses)) as net_payment
-            FROM trips
-            GROUP BY driver_name
-            ORDER BY net_payment DESC
-            ''')
-            
-            payments = cursor.fetchall()
-            
-            # Add payments to treeview
-            for payment in payments:
-                driver_name, trip_count, total_income, total_expenses, net_payment = payment
-                
-                income_formatted = f"{float(total_income):.2f}"
-                expenses_formatted = f"{float(total_expenses):.2f}"
-                net_formatted = f"{float(net_payment):.2f}"
-                
-                self.tree.insert("", tk.END, values=(driver_name, trip_count, income_formatted, 
-                                                   expenses_formatted, net_formatted))
-            
-            conn.close()
-            
-            # Calculate total
-            self.calculate_totals()
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load driver payments: {str(e)}")
-    
-    def calculate_totals(self):
-        # Add a total row
-        total_trips = 0
-        total_income = 0.0
-        total_expenses = 0.0
-        total_net = 0.0
-        
-        for item_id in self.tree.get_children():
-            values = self.tree.item(item_id, "values")
-            total_trips += int(values[1])
-            total_income += float(values[2])
-            total_expenses += float(values[3])
-            total_net += float(values[4])
+        # Add payments to treeview
+        for values in rows:
+            self.tree.insert("", tk.END, values=values)
         
         # Insert total row at the end
-        self.tree.insert("", tk.END, values=(
-            "TOTAL", 
-            total_trips, 
-            f"{total_income:.2f}", 
-            f"{total_expenses:.2f}", 
-            f"{total_net:.2f}"
-        ), tags=('total',))
+        self.tree.insert("", tk.END, values=totals, tags=('total',))
         
         # Configure tag for total row
         self.tree.tag_configure('total', background='#f0f0f0', font=('TkDefaultFont', 10, 'bold'))
@@ -140,18 +102,15 @@ class DriverPayment:
             if not file_path:
                 return  # User cancelled
             
-            # Open file for writing
-            with open(file_path, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                # Write header
-                writer.writerow(['Driver Name', 'Number of Trips', 'Total Income (TZS)', 
-                                'Total Expenses (TZS)', 'Net Payment (TZS)'])
-                
-                # Write data rows
-                for item_id in self.tree.get_children():
-                    writer.writerow(self.tree.item(item_id, "values"))
+            headers = PAYMENT_HEADERS
             
-            messagebox.showinfo("Export Successful", f"Driver payments exported to {file_path}")
+            # Stream the summary rows from a worker process, then the total row
+            self.export_jobs.submit(
+                "csv", "Driver Payments (CSV)", file_path, PAYMENTS_QUERY, (), headers,
+                count_sql=PAYMENTS_COUNT_QUERY, format_row=format_payment,
+                trailer=[self.calculate_totals()],
+                on_done=lambda count: messagebox.showinfo("Export Successful", f"Driver payments exported to {file_path}"),
+                on_error=lambda e: messagebox.showerror("Export Error", f"Failed to export data: {str(e)}"))
             
         except Exception as e:
             messagebox.showerror("Export Error", f"Failed to export data: {str(e)}")
@@ -159,10 +118,7 @@ class DriverPayment:
     def export_to_pdf(self):
         """Export driver payments data to PDF file"""
         try:
-            from reportlab.lib import colors
             from reportlab.lib.pagesizes import letter
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet
             
             # Ask user for save location
             file_path = filedialog.asksaveasfilename(
@@ -174,47 +130,16 @@ class DriverPayment:
             if not file_path:
                 return  # User cancelled
             
-            # Create PDF document
-            doc = SimpleDocTemplate(file_path, pagesize=letter)
-            elements = []
-            
-            # Add title
-            styles = getSampleStyleSheet()
-            title = Paragraph("Driver Payments Report", styles['Title'])
-            date_text = Paragraph(f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal'])
-            elements.append(title)
-            elements.append(date_text)
-            elements.append(Spacer(1, 20))
-            
-            # Prepare data
-            data = [['Driver Name', 'Number of Trips', 'Total Income (TZS)', 
-                    'Total Expenses (TZS)', 'Net Payment (TZS)']]
-                    
-            for item_id in self.tree.get_children():
-                data.append(self.tree.item(item_id, "values"))
-            
-            # Create table
-            table = Table(data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('BOX', (0, 0), (-1, -1), 2, colors.black),
-            ]))
-            
-            elements.append(table)
-            
-            # Build PDF
-            doc.build(elements)
+            headers = PAYMENT_HEADERS
             
-            messagebox.showinfo("Export Successful", f"Driver payments exported to {file_path}")
+            # Lay out the summary rows page by page in a worker process, then the total row
+            self.export_jobs.submit(
+                "pdf", "Driver Payments Report", file_path, PAYMENTS_QUERY, (), headers,
+                count_sql=PAYMENTS_COUNT_QUERY, format_row=format_payment,
+                col_widths=[3, 2, 2, 2, 2], subtotals={1: 1, 2: 2, 3: 3, 4: 4}, count_columns=(1,),
+                trailer=[self.calculate_totals()], pagesize=letter,
+                on_done=lambda count: messagebox.showinfo("Export Successful", f"Driver payments exported to {file_path}"),
+                on_error=lambda e: messagebox.showerror("Export Error", f"Failed to export data: {str(e)}"))
             
         except ImportError:
             messagebox.showerror("Missing Library", "ReportLab is required for PDF export. Please install it with 'pip install reportlab'")
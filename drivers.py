@@ -0,0 +1,70 @@
+import bisect
+import threading
+
+from database import get_db
+
+# Most suggestions offered for a typed prefix
+MAX_SUGGESTIONS = 20
+
+
+class DriverCache:
+    """In-memory, sorted list of driver names for filters and autocomplete
+
+    Drivers are only ever added, so the largest id in the drivers table
+    identifies the list's version. Each lookup checks it with a single
+    primary key probe and the list is only re-read after a driver has been
+    added, by this or another instance. The trips table is never touched.
+    """
+
+    def __init__(self, db=None):
+        self.db = db
+        self._lock = threading.Lock()
+        self._version = None
+        self._names = []
+        self._keys = []
+
+    def _current(self):
+        db = self.db or get_db()
+        version = db.query_one("SELECT MAX(id) FROM drivers")[0]
+
+        with self._lock:
+            if version != self._version:
+                names = sorted((row[0] for row in db.query("SELECT name FROM drivers")), key=str.casefold)
+                self._names = names
+                self._keys = [name.casefold() for name in names]
+                self._version = version
+            return self._names, self._keys
+
+    def names(self):
+        """Return every driver name, sorted case-insensitively"""
+        return list(self._current()[0])
+
+    def complete(self, prefix, limit=MAX_SUGGESTIONS):
+        """Return up to limit driver names starting with prefix, ignoring case"""
+        names, keys = self._current()
+        prefix = prefix.strip().casefold()
+
+        start = bisect.bisect_left(keys, prefix)
+        matches = []
+        for index in range(start, min(start + limit, len(keys))):
+            if not keys[index].startswith(prefix):
+                break
+            matches.append(names[index])
+        return matches
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+
+_driver_cache = None
+_driver_cache_lock = threading.Lock()
+
+
+def get_driver_cache():
+    """Return the shared driver cache"""
+    global _driver_cache
+    with _driver_cache_lock:
+        if _driver_cache is None:
+            _driver_cache = DriverCache()
+        return _driver_cache
@@ -1,17 +1,37 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import sqlite3
+from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
+import importlib
+import multiprocessing
 import os
-from trip_management import TripManagement
-from vehicle_maintenance import VehicleMaintenance
-from driver_payment import DriverPayment
-from inventory_management import InventoryManagement
-from customer_ledger import CustomerLedger
+import threading
+from database import get_db
+from migrations import invalid_dates_warning, migrate
+from background import QueryExecutor
+from export_jobs import ExportJobManager
+from instrumentation import get_instrumentation
+from stock_monitor import LowStockMonitor, low_stock_message
 
 class EasyLogiPro:
-    def __init__(self, root):
+    # Module (and attribute) name, class name and tab attribute for each tab.
+    # Modules are imported and built the first time their tab is shown.
+    MODULES = [
+        ("trip_management", "TripManagement", "trip_tab"),
+        ("vehicle_maintenance", "VehicleMaintenance", "maintenance_tab"),
+        ("driver_payment", "DriverPayment", "driver_tab"),
+        ("inventory_management", "InventoryManagement", "inventory_tab"),
+        ("customer_ledger", "CustomerLedger", "customer_tab"),
+    ]
+    
+    # Modules whose reports are written by the shared export job queue
+    EXPORT_MODULES = {"trip_management", "driver_payment"}
+    
+    # Modules that ask the low stock monitor to check after saving stock levels
+    STOCK_MODULES = {"inventory_management"}
+    
+    def __init__(self, root, concurrent=False):
         self.root = root
+        self.concurrent = concurrent
         self.root.title("EasyLogiPro - Logistics Management System")
         self.root.geometry("1000x600")
         self.root.minsize(800, 500)
@@ -40,23 +60,51 @@ class EasyLogiPro:
         self.notebook.add(self.inventory_tab, text="Inventory")
         self.notebook.add(self.customer_tab, text="Customer Ledger")
         
-        # Load modules
-        self.trip_management = TripManagement(self.trip_tab)
-        self.vehicle_maintenance = VehicleMaintenance(self.maintenance_tab)
-        self.driver_payment = DriverPayment(self.driver_tab)
-        self.inventory_management = InventoryManagement(self.inventory_tab)
-        self.customer_ledger = CustomerLedger(self.customer_tab)
-        
         # Status bar
         self.status_bar = ttk.Label(root, text="EasyLogiPro - Ready", relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
+        # Database reads run on worker threads shared by all modules
+        self.executor = QueryExecutor(root)
+        self.executor.add_busy_listener(self.on_busy_changed)
+        self.busy = 0
+        
+        # The last background load's timing is shown in the status bar
+        self.last_timing = None
+        get_instrumentation().add_listener(self.on_timing)
+        
+        # CSV and PDF exports run in worker processes
+        self.export_jobs = ExportJobManager(root)
+        self.export_jobs.add_listener(self.on_export_job_changed)
+        self.export_jobs_window = None
+        
+        # Items falling to their reorder level are reported whichever tab is open
+        self.low_stock_count = 0
+        self.low_stock_monitor = LowStockMonitor(root, self.executor)
+        self.low_stock_monitor.add_listener(self.on_low_stock)
+        self.low_stock_monitor.start()
+        
+        # Modules are loaded lazily when their tab is first shown
+        self.tab_modules = {}
+        for module_name, class_name, tab_name in self.MODULES:
+            setattr(self, module_name, None)
+            self.tab_modules[str(getattr(self, tab_name))] = module_name
+        
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        
+        # Build the initially selected tab once the window is up
+        self.root.after_idle(self.on_tab_changed)
+        
     def create_menu(self):
         menubar = tk.Menu(self.root)
         
         # File menu
         file_menu = tk.Menu(menubar, tearoff=0)
         file_menu.add_command(label="Backup Database", command=self.backup_database)
+        file_menu.add_command(label="Verify Backup...", command=self.verify_backup)
+        file_menu.add_command(label="Restore Database...", command=self.restore_database)
+        file_menu.add_command(label="Export Jobs", command=self.show_export_jobs)
+        file_menu.add_command(label="Save Performance Stats...", command=self.save_performance_stats)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit)
         menubar.add_cascade(label="File", menu=file_menu)
@@ -64,9 +112,12 @@ class EasyLogiPro:
         # Reports menu
         reports_menu = tk.Menu(menubar, tearoff=0)
         reports_menu.add_command(label="Check Low Stock Items", 
-                                command=lambda: self.inventory_management.check_low_stock())
+                                command=lambda: self.low_stock_monitor.show_low_stock())
         reports_menu.add_command(label="Export Driver Payments", 
-                                command=lambda: self.driver_payment.export_to_csv())
+                                command=lambda: self.get_module("driver_payment").export_to_csv())
+        reports_menu.add_command(label="Check Customer Balances", 
+                                command=lambda: self.get_module("customer_ledger").rebuild_balances())
+        reports_menu.add_command(label="Rebuild Trip Totals", command=self.rebuild_rollups)
         menubar.add_cascade(label="Reports", menu=reports_menu)
         
         # Help menu
@@ -76,83 +127,243 @@ class EasyLogiPro:
         
         self.root.config(menu=menubar)
     
+    def get_module(self, module_name):
+        """Return a module, importing it and building its tab on first use"""
+        module = getattr(self, module_name)
+        
+        if module is None:
+            for name, class_name, tab_name in self.MODULES:
+                if name == module_name:
+                    module_class = getattr(importlib.import_module(module_name), class_name)
+                    if module_name in self.EXPORT_MODULES:
+                        module = module_class(getattr(self, tab_name), self.executor, self.export_jobs)
+                    elif module_name in self.STOCK_MODULES:
+                        module = module_class(getattr(self, tab_name), self.executor, self.low_stock_monitor)
+                    else:
+                        module = module_class(getattr(self, tab_name), self.executor)
+                    setattr(self, module_name, module)
+                    break
+        
+        return module
+    
+    def on_tab_changed(self, event=None):
+        """Build the selected tab's module the first time it is shown"""
+        selected = self.notebook.select()
+        if selected in self.tab_modules:
+            self.get_module(self.tab_modules[selected])
+    
     def setup_database(self):
-        """Create the database and tables if they don't exist"""
-        conn = sqlite3.connect('easylogipro.db')
-        cursor = conn.cursor()
-        
-        # Create trips table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS trips (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
-            client_name TEXT NOT NULL,
-            cargo_type TEXT NOT NULL,
-            route TEXT NOT NULL,
-            trip_income REAL NOT NULL,
-            fuel_expenses REAL NOT NULL,
-            driver_name TEXT NOT NULL
-        )
-        ''')
-        
-        # Create maintenance table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS maintenance (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            vehicle_plate_number TEXT NOT NULL,
-            service_date TEXT NOT NULL,
-            description TEXT NOT NULL,
-            cost REAL NOT NULL
-        )
-        ''')
-        
-        # Create inventory table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS inventory (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            item_name TEXT NOT NULL,
-            quantity INTEGER NOT NULL,
-            purchase_price REAL NOT NULL,
-            sale_price REAL NOT NULL
-        )
-        ''')
-        
-        # Create customer_transactions table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS customer_transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            customer_name TEXT NOT NULL,
-            date TEXT NOT NULL,
-            amount_owed REAL NOT NULL,
-            amount_paid REAL NOT NULL
+        """Create the database and apply any pending schema migrations"""
+        db = get_db()
+        
+        # Shared multi-instance setups opt in to WAL mode with lock retries
+        if self.concurrent:
+            mode = db.enable_concurrent_mode()
+            db.add_lock_wait_listener(self.on_lock_wait)
+            
+            # SQLite keeps the old journal when WAL is unavailable, e.g. on some file systems
+            if str(mode).lower() != 'wal':
+                messagebox.showwarning(
+                    "Concurrent Mode",
+                    f"The database could not be switched to write-ahead logging (journal mode is '{mode}').\n\n"
+                    "Writes still wait for each other, but long reads and exports will block them as before.")
+        
+        # Bring the schema up to date, upgrading older databases in place
+        applied = migrate(db)
+        
+        warning = invalid_dates_warning(db, applied)
+        if warning:
+            messagebox.showwarning("Unreadable Dates", warning)
+    
+    def on_lock_wait(self, waited, acquired):
+        """Show database lock waits in the status bar"""
+        if acquired:
+            text = f"EasyLogiPro - Ready (waited {waited:.1f}s for database lock)"
+        else:
+            text = f"Waiting for database lock ({waited:.1f}s)..."
+        
+        if not hasattr(self, 'status_bar'):
+            return
+        
+        if threading.current_thread() is threading.main_thread():
+            # A form write is retrying on the Tk thread, so the mainloop is not
+            # running; repaint the status bar now rather than after the wait
+            self.status_bar.config(text=text)
+            self.status_bar.update_idletasks()
+        else:
+            # Tk may only be touched from its own thread
+            self.executor.post(lambda value: self.status_bar.config(text=text))
+    
+    def ready_text(self):
+        """Status bar text when nothing is running, with the last load's timing and any low stock"""
+        text = "EasyLogiPro - Ready"
+        if self.last_timing:
+            text += f" | {self.last_timing}"
+        if self.low_stock_count:
+            text += f" | {self.low_stock_count} item{'s' if self.low_stock_count > 1 else ''} low on stock"
+        return text
+    
+    def on_busy_changed(self, active):
+        """Show a busy indicator while background queries are running"""
+        self.busy = active
+        if active:
+            self.status_bar.config(text=f"Loading data... ({active} running)")
+            self.root.config(cursor="watch")
+        else:
+            self.status_bar.config(text=self.ready_text())
+            self.root.config(cursor="")
+    
+    def on_timing(self, operation, seconds, rows):
+        """Show how long each finished background load took"""
+        # Task timings are recorded on the Tk thread; statement timings arrive from workers and are skipped
+        if not operation.startswith("task:"):
+            return
+        
+        self.last_timing = f"{operation[5:]} {seconds * 1000:,.0f} ms" + (f", {rows:,} rows" if rows else "")
+        if not self.busy and not self.export_jobs.active:
+            self.status_bar.config(text=self.ready_text())
+    
+    def on_low_stock(self, items, first_check):
+        """Keep the low stock count in the status bar and alert when an item falls to its reorder level"""
+        self.low_stock_count = len(self.low_stock_monitor.low)
+        if not self.busy and not self.export_jobs.active:
+            self.status_bar.config(text=self.ready_text())
+        
+        # Items already low at startup are only counted; the Reports menu lists them
+        if items and not first_check:
+            messagebox.showwarning("Low Stock Alert", "The following items have fallen to their reorder level:\n\n"
+                                   + low_stock_message(items))
+    
+    def save_performance_stats(self):
+        """Write the query and UI timings collected since startup to a JSON file"""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json")],
+            initialfile=f"easylogipro_stats_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            title="Save Performance Stats"
         )
-        ''')
         
-        conn.commit()
-        conn.close()
+        if not file_path:
+            return  # User cancelled
+        
+        instrumentation = get_instrumentation()
+        try:
+            instrumentation.dump(file_path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to save performance stats: {str(e)}")
+            return
+        
+        messagebox.showinfo("Performance Stats",
+                            f"Timings saved to {file_path}.\n\nStatements slower than "
+                            f"{instrumentation.slow_query_ms:.0f} ms are logged with their query plans "
+                            f"in {os.path.abspath(instrumentation.slow_query_log)}.")
+    
+    def rebuild_rollups(self):
+        """Recompute the day, week and month trip totals from the trip log"""
+        import rollups
+        
+        self.executor.submit(
+            "rollups", lambda task: rollups.rebuild_rollups(),
+            on_result=lambda _: messagebox.showinfo("Trip Totals", "Day, week and month trip totals have been rebuilt."),
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to rebuild trip totals: {str(e)}"))
+    
+    def show_export_jobs(self):
+        """Open the export jobs window, or bring it to the front"""
+        from export_jobs_window import ExportJobsWindow
+        
+        if self.export_jobs_window is not None and self.export_jobs_window.window.winfo_exists():
+            self.export_jobs_window.lift()
+        else:
+            self.export_jobs_window = ExportJobsWindow(self.root, self.export_jobs)
+    
+    def on_export_job_changed(self, job):
+        """Show new export jobs and keep a count of running ones in the status bar"""
+        if job.status == "Queued" and job.done == 0:
+            self.show_export_jobs()
+        
+        active = len(self.export_jobs.active)
+        if active:
+            self.status_bar.config(text=f"Exporting... ({active} export{'s' if active > 1 else ''} in progress)")
+        elif job.finished:
+            self.status_bar.config(text=self.ready_text())
+    
+    def show_backup_progress(self, value):
+        """Show the stage and progress of a backup task in the status bar"""
+        stage, done, total = value
+        percent = f" {done * 100 // total}%" if total else ""
+        self.status_bar.config(text=f"{stage}...{percent}")
     
     def backup_database(self):
         """Create a backup of the database"""
-        import shutil
-        from datetime import datetime
+        import backup
         
-        # Create backups directory if it doesn't exist
-        if not os.path.exists('backups'):
-            os.makedirs('backups')
+        def run(task):
+            # Snapshot with the online backup API and store only changed pages
+            return backup.create_backup(progress=lambda *value: task.report_progress(value))
         
-        backup_path = f"backups/easylogipro_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+        self.executor.submit(
+            "backup", run, on_progress=self.show_backup_progress,
+            on_result=lambda path: messagebox.showinfo("Backup Successful", f"Database backed up to {path}"),
+            on_error=lambda e: messagebox.showerror("Backup Failed", f"Error creating backup: {str(e)}"))
+    
+    def choose_backup(self, title):
+        return filedialog.askopenfilename(
+            title=title,
+            initialdir="backups" if os.path.isdir("backups") else None,
+            filetypes=[("EasyLogiPro backups", "*.zip")]
+        )
+    
+    def verify_backup(self):
+        """Check that a backup can be restored"""
+        import backup
         
-        try:
-            shutil.copy2('easylogipro.db', backup_path)
-            messagebox.showinfo("Backup Successful", f"Database backed up to {backup_path}")
-        except Exception as e:
-            messagebox.showerror("Backup Failed", f"Error creating backup: {str(e)}")
+        path = self.choose_backup("Verify Backup")
+        if not path:
+            return
+        
+        def run(task):
+            return backup.verify_backup(path, progress=lambda *value: task.report_progress(value))
+        
+        self.executor.submit(
+            "backup", run, on_progress=self.show_backup_progress,
+            on_result=lambda manifest: messagebox.showinfo(
+                "Backup Verified", f"{manifest['name']} is intact ({manifest['page_count']:,} pages)"),
+            on_error=lambda e: messagebox.showerror("Verification Failed", str(e)))
+    
+    def restore_database(self):
+        """Replace the database with a verified backup"""
+        import backup
+        
+        path = self.choose_backup("Restore Database")
+        if not path:
+            return
+        
+        if not messagebox.askyesno("Confirm Restore",
+                                   "Restoring replaces all current data with the contents of the backup. Continue?"):
+            return
+        
+        def run(task):
+            return backup.restore_backup(path, progress=lambda *value: task.report_progress(value))
+        
+        def done(manifest):
+            messagebox.showinfo("Restore Successful",
+                                f"Database restored from {manifest['name']}. Restart EasyLogiPro to reload all tabs.")
+        
+        self.executor.submit(
+            "backup", run, on_progress=self.show_backup_progress, on_result=done,
+            on_error=lambda e: messagebox.showerror("Restore Failed", f"Error restoring backup: {str(e)}"))
     
     def show_about(self):
         about_text = "EasyLogiPro v1.0\n\nA logistics management application for small trucking businesses."
         messagebox.showinfo("About EasyLogiPro", about_text)
 
 if __name__ == "__main__":
+    # Export worker processes re-run this script in a frozen executable
+    multiprocessing.freeze_support()
     root = tk.Tk()
-    app = EasyLogiPro(root)
+    app = EasyLogiPro(root, concurrent=os.environ.get('EASYLOGIPRO_CONCURRENT') == '1')
     root.mainloop()
+    app.low_stock_monitor.stop()
+    app.executor.shutdown()
+    app.export_jobs.shutdown()
+    get_db().close()
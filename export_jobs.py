@@ -0,0 +1,242 @@
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from database import Database, get_db
+from exporters import ExportCancelled, export_query_to_csv
+
+# Upper bound on export worker processes, and how often the Tk thread checks on jobs (ms)
+MAX_EXPORT_PROCESSES = 4
+POLL_INTERVAL = 100
+
+# Minimum time between progress messages sent back from a worker (seconds)
+PROGRESS_INTERVAL = 0.2
+
+
+def _run_export(db_path, kind, job_id, title, file_path, sql, params, headers, count_sql, count_params,
+                options, events, cancel_event):
+    """Write one export in a worker process and return the number of rows written"""
+    db = Database(db_path)
+    last_report = [0.0]
+
+    def progress(done, total):
+        now = time.monotonic()
+        if now - last_report[0] >= PROGRESS_INTERVAL:
+            last_report[0] = now
+            events.put((job_id, "progress", (done, total)))
+
+    try:
+        events.put((job_id, "started", None))
+        total = db.query_one(count_sql, count_params)[0] if count_sql else None
+
+        if kind == "pdf":
+            from pdf_reports import export_query_to_pdf
+            return export_query_to_pdf(db, sql, params, file_path, title, headers, total=total,
+                                       progress=progress, cancelled=cancel_event.is_set, **options)
+
+        return export_query_to_csv(db, sql, params, file_path, headers, total=total,
+                                   progress=progress, cancelled=cancel_event.is_set, **options)
+    finally:
+        db.close()
+
+
+class ExportJob:
+    """A queued or running export and its progress"""
+
+    def __init__(self, job_id, kind, title, file_path, on_done=None, on_error=None):
+        self.id = job_id
+        self.kind = kind
+        self.title = title
+        self.file_path = file_path
+        self.status = "Queued"
+        self.done = 0
+        self.total = None
+        self.started = None
+        self.result = None
+        self.error = None
+        self.on_done = on_done
+        self.on_error = on_error
+        self._future = None
+        self._cancel_event = None
+
+    @property
+    def finished(self):
+        return self.status in ("Done", "Failed", "Cancelled")
+
+    @property
+    def eta(self):
+        """Estimated seconds until the job completes, or None if unknown"""
+        if self.status != "Running" or not self.total or not self.done or self.started is None:
+            return None
+        elapsed = time.monotonic() - self.started
+        return elapsed * (self.total - self.done) / self.done
+
+    def cancel(self):
+        """Drop the job if it is still queued, otherwise ask the worker to stop"""
+        if self.finished:
+            return
+        if self._future is not None and self._future.cancel():
+            return
+        if self._cancel_event is not None:
+            self._cancel_event.set()
+            self.status = "Cancelling"
+
+
+class ExportJobManager:
+    """Queue CSV and PDF exports and run them in worker processes
+
+    Report layout and CSV writing are CPU bound and hold the GIL, so each
+    export runs in a separate process with its own database connection.
+    Up to max_workers exports run in parallel and the rest wait in the
+    pool's queue. Workers report progress through a managed queue that
+    the Tk thread polls with root.after, and stop at the next chunk or
+    page once their job is cancelled. The pool and the manager process
+    are only started when the first export is submitted.
+    """
+
+    def __init__(self, root, db_path=None, max_workers=None):
+        self.root = root
+        self.db_path = db_path
+        self.max_workers = max_workers or min(os.cpu_count() or 1, MAX_EXPORT_PROCESSES)
+        self.jobs = []
+        self._context = multiprocessing.get_context("spawn")
+        self._pool = None
+        self._manager = None
+        self._events = None
+        self._finished = queue.Queue()
+        self._by_id = {}
+        self._next_id = 1
+        self._listeners = []
+        self._polling = False
+
+    def add_listener(self, callback):
+        """Call callback(job) on the Tk thread whenever a job is added or changes"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def submit(self, kind, title, file_path, sql, params, headers, count_sql=None, count_params=(),
+               on_done=None, on_error=None, **options):
+        """Queue an export of a query to a "csv" or "pdf" file and return its job
+
+        count_sql is run by the worker to find the total row count for
+        progress and ETA. Remaining keyword arguments are passed on to
+        export_query_to_csv or export_query_to_pdf. on_done(rows_written)
+        or on_error(exception) is called on the Tk thread when the job
+        ends; neither is called if it is cancelled.
+        """
+        job = ExportJob(self._next_id, kind, title, file_path, on_done, on_error)
+        self._next_id += 1
+
+        self._start()
+        job._cancel_event = self._manager.Event()
+        db_path = os.path.abspath(self.db_path or get_db().path)
+        args = (_run_export, db_path, kind, job.id, title, file_path, sql, tuple(params), headers,
+                count_sql, tuple(count_params), options, self._events, job._cancel_event)
+
+        try:
+            job._future = self._pool.submit(*args)
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool and queue the job there
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self._context)
+            job._future = self._pool.submit(*args)
+
+        job._future.add_done_callback(lambda future: self._finished.put(job))
+        self.jobs.append(job)
+        self._by_id[job.id] = job
+        self._notify(job)
+        self._schedule_poll()
+        return job
+
+    def cancel(self, job):
+        job.cancel()
+        self._notify(job)
+
+    def clear_finished(self):
+        """Forget jobs that have ended"""
+        self.jobs = [job for job in self.jobs if not job.finished]
+        self._by_id = {job.id: job for job in self.jobs}
+
+    @property
+    def active(self):
+        return [job for job in self.jobs if not job.finished]
+
+    def shutdown(self):
+        for job in self.active:
+            job.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+        if self._manager is not None:
+            self._manager.shutdown()
+
+    def _start(self):
+        if self._pool is None:
+            self._manager = self._context.Manager()
+            self._events = self._manager.Queue()
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self._context)
+
+    def _schedule_poll(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(POLL_INTERVAL, self._poll)
+
+    def _poll(self):
+        """Apply progress messages and finished jobs on the Tk thread"""
+        self._polling = False
+        try:
+            while True:
+                try:
+                    job_id, event, value = self._events.get_nowait()
+                except queue.Empty:
+                    break
+                job = self._by_id.get(job_id)
+                if job is None or job.finished:
+                    continue
+                if event == "started":
+                    job.started = time.monotonic()
+                    if job.status == "Queued":
+                        job.status = "Running"
+                elif event == "progress":
+                    job.done, job.total = value
+                self._notify(job)
+
+            while True:
+                try:
+                    job = self._finished.get_nowait()
+                except queue.Empty:
+                    break
+                self._finish(job)
+        finally:
+            if self.active:
+                self._schedule_poll()
+
+    def _finish(self, job):
+        future = job._future
+        error = None if future.cancelled() else future.exception()
+
+        if future.cancelled() or isinstance(error, ExportCancelled):
+            job.status = "Cancelled"
+        elif error is not None:
+            job.status = "Failed"
+            job.error = error
+        else:
+            job.status = "Done"
+            job.result = future.result()
+            job.done = job.result
+            job.total = job.result if job.total is None else job.total
+
+        self._notify(job)
+
+        if job.status == "Failed" and job.on_error is not None:
+            job.on_error(error)
+        elif job.status == "Done" and job.on_done is not None:
+            job.on_done(job.result)
+
+    def _notify(self, job):
+        for callback in list(self._listeners):
+            callback(job)
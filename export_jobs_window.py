@@ -0,0 +1,89 @@
+import tkinter as tk
+from tkinter import ttk
+import os
+
+
+def format_eta(seconds):
+    """Format a number of seconds as a short remaining-time string"""
+    if seconds is None:
+        return ""
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class ExportJobsWindow:
+    """Window listing queued, running and finished exports"""
+
+    def __init__(self, parent, jobs):
+        self.jobs = jobs
+
+        self.window = tk.Toplevel(parent)
+        self.window.title("Export Jobs")
+        self.window.geometry("700x250")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        columns = ("Report", "File", "Status", "Progress", "ETA")
+        self.tree = ttk.Treeview(self.window, columns=columns, show="headings", selectmode="browse")
+        for col, width in zip(columns, (180, 200, 90, 140, 70)):
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=width)
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+
+        buttons_frame = ttk.Frame(self.window)
+        buttons_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        ttk.Button(buttons_frame, text="Cancel Job", command=self.cancel_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="Clear Finished", command=self.clear_finished).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="Close", command=self.close).pack(side=tk.RIGHT, padx=5)
+
+        for job in self.jobs.jobs:
+            self.show_job(job)
+        self.jobs.add_listener(self.show_job)
+
+        # Keep the ETA column ticking between progress messages
+        self.tick()
+
+    def show_job(self, job):
+        if job.total:
+            progress = f"{job.done:,} of {job.total:,} ({min(job.done * 100 // job.total, 100)}%)"
+        else:
+            progress = f"{job.done:,} rows"
+
+        values = (job.title, os.path.basename(job.file_path), job.status, progress, format_eta(job.eta))
+        iid = str(job.id)
+        if self.tree.exists(iid):
+            self.tree.item(iid, values=values)
+        else:
+            self.tree.insert("", tk.END, iid=iid, values=values)
+
+    def tick(self):
+        if not self.window.winfo_exists():
+            return
+        for job in self.jobs.active:
+            self.show_job(job)
+        self.window.after(1000, self.tick)
+
+    def cancel_selected(self):
+        for iid in self.tree.selection():
+            for job in self.jobs.jobs:
+                if str(job.id) == iid:
+                    self.jobs.cancel(job)
+
+    def clear_finished(self):
+        self.jobs.clear_finished()
+        remaining = {str(job.id) for job in self.jobs.jobs}
+        for iid in self.tree.get_children():
+            if iid not in remaining:
+                self.tree.delete(iid)
+
+    def lift(self):
+        self.window.deiconify()
+        self.window.lift()
+
+    def close(self):
+        self.jobs.remove_listener(self.show_job)
+        if self.window.winfo_exists():
+            self.window.destroy()
@@ -0,0 +1,58 @@
+import csv
+import os
+
+# Rows pulled from the cursor per chunk
+EXPORT_CHUNK_SIZE = 5000
+
+
+class ExportCancelled(Exception):
+    """Raised when an export is cancelled part way through"""
+
+
+def export_query_to_csv(db, sql, params, file_path, headers, format_row=None, total=None,
+                        progress=None, cancelled=None, trailer=(), chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream the rows of a query to a CSV file and return how many were written
+
+    Rows are pulled from the cursor with fetchmany and written as they
+    arrive, so memory use does not depend on the size of the result.
+    progress(written, total) is called after every chunk and the export
+    stops with ExportCancelled as soon as cancelled() returns True. The
+    file only appears at file_path once the export has completed. It is
+    written as UTF-8 with a byte order mark, which Excel and the trip
+    import both read, whatever the system's locale encoding.
+    """
+    temp_path = file_path + ".part"
+    written = 0
+
+    try:
+        with open(temp_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(headers)
+
+            cursor = db.reader.execute(sql, params)
+            try:
+                while True:
+                    if cancelled is not None and cancelled():
+                        raise ExportCancelled()
+
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+
+                    writer.writerows(map(format_row, rows) if format_row is not None else rows)
+                    written += len(rows)
+
+                    if progress is not None:
+                        progress(written, total)
+            finally:
+                cursor.close()
+
+            writer.writerows(trailer)
+
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return written
@@ -0,0 +1,111 @@
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Money is stored and summed as whole minor units (cents) of a shilling; this
+# module is the only place amounts are converted to and from text
+MINOR_UNITS = 100
+
+
+def to_minor_units(value):
+    """Convert an amount as typed (or a number) to integer minor units
+
+    Raises ValueError if value is not a finite number.
+    """
+    try:
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {value!r}")
+    if not amount.is_finite():
+        raise ValueError(f"Invalid amount: {value!r}")
+
+    return int((amount * MINOR_UNITS).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def format_amount(minor_units):
+    """Format an amount in minor units the way every table and report shows it"""
+    units, cents = divmod(abs(minor_units), MINOR_UNITS)
+    return f"{'-' if minor_units < 0 else ''}{units}.{cents:02d}"
+
+
+# Dates are stored as day numbers, counted from 1970-01-01 (day 0)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def to_day_number(value):
+    """Convert a YYYY-MM-DD date (or a date) to its day number; day numbers pass through
+
+    Raises ValueError with a message for the user if value is not a date.
+    """
+    if isinstance(value, int):
+        return value
+    if not isinstance(value, date):
+        try:
+            value = datetime.strptime(str(value).strip(), '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError("Date must be in YYYY-MM-DD format!")
+
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+def to_date(day_number):
+    """Return the date of a day number"""
+    return date.fromordinal(day_number + EPOCH_ORDINAL)
+
+
+def format_date(day_number):
+    """Format a day number as YYYY-MM-DD, the way every table and report shows dates"""
+    return to_date(day_number).isoformat()
+
+
+def format_trip(trip):
+    """Format a trips row for display and export"""
+    trip_id, day, client, cargo, route, income, expenses, driver = trip
+
+    return (trip_id, format_date(day), client, cargo, route, format_amount(income), format_amount(expenses), driver)
+
+
+def format_trip_report_row(trip):
+    """Format a trips row for the PDF report, which leaves out the ID"""
+    return format_trip(trip)[1:]
+
+
+def format_payment(payment):
+    """Format a driver_payment_summary row for display and export"""
+    driver_name, trip_count, total_income, total_expenses, net_payment = payment
+
+    return (driver_name, trip_count, format_amount(total_income), format_amount(total_expenses),
+            format_amount(net_payment))
+
+
+def format_balance(customer_name, balance):
+    """Format a customer_balances row for display and export"""
+    return (customer_name, format_amount(balance))
+
+
+def format_transaction(transaction):
+    """Format a customer_transactions row and its customer's running balance for display"""
+    t_id, customer_name, day, amount_owed, amount_paid, running_balance = transaction
+
+    return (t_id, customer_name, format_date(day), format_amount(amount_owed), format_amount(amount_paid),
+            format_amount(running_balance))
+
+
+def format_aging(row):
+    """Format an aging report row (customer, four age buckets, total) for display and export"""
+    return (row[0],) + tuple(format_amount(amount) for amount in row[1:])
+
+
+def format_maintenance_record(record):
+    """Format a maintenance row for display"""
+    record_id, plate, day, description, cost = record
+
+    return (record_id, plate, format_date(day), description, format_amount(cost))
+
+
+def format_inventory_item(item):
+    """Format an inventory row for display, with its stock value and LOW/OK status"""
+    item_id, name, quantity, purchase_price, sale_price, reorder_level = item
+    status = "LOW" if quantity <= reorder_level else "OK"
+
+    return (item_id, name, quantity, reorder_level, format_amount(purchase_price), format_amount(sale_price),
+            format_amount(quantity * purchase_price), status)
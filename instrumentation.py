@@ -0,0 +1,159 @@
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+
+# Statements slower than this (milliseconds) are written to the slow query log with their plan
+SLOW_QUERY_MS = float(os.environ.get('EASYLOGIPRO_SLOW_QUERY_MS', 200))
+SLOW_QUERY_LOG = os.environ.get('EASYLOGIPRO_SLOW_QUERY_LOG', 'slow_queries.log')
+
+# Upper bounds (milliseconds) of the latency histogram buckets; the last bucket is open-ended
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Longest parameter list written to the slow query log
+MAX_LOGGED_PARAMS = 200
+
+
+@lru_cache(maxsize=1024)
+def statement_name(sql):
+    """Return a statement on one line, which is how its timings are grouped"""
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+class LatencyHistogram:
+    """Count, total, maximum and bucketed latencies of one operation, plus the rows it handled"""
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+
+    def add(self, seconds, rows=None):
+        self.counts[bisect_left(HISTOGRAM_BOUNDS_MS, seconds * 1000)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if rows is not None:
+            self.rows += rows
+
+    def percentile(self, fraction):
+        """Return the upper bound (ms) of the bucket holding the given fraction of calls"""
+        needed = fraction * self.count
+        seen = 0
+        for bound, count in zip(HISTOGRAM_BOUNDS_MS, self.counts):
+            seen += count
+            if seen >= needed:
+                return bound
+        return round(self.max * 1000, 1)
+
+    def as_dict(self):
+        buckets = {f"<={bound}ms": count for bound, count in zip(HISTOGRAM_BOUNDS_MS, self.counts)}
+        buckets[f">{HISTOGRAM_BOUNDS_MS[-1]}ms"] = self.counts[-1]
+        return {
+            'count': self.count,
+            'rows': self.rows,
+            'total_ms': round(self.total * 1000, 1),
+            'mean_ms': round(self.total * 1000 / self.count, 2) if self.count else 0,
+            'max_ms': round(self.max * 1000, 1),
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'buckets': buckets,
+        }
+
+
+class Instrumentation:
+    """Latency histograms for database statements and UI updates, and the slow query log
+
+    Operations are named by the caller: database statements by their SQL,
+    background tasks and the Treeview updates they feed by their task key.
+    Listeners are called with (operation, seconds, rows) on the thread
+    that recorded the timing.
+    """
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS, slow_query_log=SLOW_QUERY_LOG):
+        self.slow_query_ms = slow_query_ms
+        self.slow_query_log = slow_query_log
+        self.started = time.time()
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call callback(operation, seconds, rows) after every recorded timing"""
+        self._listeners.append(callback)
+
+    def record(self, operation, seconds, rows=None, sql=None, params=(), explain=None):
+        """Add one timing of an operation
+
+        For a database statement pass its sql and params; if it took
+        longer than slow_query_ms it is written to the slow query log,
+        with the plan returned by explain() when given.
+        """
+        with self._lock:
+            histogram = self._histograms.get(operation)
+            if histogram is None:
+                histogram = self._histograms[operation] = LatencyHistogram()
+            histogram.add(seconds, rows)
+
+        if sql is not None and self.slow_query_log and seconds * 1000 >= self.slow_query_ms:
+            self._log_slow_query(sql, params, seconds, rows, explain)
+
+        for callback in list(self._listeners):
+            try:
+                callback(operation, seconds, rows)
+            except Exception:
+                pass
+
+    def _log_slow_query(self, sql, params, seconds, rows, explain):
+        try:
+            plan = explain() if explain is not None else []
+        except Exception as e:
+            plan = [f"(no plan: {e})"]
+
+        params = repr(tuple(params))
+        if len(params) > MAX_LOGGED_PARAMS:
+            params = params[:MAX_LOGGED_PARAMS] + "..."
+
+        lines = [f"{time.strftime('%Y-%m-%d %H:%M:%S')}  {seconds * 1000:.1f} ms"
+                 + (f"  {rows:,} rows" if rows is not None else ""),
+                 f"  {statement_name(sql)}",
+                 f"  params: {params}"]
+        lines += [f"  plan: {step}" for step in plan]
+
+        try:
+            with self._log_lock, open(self.slow_query_log, 'a') as log:
+                log.write("\n".join(lines) + "\n\n")
+        except OSError:
+            pass  # A read-only folder must not break the query that was logged
+
+    def stats(self):
+        """Return {operation: histogram dict}, slowest total first"""
+        with self._lock:
+            stats = {operation: histogram.as_dict() for operation, histogram in self._histograms.items()}
+        return dict(sorted(stats.items(), key=lambda item: item[1]['total_ms'], reverse=True))
+
+    def dump(self, path):
+        """Write the stats collected so far to a JSON file"""
+        with open(path + ".part", 'w') as f:
+            json.dump({
+                'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started)),
+                'dumped': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'slow_query_ms': self.slow_query_ms,
+                'histogram_bounds_ms': list(HISTOGRAM_BOUNDS_MS),
+                'operations': self.stats(),
+            }, f, indent=2)
+        os.replace(path + ".part", path)
+
+
+_instrumentation = Instrumentation()
+
+
+def get_instrumentation():
+    """Return the instrumentation shared by the database and the UI"""
+    return _instrumentation
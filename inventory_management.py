@@ -1,14 +1,21 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
+from database import get_db
+from formatting import format_inventory_item, to_minor_units
+from reports import INVENTORY_QUERY
+from background import QueryExecutor
+from stock_monitor import LowStockMonitor
+from treeview_utils import upsert_row
+
+# Reorder level suggested for new items
+DEFAULT_REORDER_LEVEL = 5
 
 class InventoryManagement:
-    def __init__(self, parent):
+    def __init__(self, parent, executor=None, low_stock_monitor=None):
         self.parent = parent
-        
-        # Set default low stock threshold
-        self.low_stock_threshold = 5
+        self.executor = executor or QueryExecutor(parent)
+        self.low_stock_monitor = low_stock_monitor or LowStockMonitor(parent, self.executor)
         
         # Create widgets
         self.create_widgets()
@@ -26,12 +33,6 @@ class InventoryManagement:
         table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
         # Control panel widgets
-        ttk.Label(control_frame, text="Low Stock Threshold:").pack(side=tk.LEFT, padx=(0, 5))
-        self.threshold_entry = ttk.Entry(control_frame, width=6)
-        self.threshold_entry.pack(side=tk.LEFT, padx=5)
-        self.threshold_entry.insert(0, str(self.low_stock_threshold))
-        
-        ttk.Button(control_frame, text="Set Threshold", command=self.set_threshold).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="Check Low Stock", command=self.check_low_stock).pack(side=tk.LEFT, padx=5)
         
         # Form widgets
@@ -47,6 +48,11 @@ class InventoryManagement:
         self.quantity_entry = ttk.Entry(row1, width=10)
         self.quantity_entry.pack(side=tk.LEFT, padx=5)
         
+        ttk.Label(row1, text="Reorder Level:").pack(side=tk.LEFT, padx=(10, 5))
+        self.reorder_entry = ttk.Entry(row1, width=10)
+        self.reorder_entry.pack(side=tk.LEFT, padx=5)
+        self.reorder_entry.insert(0, str(DEFAULT_REORDER_LEVEL))
+        
         # Row 2
         row2 = ttk.Frame(form_frame)
         row2.pack(fill=tk.X, padx=5, pady=5)
@@ -72,17 +78,21 @@ class InventoryManagement:
         self.delete_button = ttk.Button(button_frame, text="Delete Selected", command=self.delete_item, state=tk.DISABLED)
         self.delete_button.pack(side=tk.LEFT, padx=5, pady=5)
         
+        self.refresh_button = ttk.Button(button_frame, text="Refresh", command=self.load_inventory)
+        self.refresh_button.pack(side=tk.RIGHT, padx=5, pady=5)
+        
         self.clear_button = ttk.Button(button_frame, text="Clear Form", command=self.clear_form)
         self.clear_button.pack(side=tk.LEFT, padx=5, pady=5)
         
         # Create Treeview
-        columns = ("id", "item_name", "quantity", "purchase_price", "sale_price", "value", "status")
+        columns = ("id", "item_name", "quantity", "reorder_level", "purchase_price", "sale_price", "value", "status")
         self.tree = ttk.Treeview(table_frame, columns=columns, show="headings", selectmode="browse")
         
         # Set column headings
         self.tree.heading("id", text="ID")
         self.tree.heading("item_name", text="Item Name")
         self.tree.heading("quantity", text="Quantity")
+        self.tree.heading("reorder_level", text="Reorder Level")
         self.tree.heading("purchase_price", text="Purchase Price (TZS)")
         self.tree.heading("sale_price", text="Sale Price (TZS)")
         self.tree.heading("value", text="Total Value (TZS)")
@@ -92,6 +102,7 @@ class InventoryManagement:
         self.tree.column("id", width=40)
         self.tree.column("item_name", width=200)
         self.tree.column("quantity", width=80)
+        self.tree.column("reorder_level", width=90)
         self.tree.column("purchase_price", width=120)
         self.tree.column("sale_price", width=120)
         self.tree.column("value", width=120)
@@ -114,71 +125,44 @@ class InventoryManagement:
         self.tree.tag_configure('low_stock', background='#ffcccc')
         self.tree.tag_configure('ok_stock', background='white')
     
-    def set_threshold(self):
-        try:
-            new_threshold = int(self.threshold_entry.get())
-            if new_threshold < 0:
-                messagebox.showwarning("Invalid Value", "Threshold must be a positive number.")
-                return
-                
-            self.low_stock_threshold = new_threshold
-            messagebox.showinfo("Threshold Set", f"Low stock threshold set to {self.low_stock_threshold} items.")
-            self.load_inventory()  # Reload to update status colors
-        except ValueError:
-            messagebox.showwarning("Invalid Value", "Please enter a valid number.")
-    
     def check_low_stock(self):
-        low_stock_items = []
-        
-        for item_id in self.tree.get_children():
-            values = self.tree.item(item_id, "values")
-            quantity = int(values[2])
-            if quantity <= self.low_stock_threshold:
-                low_stock_items.append(f"{values[1]} (Qty: {quantity})")
-        
-        if low_stock_items:
-            message = "The following items are low in stock:\n\n"
-            message += "\n".join(low_stock_items)
-            messagebox.showwarning("Low Stock Alert", message)
-        else:
-            messagebox.showinfo("Stock Status", "All items are above the low stock threshold.")
+        """List the items at or below their reorder level, straight from the database"""
+        self.low_stock_monitor.show_low_stock()
     
     def load_inventory(self):
         # Clear existing items
         for item in self.tree.get_children():
             self.tree.delete(item)
         
-        # Connect to the database
-        conn = sqlite3.connect('easylogipro.db')
-        cursor = conn.cursor()
+        def fetch_items(task):
+            # Get all items
+            rows = get_db().iterate(INVENTORY_QUERY)
+            
+            for item in rows:
+                yield self.format_item(item)
         
-        # Get all items
-        cursor.execute("SELECT * FROM inventory ORDER BY item_name")
-        items = cursor.fetchall()
+        def add_items(rows):
+            # Add items to treeview
+            for values, tag in rows:
+                # An item saved while the load runs is already shown, up to date
+                if not self.tree.exists(str(values[0])):
+                    self.tree.insert("", tk.END, iid=str(values[0]), values=values, tags=(tag,))
         
-        # Add items to treeview
-        for item in items:
-            item_id, name, quantity, purchase_price, sale_price = item
-            
-            # Calculate total value based on purchase price
-            total_value = quantity * purchase_price
-            
-            purchase_formatted = f"{float(purchase_price):.2f}"
-            sale_formatted = f"{float(sale_price):.2f}"
-            value_formatted = f"{float(total_value):.2f}"
-            
-            # Determine status based on quantity
-            status = "OK"
-            tag = 'ok_stock'
-            
-            if quantity <= self.low_stock_threshold:
-                status = "LOW"
-                tag = 'low_stock'
-                
-            self.tree.insert("", tk.END, values=(item_id, name, quantity, purchase_formatted, 
-                                             sale_formatted, value_formatted, status), tags=(tag,))
+        # Query and format on a worker thread, filling the tree in batches
+        self.executor.submit(
+            "inventory", fetch_items, on_batch=add_items,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to load inventory: {str(e)}"))
+    
+    def format_item(self, item):
+        values = format_inventory_item(item)
+        tag = 'low_stock' if values[-1] == "LOW" else 'ok_stock'
         
-        conn.close()
+        return values, tag
+    
+    def show_item(self, item):
+        """Insert or move a single item to its place in the tree"""
+        values, tag = self.format_item(item)
+        upsert_row(self.tree, str(values[0]), values, sort_key=lambda row: str(row[1]), tags=(tag,))
     
     # ... keep existing code (clear_form, validate_form methods)
     
@@ -190,39 +174,31 @@ class InventoryManagement:
             # Get values from form
             name = self.name_entry.get()
             quantity = int(self.quantity_entry.get())
-            purchase_price = float(self.purchase_entry.get())
-            sale_price = float(self.sale_entry.get())
-            
-            # Connect to database
-            conn = sqlite3.connect('easylogipro.db')
-            cursor = conn.cursor()
+            reorder_level = int(self.reorder_entry.get())
+            purchase_price = to_minor_units(self.purchase_entry.get())
+            sale_price = to_minor_units(self.sale_entry.get())
             
-            # Check if item already exists
-            cursor.execute("SELECT id FROM inventory WHERE item_name=?", (name,))
-            existing = cursor.fetchone()
+            db = get_db()
             
-            if existing:
+            # Check if item already exists, before taking the write lock, so the
+            # error dialog never holds it
+            if db.query_one("SELECT id FROM inventory WHERE item_name=?", (name,)):
                 messagebox.showerror("Error", f"An item with the name '{name}' already exists.")
-                conn.close()
                 return
             
             # Insert new item
-            cursor.execute('''
-            INSERT INTO inventory (item_name, quantity, purchase_price, sale_price)
-            VALUES (?, ?, ?, ?)
-            ''', (name, quantity, purchase_price, sale_price))
-            
-            conn.commit()
-            conn.close()
+            item_id = db.execute('''
+            INSERT INTO inventory (item_name, quantity, purchase_price, sale_price, reorder_level)
+            VALUES (?, ?, ?, ?, ?)
+            ''', (name, quantity, purchase_price, sale_price, reorder_level))
             
-            # Refresh inventory and clear form
-            self.load_inventory()
+            # Show the new item and clear form
+            self.show_item((item_id, name, quantity, purchase_price, sale_price, reorder_level))
             self.clear_form()
             messagebox.showinfo("Success", "Inventory item added successfully!")
             
-            # Check if the item is below threshold and alert
-            if quantity <= self.low_stock_threshold:
-                messagebox.showwarning("Low Stock Alert", f"The item '{name}' has been added with a quantity of {quantity}, which is below or at the low stock threshold ({self.low_stock_threshold}).")
+            # The monitor alerts if the item is already at its reorder level
+            self.low_stock_monitor.check_now()
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to add inventory item: {str(e)}")
@@ -241,45 +217,36 @@ class InventoryManagement:
             # Get updated values
             name = self.name_entry.get()
             quantity = int(self.quantity_entry.get())
-            purchase_price = float(self.purchase_entry.get())
-            sale_price = float(self.sale_entry.get())
+            reorder_level = int(self.reorder_entry.get())
+            purchase_price = to_minor_units(self.purchase_entry.get())
+            sale_price = to_minor_units(self.sale_entry.get())
             
             # Confirm update
             confirm = messagebox.askyesno("Confirm Update", "Are you sure you want to update this inventory item?")
             if not confirm:
                 return
             
-            # Connect to database
-            conn = sqlite3.connect('easylogipro.db')
-            cursor = conn.cursor()
+            db = get_db()
             
-            # Check if updated name conflicts with another item
-            cursor.execute("SELECT id FROM inventory WHERE item_name=? AND id!=?", (name, item_id))
-            existing = cursor.fetchone()
-            
-            if existing:
+            # Check if updated name conflicts with another item, outside the write lock
+            if db.query_one("SELECT id FROM inventory WHERE item_name=? AND id!=?", (name, item_id)):
                 messagebox.showerror("Error", f"Another item with the name '{name}' already exists.")
-                conn.close()
                 return
             
             # Update item
-            cursor.execute('''
+            db.execute('''
             UPDATE inventory
-            SET item_name=?, quantity=?, purchase_price=?, sale_price=?
+            SET item_name=?, quantity=?, purchase_price=?, sale_price=?, reorder_level=?
             WHERE id=?
-            ''', (name, quantity, purchase_price, sale_price, item_id))
-            
-            conn.commit()
-            conn.close()
+            ''', (name, quantity, purchase_price, sale_price, reorder_level, item_id))
             
-            # Refresh inventory and clear form
-            self.load_inventory()
+            # Update the item in place and clear form
+            self.show_item((item_id, name, quantity, purchase_price, sale_price, reorder_level))
             self.clear_form()
             messagebox.showinfo("Success", "Inventory item updated successfully!")
             
-            # Check if the updated item is below threshold
-            if quantity <= self.low_stock_threshold:
-                messagebox.showwarning("Low Stock Alert", f"The item '{name}' has been updated with a quantity of {quantity}, which is below or at the low stock threshold ({self.low_stock_threshold}).")
+            # The monitor alerts if the item has fallen to its reorder level
+            self.low_stock_monitor.check_now()
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to update inventory item: {str(e)}")
@@ -0,0 +1,70 @@
+import threading
+from datetime import date
+
+from database import get_db
+from formatting import to_day_number
+from reports import AGING_QUERY
+
+# Aging reports kept per as-of date; one is normally enough, for today
+MAX_CACHED_AGING_REPORTS = 4
+
+
+class LedgerCache:
+    """Customer aging reports, kept until the ledger changes
+
+    The ledger triggers bump ledger_version on every insert, update and
+    delete, so each lookup checks it with a single primary key probe and
+    the window query behind a report only runs again after a transaction
+    has changed, in this or another instance.
+    """
+
+    def __init__(self, db=None):
+        self.db = db
+        self._lock = threading.Lock()
+        self._version = None
+        self._aging = {}
+
+    def version(self):
+        """Return the ledger's current version"""
+        return (self.db or get_db()).query_one("SELECT version FROM ledger_version WHERE id = 1")[0]
+
+    def aging(self, as_of=None):
+        """Return the aging report as of a date (default today)
+
+        Rows are (customer_name, 0-30 days, 31-60 days, 61-90 days, over 90
+        days, total) in minor units, for every customer who owes money,
+        largest total first.
+        """
+        as_of = to_day_number(as_of if as_of is not None else date.today())
+        db = self.db or get_db()
+        version = self.version()
+
+        with self._lock:
+            if version != self._version:
+                self._aging.clear()
+                self._version = version
+
+            rows = self._aging.get(as_of)
+            if rows is None:
+                rows = db.query(AGING_QUERY, (as_of,))
+                if len(self._aging) >= MAX_CACHED_AGING_REPORTS:
+                    self._aging.clear()
+                self._aging[as_of] = rows
+            return rows
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+
+_ledger_cache = None
+_ledger_cache_lock = threading.Lock()
+
+
+def get_ledger_cache():
+    """Return the shared ledger cache"""
+    global _ledger_cache
+    with _ledger_cache_lock:
+        if _ledger_cache is None:
+            _ledger_cache = LedgerCache()
+        return _ledger_cache
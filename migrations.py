@@ -0,0 +1,756 @@
+def _create_base_tables(cursor):
+    # Create trips table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS trips (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        client_name TEXT NOT NULL,
+        cargo_type TEXT NOT NULL,
+        route TEXT NOT NULL,
+        trip_income REAL NOT NULL,
+        fuel_expenses REAL NOT NULL,
+        driver_name TEXT NOT NULL
+    )
+    ''')
+
+    # Create maintenance table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS maintenance (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        vehicle_plate_number TEXT NOT NULL,
+        service_date TEXT NOT NULL,
+        description TEXT NOT NULL,
+        cost REAL NOT NULL
+    )
+    ''')
+
+    # Create inventory table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS inventory (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_name TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        purchase_price REAL NOT NULL,
+        sale_price REAL NOT NULL
+    )
+    ''')
+
+    # Create customer_transactions table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS customer_transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_name TEXT NOT NULL,
+        date TEXT NOT NULL,
+        amount_owed REAL NOT NULL,
+        amount_paid REAL NOT NULL
+    )
+    ''')
+
+
+def _add_query_indexes(cursor):
+    # Trip list ordering and the driver filter
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_trips_date ON trips (date, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_trips_driver_date ON trips (driver_name, date, id)")
+
+    # Covers the per-driver payment aggregation without touching the table
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_trips_driver_amounts
+    ON trips (driver_name, trip_income, fuel_expenses)
+    ''')
+
+    # Maintenance history ordering
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_maintenance_service_date ON maintenance (service_date, id)")
+
+    # Item name lookups and ordering
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_item_name ON inventory (item_name)")
+
+    # Ledger ordering and the covering index for customer balances
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customer_transactions_date ON customer_transactions (date, id)")
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_customer_transactions_balance
+    ON customer_transactions (customer_name, amount_owed, amount_paid)
+    ''')
+
+
+def _add_driver_payment_summary(cursor):
+    # One row per driver, kept current by the triggers below
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS driver_payment_summary (
+        driver_name TEXT PRIMARY KEY,
+        trip_count INTEGER NOT NULL,
+        total_income REAL NOT NULL,
+        total_expenses REAL NOT NULL
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_trips_payment_summary_insert
+    AFTER INSERT ON trips
+    BEGIN
+        INSERT INTO driver_payment_summary (driver_name, trip_count, total_income, total_expenses)
+        VALUES (NEW.driver_name, 1, NEW.trip_income, NEW.fuel_expenses)
+        ON CONFLICT (driver_name) DO UPDATE SET
+            trip_count = trip_count + 1,
+            total_income = total_income + excluded.total_income,
+            total_expenses = total_expenses + excluded.total_expenses;
+    END
+    ''')
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_trips_payment_summary_delete
+    AFTER DELETE ON trips
+    BEGIN
+        UPDATE driver_payment_summary
+        SET trip_count = trip_count - 1,
+            total_income = total_income - OLD.trip_income,
+            total_expenses = total_expenses - OLD.fuel_expenses
+        WHERE driver_name = OLD.driver_name;
+        DELETE FROM driver_payment_summary WHERE driver_name = OLD.driver_name AND trip_count <= 0;
+    END
+    ''')
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_trips_payment_summary_update
+    AFTER UPDATE OF driver_name, trip_income, fuel_expenses ON trips
+    BEGIN
+        UPDATE driver_payment_summary
+        SET trip_count = trip_count - 1,
+            total_income = total_income - OLD.trip_income,
+            total_expenses = total_expenses - OLD.fuel_expenses
+        WHERE driver_name = OLD.driver_name;
+        DELETE FROM driver_payment_summary WHERE driver_name = OLD.driver_name AND trip_count <= 0;
+        INSERT INTO driver_payment_summary (driver_name, trip_count, total_income, total_expenses)
+        VALUES (NEW.driver_name, 1, NEW.trip_income, NEW.fuel_expenses)
+        ON CONFLICT (driver_name) DO UPDATE SET
+            trip_count = trip_count + 1,
+            total_income = total_income + excluded.total_income,
+            total_expenses = total_expenses + excluded.total_expenses;
+    END
+    ''')
+
+    # Backfill from the existing trips
+    cursor.execute("DELETE FROM driver_payment_summary")
+    cursor.execute('''
+    INSERT INTO driver_payment_summary (driver_name, trip_count, total_income, total_expenses)
+    SELECT driver_name, COUNT(*), SUM(trip_income), SUM(fuel_expenses)
+    FROM trips
+    GROUP BY driver_name
+    ''')
+
+
+def _add_customer_balances(cursor):
+    # One row per customer, kept current by the triggers below
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS customer_balances (
+        customer_name TEXT PRIMARY KEY,
+        transaction_count INTEGER NOT NULL,
+        total_owed REAL NOT NULL,
+        total_paid REAL NOT NULL,
+        balance REAL NOT NULL
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customer_balances_balance ON customer_balances (balance, customer_name)")
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_customer_transactions_balance_insert
+    AFTER INSERT ON customer_transactions
+    BEGIN
+        INSERT INTO customer_balances (customer_name, transaction_count, total_owed, total_paid, balance)
+        VALUES (NEW.customer_name, 1, NEW.amount_owed, NEW.amount_paid, NEW.amount_owed - NEW.amount_paid)
+        ON CONFLICT (customer_name) DO UPDATE SET
+            transaction_count = transaction_count + 1,
+            total_owed = total_owed + excluded.total_owed,
+            total_paid = total_paid + excluded.total_paid,
+            balance = balance + excluded.balance;
+    END
+    ''')
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_customer_transactions_balance_delete
+    AFTER DELETE ON customer_transactions
+    BEGIN
+        UPDATE customer_balances
+        SET transaction_count = transaction_count - 1,
+            total_owed = total_owed - OLD.amount_owed,
+            total_paid = total_paid - OLD.amount_paid,
+            balance = balance - (OLD.amount_owed - OLD.amount_paid)
+        WHERE customer_name = OLD.customer_name;
+        DELETE FROM customer_balances WHERE customer_name = OLD.customer_name AND transaction_count <= 0;
+    END
+    ''')
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_customer_transactions_balance_update
+    AFTER UPDATE OF customer_name, amount_owed, amount_paid ON customer_transactions
+    BEGIN
+        UPDATE customer_balances
+        SET transaction_count = transaction_count - 1,
+            total_owed = total_owed - OLD.amount_owed,
+            total_paid = total_paid - OLD.amount_paid,
+            balance = balance - (OLD.amount_owed - OLD.amount_paid)
+        WHERE customer_name = OLD.customer_name;
+        DELETE FROM customer_balances WHERE customer_name = OLD.customer_name AND transaction_count <= 0;
+        INSERT INTO customer_balances (customer_name, transaction_count, total_owed, total_paid, balance)
+        VALUES (NEW.customer_name, 1, NEW.amount_owed, NEW.amount_paid, NEW.amount_owed - NEW.amount_paid)
+        ON CONFLICT (customer_name) DO UPDATE SET
+            transaction_count = transaction_count + 1,
+            total_owed = total_owed + excluded.total_owed,
+            total_paid = total_paid + excluded.total_paid,
+            balance = balance + excluded.balance;
+    END
+    ''')
+
+    rebuild_customer_balances(cursor)
+
+
+def rebuild_customer_balances(cursor):
+    """Recompute the customer balance cache from the full ledger"""
+    cursor.execute("DELETE FROM customer_balances")
+    cursor.execute('''
+    INSERT INTO customer_balances (customer_name, transaction_count, total_owed, total_paid, balance)
+    SELECT customer_name, COUNT(*), SUM(amount_owed), SUM(amount_paid), SUM(amount_owed) - SUM(amount_paid)
+    FROM customer_transactions
+    GROUP BY customer_name
+    ''')
+
+
+def _add_trip_search_index(cursor):
+    # Full-text index over the trip text columns, reading its content from trips
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS trips_fts USING fts5 (
+        client_name, cargo_type, route, driver_name,
+        content = 'trips', content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_trips_fts_insert
+    AFTER INSERT ON trips
+    BEGIN
+        INSERT INTO trips_fts (rowid, client_name, cargo_type, route, driver_name)
+        VALUES (NEW.id, NEW.client_name, NEW.cargo_type, NEW.route, NEW.driver_name);
+    END
+    ''')
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_trips_fts_delete
+    AFTER DELETE ON trips
+    BEGIN
+        INSERT INTO trips_fts (trips_fts, rowid, client_name, cargo_type, route, driver_name)
+        VALUES ('delete', OLD.id, OLD.client_name, OLD.cargo_type, OLD.route, OLD.driver_name);
+    END
+    ''')
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_trips_fts_update
+    AFTER UPDATE OF client_name, cargo_type, route, driver_name ON trips
+    BEGIN
+        INSERT INTO trips_fts (trips_fts, rowid, client_name, cargo_type, route, driver_name)
+        VALUES ('delete', OLD.id, OLD.client_name, OLD.cargo_type, OLD.route, OLD.driver_name);
+        INSERT INTO trips_fts (rowid, client_name, cargo_type, route, driver_name)
+        VALUES (NEW.id, NEW.client_name, NEW.cargo_type, NEW.route, NEW.driver_name);
+    END
+    ''')
+
+    # Index the existing trips
+    cursor.execute("INSERT INTO trips_fts (trips_fts) VALUES ('rebuild')")
+
+
+def _add_drivers_table(cursor):
+    # One row per driver name; ids only ever grow, since drivers are never deleted
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS drivers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE
+    )
+    ''')
+    cursor.execute("ALTER TABLE trips ADD COLUMN driver_id INTEGER REFERENCES drivers (id)")
+
+    # Writers that already know the driver id set it directly; for the rest
+    # the driver is registered and the id filled in after the insert
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_trips_driver_insert
+    AFTER INSERT ON trips
+    WHEN NEW.driver_id IS NULL
+    BEGIN
+        INSERT OR IGNORE INTO drivers (name) VALUES (NEW.driver_name);
+        UPDATE trips SET driver_id = (SELECT id FROM drivers WHERE name = NEW.driver_name)
+        WHERE id = NEW.id;
+    END
+    ''')
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_trips_driver_update
+    AFTER UPDATE OF driver_name ON trips
+    BEGIN
+        INSERT OR IGNORE INTO drivers (name) VALUES (NEW.driver_name);
+        UPDATE trips SET driver_id = (SELECT id FROM drivers WHERE name = NEW.driver_name)
+        WHERE id = NEW.id;
+    END
+    ''')
+
+    # Register the existing drivers and link their trips
+    cursor.execute("INSERT OR IGNORE INTO drivers (name) SELECT DISTINCT driver_name FROM trips ORDER BY driver_name")
+    cursor.execute("UPDATE trips SET driver_id = (SELECT id FROM drivers WHERE name = trips.driver_name)")
+
+
+def _add_trip_filter_indexes(cursor):
+    # Client, cargo and route filters match ignoring case and list newest first
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_trips_client_date ON trips (client_name COLLATE NOCASE, date, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_trips_cargo_date ON trips (cargo_type COLLATE NOCASE, date, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_trips_route_date ON trips (route COLLATE NOCASE, date, id)")
+
+
+def _create_rollup_triggers(cursor, periods):
+    # Keep each trip_rollups_<granularity> table current as trips change.
+    # periods maps granularity to the SQL period of a trips row named {row}.
+    def add(row):
+        return "".join(f'''
+        INSERT INTO trip_rollups_{granularity} (dimension, key, period, trip_count, total_income, total_expenses)
+        SELECT dimension, key, {period.format(row=row)}, 1, {row}.trip_income, {row}.fuel_expenses
+        FROM (SELECT 'driver' AS dimension, {row}.driver_name AS key
+              UNION ALL SELECT 'client', {row}.client_name
+              UNION ALL SELECT 'route', {row}.route
+              UNION ALL SELECT 'all', '')
+        WHERE true
+        ON CONFLICT (dimension, period, key) DO UPDATE SET
+            trip_count = trip_count + 1,
+            total_income = total_income + excluded.total_income,
+            total_expenses = total_expenses + excluded.total_expenses;
+        ''' for granularity, period in periods.items())
+
+    def remove(row):
+        return "".join(f'''
+        UPDATE trip_rollups_{granularity}
+        SET trip_count = trip_count - 1,
+            total_income = total_income - {row}.trip_income,
+            total_expenses = total_expenses - {row}.fuel_expenses
+        WHERE period = {period.format(row=row)}
+          AND ((dimension = 'driver' AND key = {row}.driver_name)
+            OR (dimension = 'client' AND key = {row}.client_name)
+            OR (dimension = 'route' AND key = {row}.route)
+            OR (dimension = 'all' AND key = ''));
+        DELETE FROM trip_rollups_{granularity} WHERE period = {period.format(row=row)} AND trip_count <= 0;
+        ''' for granularity, period in periods.items())
+
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_trips_rollups_insert AFTER INSERT ON trips BEGIN {add('NEW')} END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_trips_rollups_delete AFTER DELETE ON trips BEGIN {remove('OLD')} END")
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_trips_rollups_update
+    AFTER UPDATE OF date, client_name, route, driver_name, trip_income, fuel_expenses ON trips
+    BEGIN {remove('OLD')} {add('NEW')} END
+    ''')
+
+
+def _add_trip_rollups(cursor):
+    # Totals per period for each driver, client and route, plus overall ('all', '').
+    # Weeks are keyed by their Monday and months by 'YYYY-MM'.
+    periods = {granularity: period.format(date='{row}.date')
+               for granularity, period in TEXT_DATE_ROLLUP_PERIODS.items()}
+
+    for granularity in periods:
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS trip_rollups_{granularity} (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            period TEXT NOT NULL,
+            trip_count INTEGER NOT NULL,
+            total_income REAL NOT NULL,
+            total_expenses REAL NOT NULL,
+            PRIMARY KEY (dimension, period, key)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_trip_rollups_{granularity}_key "
+                       f"ON trip_rollups_{granularity} (dimension, key, period)")
+
+    _create_rollup_triggers(cursor, periods)
+
+    _rebuild_text_date_rollups(cursor)
+
+
+# SQL for the period of a 'YYYY-MM-DD' text date, as used by steps 8 and 9 before
+# dates became day numbers
+TEXT_DATE_ROLLUP_PERIODS = {
+    'day': "{date}",
+    'week': "date({date}, 'weekday 0', '-6 days')",
+    'month': "substr({date}, 1, 7)",
+}
+
+
+def _rebuild_text_date_rollups(cursor):
+    # Steps 8 and 9 have shipped and keep rebuilding from text dates; later steps
+    # use rebuild_trip_rollups
+    dimensions = {'driver': "driver_name", 'client': "client_name", 'route': "route", 'all': "''"}
+
+    for granularity, period in TEXT_DATE_ROLLUP_PERIODS.items():
+        cursor.execute(f"DELETE FROM trip_rollups_{granularity}")
+        for dimension, key in dimensions.items():
+            cursor.execute(f'''
+            INSERT INTO trip_rollups_{granularity} (dimension, key, period, trip_count, total_income, total_expenses)
+            SELECT '{dimension}', {key}, {period.format(date='date')}, COUNT(*), SUM(trip_income), SUM(fuel_expenses)
+            FROM trips
+            GROUP BY 2, 3
+            ''')
+
+
+# SQL for the period a day number falls in, as the day number of the period's first
+# day. Weeks start on Monday; day 0, 1970-01-01, was a Thursday.
+ROLLUP_PERIODS = {
+    'day': "{day}",
+    'week': "{day} - ({day} % 7 + 10) % 7",
+    'month': "CAST(julianday({day} * 86400, 'unixepoch', 'start of month') - 2440587.5 AS INTEGER)",
+}
+
+
+def rebuild_trip_rollups(cursor):
+    """Recompute the day, week and month trip rollups from the full trip log"""
+    dimensions = {'driver': "driver_name", 'client': "client_name", 'route': "route", 'all': "''"}
+
+    for granularity, period in ROLLUP_PERIODS.items():
+        cursor.execute(f"DELETE FROM trip_rollups_{granularity}")
+        for dimension, key in dimensions.items():
+            cursor.execute(f'''
+            INSERT INTO trip_rollups_{granularity} (dimension, key, period, trip_count, total_income, total_expenses)
+            SELECT '{dimension}', {key}, {period.format(day='date')}, COUNT(*), SUM(trip_income), SUM(fuel_expenses)
+            FROM trips
+            GROUP BY 2, 3
+            ''')
+
+
+def _replace_tables(cursor, rebuilt, recreated):
+    # SQLite cannot change a column's type, so tables are replaced instead. rebuilt
+    # maps each table to the CREATE statement of <table>_new and the SELECT list
+    # copying its rows across; recreated maps summary tables to their CREATE
+    # statement, and they are left empty for the caller to recompute.
+    # Indexes and triggers go with their tables, so keep their definitions to
+    # recreate afterwards. Triggers are dropped first so none refers to a table
+    # while it is being replaced.
+    tables = list(rebuilt) + list(recreated)
+    placeholders = ", ".join("?" * len(tables))
+    cursor.execute(f'''
+    SELECT type, name, sql FROM sqlite_master
+    WHERE type IN ('index', 'trigger') AND tbl_name IN ({placeholders}) AND sql IS NOT NULL
+    ''', tables)
+    dependents = cursor.fetchall()
+    for kind, name, sql in dependents:
+        if kind == 'trigger':
+            cursor.execute(f"DROP TRIGGER {name}")
+
+    # Keep AUTOINCREMENT counters, so ids of deleted rows are still never reused
+    cursor.execute(f"SELECT name, seq FROM sqlite_sequence WHERE name IN ({placeholders})", tables)
+    sequences = cursor.fetchall()
+
+    for table, (create, columns) in rebuilt.items():
+        cursor.execute(create)
+        cursor.execute(f"INSERT INTO {table}_new SELECT {columns} FROM {table}")
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+    for table, create in recreated.items():
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(create)
+
+    for name, seq in sequences:
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = ?", (name,))
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (name, seq))
+
+    for kind, name, sql in dependents:
+        cursor.execute(sql)
+
+
+def _store_money_in_minor_units(cursor):
+    # Amounts become whole cents in INTEGER columns so sums are exact. The summary
+    # tables are recomputed from the converted rows rather than converted themselves.
+    def cents(column):
+        return f"CAST(ROUND({column} * 100) AS INTEGER)"
+
+    base_tables = {
+        'trips': ('''
+        CREATE TABLE trips_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            client_name TEXT NOT NULL,
+            cargo_type TEXT NOT NULL,
+            route TEXT NOT NULL,
+            trip_income INTEGER NOT NULL,
+            fuel_expenses INTEGER NOT NULL,
+            driver_name TEXT NOT NULL,
+            driver_id INTEGER REFERENCES drivers (id)
+        )
+        ''', f"id, date, client_name, cargo_type, route, {cents('trip_income')}, {cents('fuel_expenses')}, "
+             f"driver_name, driver_id"),
+        'maintenance': ('''
+        CREATE TABLE maintenance_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            vehicle_plate_number TEXT NOT NULL,
+            service_date TEXT NOT NULL,
+            description TEXT NOT NULL,
+            cost INTEGER NOT NULL
+        )
+        ''', f"id, vehicle_plate_number, service_date, description, {cents('cost')}"),
+        'inventory': ('''
+        CREATE TABLE inventory_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_name TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            purchase_price INTEGER NOT NULL,
+            sale_price INTEGER NOT NULL
+        )
+        ''', f"id, item_name, quantity, {cents('purchase_price')}, {cents('sale_price')}"),
+        'customer_transactions': ('''
+        CREATE TABLE customer_transactions_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_name TEXT NOT NULL,
+            date TEXT NOT NULL,
+            amount_owed INTEGER NOT NULL,
+            amount_paid INTEGER NOT NULL
+        )
+        ''', f"id, customer_name, date, {cents('amount_owed')}, {cents('amount_paid')}"),
+    }
+
+    summary_tables = {
+        'driver_payment_summary': '''
+        CREATE TABLE driver_payment_summary (
+            driver_name TEXT PRIMARY KEY,
+            trip_count INTEGER NOT NULL,
+            total_income INTEGER NOT NULL,
+            total_expenses INTEGER NOT NULL
+        )
+        ''',
+        'customer_balances': '''
+        CREATE TABLE customer_balances (
+            customer_name TEXT PRIMARY KEY,
+            transaction_count INTEGER NOT NULL,
+            total_owed INTEGER NOT NULL,
+            total_paid INTEGER NOT NULL,
+            balance INTEGER NOT NULL
+        )
+        ''',
+    }
+    for granularity in ('day', 'week', 'month'):
+        summary_tables[f'trip_rollups_{granularity}'] = f'''
+        CREATE TABLE trip_rollups_{granularity} (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            period TEXT NOT NULL,
+            trip_count INTEGER NOT NULL,
+            total_income INTEGER NOT NULL,
+            total_expenses INTEGER NOT NULL,
+            PRIMARY KEY (dimension, period, key)
+        ) WITHOUT ROWID
+        '''
+
+    _replace_tables(cursor, base_tables, summary_tables)
+
+    # Recompute the summaries from the converted amounts
+    cursor.execute('''
+    INSERT INTO driver_payment_summary (driver_name, trip_count, total_income, total_expenses)
+    SELECT driver_name, COUNT(*), SUM(trip_income), SUM(fuel_expenses)
+    FROM trips
+    GROUP BY driver_name
+    ''')
+    rebuild_customer_balances(cursor)
+    _rebuild_text_date_rollups(cursor)
+
+
+def _store_dates_as_day_numbers(cursor):
+    # Dates become day numbers counted from 1970-01-01 in INTEGER columns, so date
+    # ranges, ordering and period bucketing compare narrow integers. A date that is
+    # not a real YYYY-MM-DD date is kept in invalid_dates and stored as day 0.
+    def valid(column):
+        # date() accepts 2024-02-30; going through julianday() rolls it over to March
+        return f"COALESCE(date(julianday(trim({column}))) = substr(trim({column}), 1, 10), 0)"
+
+    def day(column):
+        return f"CASE WHEN {valid(column)} THEN CAST(julianday(date(trim({column}))) - 2440587.5 AS INTEGER) ELSE 0 END"
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS invalid_dates (
+        table_name TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        value TEXT,
+        PRIMARY KEY (table_name, row_id)
+    )
+    ''')
+    for table, column in (('trips', 'date'), ('maintenance', 'service_date'), ('customer_transactions', 'date')):
+        cursor.execute(f'''
+        INSERT OR REPLACE INTO invalid_dates (table_name, row_id, value)
+        SELECT '{table}', id, {column} FROM {table} WHERE NOT ({valid(column)})
+        ''')
+
+    base_tables = {
+        'trips': ('''
+        CREATE TABLE trips_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date INTEGER NOT NULL,
+            client_name TEXT NOT NULL,
+            cargo_type TEXT NOT NULL,
+            route TEXT NOT NULL,
+            trip_income INTEGER NOT NULL,
+            fuel_expenses INTEGER NOT NULL,
+            driver_name TEXT NOT NULL,
+            driver_id INTEGER REFERENCES drivers (id)
+        )
+        ''', f"id, {day('date')}, client_name, cargo_type, route, trip_income, fuel_expenses, driver_name, driver_id"),
+        'maintenance': ('''
+        CREATE TABLE maintenance_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            vehicle_plate_number TEXT NOT NULL,
+            service_date INTEGER NOT NULL,
+            description TEXT NOT NULL,
+            cost INTEGER NOT NULL
+        )
+        ''', f"id, vehicle_plate_number, {day('service_date')}, description, cost"),
+        'customer_transactions': ('''
+        CREATE TABLE customer_transactions_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_name TEXT NOT NULL,
+            date INTEGER NOT NULL,
+            amount_owed INTEGER NOT NULL,
+            amount_paid INTEGER NOT NULL
+        )
+        ''', f"id, customer_name, {day('date')}, amount_owed, amount_paid"),
+    }
+
+    summary_tables = {}
+    for granularity in ROLLUP_PERIODS:
+        summary_tables[f'trip_rollups_{granularity}'] = f'''
+        CREATE TABLE trip_rollups_{granularity} (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            period INTEGER NOT NULL,
+            trip_count INTEGER NOT NULL,
+            total_income INTEGER NOT NULL,
+            total_expenses INTEGER NOT NULL,
+            PRIMARY KEY (dimension, period, key)
+        ) WITHOUT ROWID
+        '''
+
+    # The rollup triggers compute periods from text dates; they are replaced, not restored
+    for name in ('trg_trips_rollups_insert', 'trg_trips_rollups_delete', 'trg_trips_rollups_update'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+    _replace_tables(cursor, base_tables, summary_tables)
+
+    _create_rollup_triggers(cursor, {granularity: period.format(day='{row}.date')
+                                     for granularity, period in ROLLUP_PERIODS.items()})
+    rebuild_trip_rollups(cursor)
+
+
+def _add_ledger_window_index(cursor):
+    # Running balances and aging walk each customer's transactions in date order;
+    # this index delivers them in that order with the amounts, so the window
+    # queries neither touch the table nor sort. It also covers the balance
+    # rebuild, which used the index it replaces.
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_customer_transactions_customer_date
+    ON customer_transactions (customer_name, date, id, amount_owed, amount_paid)
+    ''')
+    cursor.execute("DROP INDEX IF EXISTS idx_customer_transactions_balance")
+
+    # Bumped by every change to the ledger, so caches of ledger reports can
+    # tell with one row lookup whether they are still current
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ledger_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO ledger_version (id, version) VALUES (1, 0)")
+
+    for event in ('INSERT', 'DELETE', 'UPDATE'):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_customer_transactions_version_{event.lower()}
+        AFTER {event} ON customer_transactions
+        BEGIN
+            UPDATE ledger_version SET version = version + 1 WHERE id = 1;
+        END
+        ''')
+
+
+def _add_reorder_levels(cursor):
+    # Each item is low on stock at its own level; existing items keep the
+    # application-wide threshold they were checked against before
+    cursor.execute('''
+    ALTER TABLE inventory ADD COLUMN reorder_level INTEGER NOT NULL DEFAULT 5 CHECK (reorder_level >= 0)
+    ''')
+
+    # Holds only the items at or below their reorder level, in name order, so the
+    # low stock check reads just those however large the inventory
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_inventory_low_stock
+    ON inventory (item_name) WHERE quantity <= reorder_level
+    ''')
+
+
+# Ordered upgrade steps. The database's PRAGMA user_version records the last
+# step applied; never renumber or edit a step once it has shipped.
+MIGRATIONS = [
+    (1, "Create base tables", _create_base_tables),
+    (2, "Add indexes for trip, payment, ledger and inventory queries", _add_query_indexes),
+    (3, "Add incrementally maintained driver payment summary", _add_driver_payment_summary),
+    (4, "Add incrementally maintained customer balances", _add_customer_balances),
+    (5, "Add full-text search index over trips", _add_trip_search_index),
+    (6, "Add drivers table referenced by trips", _add_drivers_table),
+    (7, "Add indexes for client, cargo and route trip filters", _add_trip_filter_indexes),
+    (8, "Add incrementally maintained day, week and month trip rollups", _add_trip_rollups),
+    (9, "Store money as integer minor units", _store_money_in_minor_units),
+    (10, "Store dates as integer day numbers", _store_dates_as_day_numbers),
+    (11, "Add ledger index and version for running balances and aging", _add_ledger_window_index),
+    (12, "Add per-item reorder levels with a low stock index", _add_reorder_levels),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(db):
+    """Return the schema version stored in the database"""
+    return db.query_one("PRAGMA user_version")[0]
+
+
+def migrate(db):
+    """Apply every pending migration and return the descriptions applied"""
+    applied = []
+
+    for version, description, step in MIGRATIONS:
+        with db.transaction() as cursor:
+            # Re-read inside the write lock in case another instance got here first
+            cursor.execute("PRAGMA user_version")
+            if cursor.fetchone()[0] >= version:
+                continue
+
+            step(cursor)
+            cursor.execute(f"PRAGMA user_version = {version}")
+        applied.append(description)
+
+    if applied:
+        with db.transaction() as cursor:
+            cursor.execute("PRAGMA optimize")
+
+    return applied
+
+
+def invalid_dates_warning(db, applied):
+    """Return a warning about dates the day number conversion could not read
+
+    Returns None unless the conversion was among the applied migrations
+    (as returned by migrate) and left dates behind in invalid_dates, so
+    the warning is given once, on the start that upgraded the database.
+    """
+    converted = next(description for version, description, step in MIGRATIONS
+                     if step is _store_dates_as_day_numbers)
+    if converted not in applied:
+        return None
+
+    counts = dict(db.query("SELECT table_name, COUNT(*) FROM invalid_dates GROUP BY table_name"))
+    if not counts:
+        return None
+
+    kinds = (('trips', "trips"), ('maintenance', "maintenance records"),
+             ('customer_transactions', "customer transactions"))
+    found = ", ".join(f"{counts[table]:,} {kind}" for table, kind in kinds if table in counts)
+    return (f"{sum(counts.values()):,} dates could not be read while upgrading the database ({found}). "
+            "They are now shown as 1970-01-01 and are left out of date filters and period totals. "
+            f"The original text of each is kept in the invalid_dates table of {db.path}.")
@@ -0,0 +1,71 @@
+class KeysetPager:
+    """Fetch rows of a query one page at a time using keyset pagination
+
+    Rows are ordered descending on the key columns (for trips, date then
+    id). Instead of OFFSET, each page continues from the key of the last
+    row already seen, so every page costs the same index seek no matter
+    how deep into the table it is.
+    """
+
+    def __init__(self, db, table, columns, key=('date', 'id'), where='', params=(), page_size=200):
+        self.db = db
+        self.table = table
+        self.columns = columns
+        self.key = key
+        self.where = where
+        self.params = tuple(params)
+        self.page_size = page_size
+        self._key_indexes = [columns.index(column) for column in key]
+
+    def row_key(self, row):
+        """Return the key tuple of a row returned by this pager"""
+        return tuple(row[i] for i in self._key_indexes)
+
+    def _select(self, condition, params, descending):
+        direction = "DESC" if descending else "ASC"
+        clauses = [c for c in (self.where, condition) if c]
+        where = f"WHERE {' AND '.join(f'({c})' for c in clauses)}" if clauses else ""
+        order = ", ".join(f"{column} {direction}" for column in self.key)
+
+        sql = f"SELECT {', '.join(self.columns)} FROM {self.table} {where} ORDER BY {order} LIMIT ?"
+        return self.db.query(sql, self.params + tuple(params) + (self.page_size,))
+
+    def query(self):
+        """Return the SQL and parameters selecting every row, in pager order"""
+        where = f"WHERE {self.where}" if self.where else ""
+        order = ", ".join(f"{column} DESC" for column in self.key)
+        return f"SELECT {', '.join(self.columns)} FROM {self.table} {where} ORDER BY {order}", self.params
+
+    def count_query(self):
+        """Return the SQL and parameters counting the rows the query matches"""
+        where = f"WHERE {self.where}" if self.where else ""
+        return f"SELECT COUNT(*) FROM {self.table} {where}", self.params
+
+    def count(self):
+        """Return the number of rows the query matches"""
+        return self.db.query_one(*self.count_query())[0]
+
+    def first_page(self):
+        """Return the first page of rows"""
+        return self._select('', (), descending=True)
+
+    def page_after(self, key):
+        """Return the page that follows the row with the given key"""
+        condition = f"({', '.join(self.key)}) < ({', '.join('?' * len(self.key))})"
+        return self._select(condition, key, descending=True)
+
+    def page_before(self, key):
+        """Return the page that precedes the row with the given key"""
+        condition = f"({', '.join(self.key)}) > ({', '.join('?' * len(self.key))})"
+        rows = self._select(condition, key, descending=False)
+        rows.reverse()
+        return rows
+
+    def iter_rows(self):
+        """Yield every row of the query, one page in memory at a time"""
+        page = self.first_page()
+        while page:
+            yield from page
+            if len(page) < self.page_size:
+                break
+            page = self.page_after(self.row_key(page[-1]))
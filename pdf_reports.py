@@ -0,0 +1,164 @@
+import os
+from datetime import datetime
+
+from exporters import ExportCancelled
+from formatting import format_amount
+
+# Layout of every report page, in points
+PAGE_MARGIN = 36
+ROW_HEIGHT = 16
+HEADER_HEIGHT = 22
+TITLE_HEIGHT = 48
+FOOTER_HEIGHT = 24
+FONT_SIZE = 8
+CELL_PADDING = 3
+
+
+def _fit(text, width, font, size):
+    """Truncate text with an ellipsis so it fits in a cell of the given width"""
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    text = "" if text is None else str(text)
+    text_width = stringWidth(text, font, size)
+    if text_width <= width:
+        return text
+
+    # Cut close to the right length first, then trim the last few characters
+    text = text[:int(len(text) * width / text_width)]
+    while text and stringWidth(text + "...", font, size) > width:
+        text = text[:-1]
+    return text + "..."
+
+
+def export_query_to_pdf(db, sql, params, file_path, title, headers, format_row=None, col_widths=None,
+                        subtotals=None, count_columns=(), trailer=(), pagesize=None, total=None,
+                        progress=None, cancelled=None):
+    """Stream the rows of a query into a paged PDF table and return how many were written
+
+    Each page is laid out on its own: one page of rows is fetched from
+    the cursor, drawn under a repeated header with a page number, and
+    released before the next is fetched, so render time grows linearly
+    with the result. The query rows never all sit in memory, but the
+    reportlab canvas keeps every finished page's drawing operations until
+    save() writes the file, so memory still grows with the page count,
+    by roughly 0.7 KB per row.
+    Rows are fixed height and cells are truncated to their column so a
+    page always holds the same number of rows.
+
+    col_widths are relative column weights. subtotals maps the index of
+    a displayed column to the index of the raw row value summed into the
+    bold subtotal row at the foot of each page. Subtotals are amounts in
+    minor units, except for the displayed columns listed in count_columns,
+    which are shown as plain numbers. trailer rows are added
+    after the last page's subtotal. progress and cancelled behave as for
+    export_query_to_csv.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    from reportlab.platypus import Table, TableStyle
+
+    pagesize = pagesize or letter
+    page_width, page_height = pagesize
+    usable_width = page_width - 2 * PAGE_MARGIN
+    weights = col_widths or [1] * len(headers)
+    widths = [usable_width * weight / sum(weights) for weight in weights]
+
+    # Leave room on each page for the subtotal row and any trailer rows
+    body_height = page_height - 2 * PAGE_MARGIN - TITLE_HEIGHT - FOOTER_HEIGHT - HEADER_HEIGHT
+    reserved = (1 if subtotals else 0) + len(trailer)
+    rows_per_page = max(int(body_height // ROW_HEIGHT) - reserved, 1)
+    page_count = max(-(-total // rows_per_page), 1) if total is not None else None
+    generated = f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+
+    base_style = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), FONT_SIZE),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('LEFTPADDING', (0, 0), (-1, -1), CELL_PADDING),
+        ('RIGHTPADDING', (0, 0), (-1, -1), CELL_PADDING),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('BOX', (0, 0), (-1, -1), 1, colors.black),
+    ]
+    base_style.extend(('ALIGN', (i, 1), (i, -1), 'RIGHT') for i in (subtotals or {}))
+
+    def draw_page(pdf, page_number, rows, last):
+        data = [headers]
+        data.extend([_fit(value, width - 2 * CELL_PADDING, 'Helvetica', FONT_SIZE)
+                     for value, width in zip(format_row(row) if format_row is not None else row, widths)]
+                    for row in rows)
+        style = list(base_style)
+
+        if subtotals:
+            subtotal = [""] * len(headers)
+            subtotal[0] = "Page subtotal"
+            for display_index, raw_index in subtotals.items():
+                value = sum(row[raw_index] or 0 for row in rows)
+                subtotal[display_index] = value if display_index in count_columns else format_amount(value)
+            data.append(subtotal)
+            style.append(('FONTNAME', (0, len(data) - 1), (-1, len(data) - 1), 'Helvetica-Bold'))
+
+        if last and trailer:
+            start = len(data)
+            data.extend(list(row) for row in trailer)
+            style.append(('BACKGROUND', (0, start), (-1, -1), colors.lightgrey))
+            style.append(('FONTNAME', (0, start), (-1, -1), 'Helvetica-Bold'))
+
+        top = page_height - PAGE_MARGIN
+        pdf.setFont('Helvetica-Bold', 16)
+        pdf.drawString(PAGE_MARGIN, top - 18, title)
+        pdf.setFont('Helvetica', 9)
+        pdf.drawString(PAGE_MARGIN, top - 34, generated)
+
+        table = Table(data, colWidths=widths, rowHeights=[HEADER_HEIGHT] + [ROW_HEIGHT] * (len(data) - 1))
+        table.setStyle(TableStyle(style))
+        _, table_height = table.wrapOn(pdf, usable_width, body_height)
+        table.drawOn(pdf, PAGE_MARGIN, top - TITLE_HEIGHT - table_height)
+
+        footer = f"Page {page_number} of {page_count}" if page_count else f"Page {page_number}"
+        pdf.setFont('Helvetica', 8)
+        pdf.drawRightString(page_width - PAGE_MARGIN, PAGE_MARGIN, footer)
+        pdf.showPage()
+
+    temp_path = file_path + ".part"
+    written = 0
+
+    try:
+        pdf = canvas.Canvas(temp_path, pagesize=pagesize, pageCompression=1)
+        pdf.setTitle(title)
+
+        cursor = db.reader.execute(sql, params)
+        try:
+            # Read one page ahead so the last page is known when it is drawn
+            rows = cursor.fetchmany(rows_per_page)
+            page_number = 1
+            while True:
+                if cancelled is not None and cancelled():
+                    raise ExportCancelled()
+
+                next_rows = cursor.fetchmany(rows_per_page) if rows else []
+                draw_page(pdf, page_number, rows, last=not next_rows)
+                written += len(rows)
+
+                if progress is not None:
+                    progress(written, total)
+
+                if not next_rows:
+                    break
+                rows = next_rows
+                page_number += 1
+        finally:
+            cursor.close()
+
+        pdf.save()
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return written
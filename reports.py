@@ -0,0 +1,138 @@
+# Report queries shared by the GUI tabs, the command line and the benchmarks.
+# Nothing here may import tkinter, so reports can be produced headless.
+from database import get_db
+from formatting import format_amount
+
+# Per-driver totals maintained by the trips triggers
+PAYMENTS_QUERY = '''
+SELECT
+    driver_name,
+    trip_count,
+    total_income,
+    total_expenses,
+    (total_income - total_expenses) as net_payment
+FROM driver_payment_summary
+ORDER BY net_payment DESC
+'''
+
+PAYMENTS_COUNT_QUERY = "SELECT COUNT(*) FROM driver_payment_summary"
+
+PAYMENT_HEADERS = ['Driver Name', 'Number of Trips', 'Total Income (TZS)',
+                   'Total Expenses (TZS)', 'Net Payment (TZS)']
+
+TRIP_COLUMNS = ("id", "date", "client_name", "cargo_type", "route", "trip_income", "fuel_expenses", "driver_name")
+
+TRIP_HEADERS = ["ID", "Date", "Client", "Cargo Type", "Route", "Income (TZS)", "Expenses (TZS)", "Driver"]
+
+# Customers with an outstanding (or overpaid) balance, largest first, from the
+# cache maintained by the ledger triggers
+BALANCES_QUERY = '''
+SELECT customer_name, balance
+FROM customer_balances
+WHERE balance != 0
+ORDER BY balance DESC, customer_name
+'''
+
+BALANCE_HEADERS = ["Customer", "Balance (TZS)"]
+
+# Outstanding balance per customer by the age of the charges it is made of, as
+# of day ?1. Payments settle the oldest charges first, so what a customer still
+# owes is the newest part of their charges: each charge is outstanding to the
+# extent the charges up to it exceed everything the customer has paid. Paid
+# totals come from the balance cache, and customers who owe nothing are skipped.
+AGING_QUERY = '''
+SELECT
+    customer_name,
+    SUM(CASE WHEN age <= 30 THEN outstanding ELSE 0 END) AS days_0_30,
+    SUM(CASE WHEN age BETWEEN 31 AND 60 THEN outstanding ELSE 0 END) AS days_31_60,
+    SUM(CASE WHEN age BETWEEN 61 AND 90 THEN outstanding ELSE 0 END) AS days_61_90,
+    SUM(CASE WHEN age > 90 THEN outstanding ELSE 0 END) AS days_over_90,
+    SUM(outstanding) AS total
+FROM (
+    SELECT
+        t.customer_name,
+        ?1 - t.date AS age,
+        MAX(0, MIN(t.amount_owed, SUM(t.amount_owed) OVER (PARTITION BY t.customer_name ORDER BY t.date, t.id
+                                                            ROWS UNBOUNDED PRECEDING)
+                                  - b.total_paid)) AS outstanding
+    FROM customer_transactions t
+    JOIN customer_balances b ON b.customer_name = t.customer_name
+    WHERE b.balance > 0
+)
+GROUP BY customer_name
+ORDER BY total DESC, customer_name
+'''
+
+AGING_HEADERS = ["Customer", "0-30 Days (TZS)", "31-60 Days (TZS)", "61-90 Days (TZS)", "Over 90 Days (TZS)",
+                 "Total (TZS)"]
+
+# Full lists shown by the ledger, maintenance and inventory tabs. Each transaction
+# carries its customer's running balance, summed in (customer_name, date, id) order
+# straight off the ledger index.
+RUNNING_BALANCE = ("SUM(amount_owed - amount_paid) OVER (PARTITION BY customer_name ORDER BY date, id "
+                   "ROWS UNBOUNDED PRECEDING)")
+
+TRANSACTIONS_QUERY = f'''
+SELECT id, customer_name, date, amount_owed, amount_paid, {RUNNING_BALANCE} AS running_balance
+FROM customer_transactions
+ORDER BY date DESC, id DESC
+'''
+
+CUSTOMER_TRANSACTIONS_QUERY = f'''
+SELECT id, customer_name, date, amount_owed, amount_paid, {RUNNING_BALANCE} AS running_balance
+FROM customer_transactions
+WHERE customer_name = ?
+'''
+
+MAINTENANCE_QUERY = "SELECT * FROM maintenance ORDER BY service_date DESC, id DESC"
+
+INVENTORY_QUERY = '''
+SELECT id, item_name, quantity, purchase_price, sale_price, reorder_level
+FROM inventory
+ORDER BY item_name
+'''
+
+# Items at or below their own reorder level, read from the partial index that holds
+# only those items; the WHERE clause must match the index's for it to be used
+LOW_STOCK_QUERY = '''
+SELECT id, item_name, quantity, reorder_level
+FROM inventory
+WHERE quantity <= reorder_level
+ORDER BY item_name
+'''
+
+# Items at or below one threshold given for all of them
+LOW_STOCK_THRESHOLD_QUERY = '''
+SELECT id, item_name, quantity, reorder_level
+FROM inventory
+WHERE quantity <= ?
+ORDER BY item_name
+'''
+
+LOW_STOCK_HEADERS = ["ID", "Item Name", "Quantity", "Reorder Level"]
+
+
+def driver_payment_totals(db=None):
+    """Return the formatted TOTAL row of the driver payments report"""
+    # Summed over one summary row per driver
+    total_trips, total_income, total_expenses = (db or get_db()).query_one('''
+    SELECT
+        COALESCE(SUM(trip_count), 0),
+        COALESCE(SUM(total_income), 0),
+        COALESCE(SUM(total_expenses), 0)
+    FROM driver_payment_summary
+    ''')
+
+    return ("TOTAL", total_trips, format_amount(total_income), format_amount(total_expenses),
+            format_amount(total_income - total_expenses))
+
+
+def low_stock_items(threshold=None, db=None):
+    """Return (id, item_name, quantity, reorder_level) for every item low on stock
+
+    Items are low at or below their reorder level, or at or below
+    threshold when one is given.
+    """
+    if threshold is None:
+        return (db or get_db()).query(LOW_STOCK_QUERY)
+    return (db or get_db()).query(LOW_STOCK_THRESHOLD_QUERY, (threshold,))
@@ -0,0 +1,106 @@
+from database import get_db
+from formatting import format_date, to_date, to_day_number
+from migrations import rebuild_trip_rollups
+
+GRANULARITIES = ('day', 'week', 'month')
+
+# Each rollup is kept per driver, client and route, and overall under 'all'
+DIMENSIONS = ('driver', 'client', 'route', 'all')
+
+
+def period_of(day, granularity):
+    """Return the rollup period a YYYY-MM-DD date, date or day number falls in
+
+    Periods are the day number of their first day; weeks start on Monday.
+    """
+    if not isinstance(day, int):
+        day = to_day_number(day)
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - to_date(day).weekday()
+    if granularity == 'month':
+        return day - to_date(day).day + 1
+    raise ValueError(f"Unknown granularity {granularity!r}; expected one of {', '.join(GRANULARITIES)}")
+
+
+def format_period(period, granularity):
+    """Return a period as YYYY-MM for months and as its first day otherwise"""
+    if granularity == 'month':
+        return format_date(period)[:7]
+    return format_date(period)
+
+
+def _check(granularity, dimension):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity {granularity!r}; expected one of {', '.join(GRANULARITIES)}")
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension {dimension!r}; expected one of {', '.join(DIMENSIONS)}")
+
+
+def period_totals_query(granularity='month', dimension='all', key=None, start=None, end=None):
+    """Return the SQL and parameters behind period_totals"""
+    _check(granularity, dimension)
+    conditions, params = ["dimension = ?"], [dimension]
+
+    if key is not None and dimension != 'all':
+        conditions.append("key = ?")
+        params.append(key)
+    if start is not None:
+        conditions.append("period >= ?")
+        params.append(period_of(start, granularity))
+    if end is not None:
+        conditions.append("period <= ?")
+        params.append(period_of(end, granularity))
+
+    return f'''
+    SELECT period, key, trip_count, total_income, total_expenses, total_income - total_expenses AS net
+    FROM trip_rollups_{granularity}
+    WHERE {' AND '.join(conditions)}
+    ORDER BY period, key
+    ''', params
+
+
+def period_totals(granularity='month', dimension='all', key=None, start=None, end=None, db=None):
+    """Return trip totals per period from the rollup tables
+
+    Rows are (period, key, trip_count, total_income, total_expenses,
+    net) ordered by period then key. dimension is 'driver', 'client',
+    'route' or 'all'; key limits the result to one driver, client or
+    route. start and end are inclusive dates (YYYY-MM-DD, date or day
+    number) and select the periods containing them; periods are day
+    numbers, see format_period.
+    """
+    return (db or get_db()).query(*period_totals_query(granularity, dimension, key, start, end))
+
+
+def top_keys(dimension, granularity='month', start=None, end=None, limit=10, db=None):
+    """Return the drivers, clients or routes with the highest income over a period range
+
+    Rows are (key, trip_count, total_income, total_expenses, net), highest
+    income first.
+    """
+    _check(granularity, dimension)
+    conditions, params = ["dimension = ?"], [dimension]
+
+    if start is not None:
+        conditions.append("period >= ?")
+        params.append(period_of(start, granularity))
+    if end is not None:
+        conditions.append("period <= ?")
+        params.append(period_of(end, granularity))
+
+    return (db or get_db()).query(f'''
+    SELECT key, SUM(trip_count), SUM(total_income), SUM(total_expenses), SUM(total_income) - SUM(total_expenses)
+    FROM trip_rollups_{granularity}
+    WHERE {' AND '.join(conditions)}
+    GROUP BY key
+    ORDER BY 3 DESC
+    LIMIT ?
+    ''', params + [limit])
+
+
+def rebuild_rollups(db=None):
+    """Recompute every rollup table from the trips table"""
+    with (db or get_db()).transaction() as cursor:
+        rebuild_trip_rollups(cursor)
@@ -0,0 +1,20 @@
+import re
+
+# Characters that make up a search term; everything else separates terms
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def match_expression(text):
+    """Turn text typed into a search box into an FTS5 MATCH expression
+
+    Every word must begin a word in one of the indexed columns, so
+    results narrow as each word is typed. User input is quoted, so FTS5
+    operators and punctuation are searched for as plain text rather than
+    causing syntax errors. Returns None if the text contains no
+    searchable words.
+    """
+    terms = _TERM.findall(text)
+    if not terms:
+        return None
+
+    return " ".join(f'"{term}"*' for term in terms)
@@ -0,0 +1,92 @@
+from tkinter import messagebox
+
+from reports import low_stock_items
+
+# How often the monitor looks for items that have fallen to their reorder level (ms)
+CHECK_INTERVAL = 15000
+
+# Most items listed by name in a low stock message
+MAX_LISTED_ITEMS = 20
+
+
+def low_stock_message(items):
+    """Describe (id, item_name, quantity, reorder_level) rows for a low stock alert"""
+    lines = [f"{name} (Qty: {quantity}, reorder at {reorder_level})"
+             for item_id, name, quantity, reorder_level in items[:MAX_LISTED_ITEMS]]
+    if len(items) > MAX_LISTED_ITEMS:
+        lines.append(f"... and {len(items) - MAX_LISTED_ITEMS} more")
+    return "\n".join(lines)
+
+
+class LowStockMonitor:
+    """Watch the inventory for items falling to their reorder level
+
+    Every interval the low stock query, answered from the partial index
+    that holds only low items, runs as a quiet task on the executor, so
+    the check needs neither the Inventory tab nor its grid and sees
+    changes made by other instances. After each check listeners are
+    called on the Tk thread with the items that have become low since
+    the previous one (on the first check, every item already low) and
+    whether it was the first check; low_items() has the full list.
+    """
+
+    def __init__(self, root, executor, interval=CHECK_INTERVAL):
+        self.root = root
+        self.executor = executor
+        self.interval = interval
+        self.low = {}
+        self._checked = False
+        self._scheduled = None
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call callback(newly_low_items, first_check) after each check"""
+        self._listeners.append(callback)
+
+    def start(self):
+        self.check_now()
+
+    def stop(self):
+        if self._scheduled is not None:
+            self.root.after_cancel(self._scheduled)
+            self._scheduled = None
+        self.executor.cancel("low-stock-monitor")
+
+    def check_now(self):
+        """Check at once, for example right after a quantity or reorder level was saved"""
+        if self._scheduled is not None:
+            self.root.after_cancel(self._scheduled)
+            self._scheduled = None
+
+        self.executor.submit("low-stock-monitor", lambda task: low_stock_items(),
+                             on_result=self._on_result, on_error=lambda e: self._schedule(), quiet=True)
+
+    def show_low_stock(self):
+        """List every item at or below its reorder level in a message box"""
+        def show(rows):
+            if rows:
+                message = "The following items are at or below their reorder level:\n\n" + low_stock_message(rows)
+                messagebox.showwarning("Low Stock Alert", message)
+            else:
+                messagebox.showinfo("Stock Status", "All items are above their reorder levels.")
+
+        self.executor.submit(
+            "low-stock", lambda task: low_stock_items(), on_result=show,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to check stock levels: {str(e)}"))
+
+    def low_items(self):
+        """Return the items found low by the last check, by name"""
+        return sorted(self.low.values(), key=lambda item: item[1])
+
+    def _on_result(self, rows):
+        first_check = not self._checked
+        crossed = [row for row in rows if row[0] not in self.low]
+        self.low = {row[0]: row for row in rows}
+        self._checked = True
+
+        for callback in list(self._listeners):
+            callback(crossed, first_check)
+        self._schedule()
+
+    def _schedule(self):
+        self._scheduled = self.root.after(self.interval, self.check_now)
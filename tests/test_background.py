@@ -0,0 +1,62 @@
+import threading
+
+from background import IDLE_POLL_INTERVAL, POLL_INTERVAL, QueryExecutor
+
+
+class FakeRoot:
+    """Stands in for Tk: after() callbacks run only when the test fires them"""
+
+    def __init__(self):
+        self.pending = {}
+        self._next_id = 0
+
+    def after(self, ms, callback):
+        self._next_id += 1
+        self.pending[self._next_id] = (ms, callback)
+        return self._next_id
+
+    def after_cancel(self, after_id):
+        self.pending.pop(after_id, None)
+
+    def intervals(self):
+        return sorted(ms for ms, callback in self.pending.values())
+
+    def fire(self):
+        due, self.pending = self.pending, {}
+        for ms, callback in due.values():
+            callback()
+
+
+def test_post_from_a_worker_thread_is_delivered_while_idle():
+    root = FakeRoot()
+    executor = QueryExecutor(root)
+    delivered = []
+    try:
+        assert root.intervals() == [IDLE_POLL_INTERVAL]
+
+        worker = threading.Thread(target=executor.post, args=(delivered.append, "waiting"))
+        worker.start()
+        worker.join()
+        # Nothing was scheduled from the worker thread
+        assert root.intervals() == [IDLE_POLL_INTERVAL]
+
+        root.fire()
+        assert delivered == ["waiting"]
+        assert root.intervals() == [IDLE_POLL_INTERVAL]
+    finally:
+        executor.shutdown()
+    assert root.pending == {}
+
+
+def test_post_on_the_tk_thread_polls_at_the_task_rate():
+    root = FakeRoot()
+    executor = QueryExecutor(root)
+    delivered = []
+    try:
+        executor.post(delivered.append, "ready")
+        assert root.intervals() == [POLL_INTERVAL]
+
+        root.fire()
+        assert delivered == ["ready"]
+    finally:
+        executor.shutdown()
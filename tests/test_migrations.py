@@ -0,0 +1,80 @@
+import sqlite3
+
+import pytest
+
+import migrations
+from database import Database
+from instrumentation import get_instrumentation
+
+
+def create_database(path, version, trips=()):
+    """Build a database at an older schema version holding the given trips"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    cursor = conn.cursor()
+    for number, description, step in migrations.MIGRATIONS[:version]:
+        step(cursor)
+        cursor.execute(f"PRAGMA user_version = {number}")
+    cursor.executemany('''
+    INSERT INTO trips (date, client_name, cargo_type, route, trip_income, fuel_expenses, driver_name)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', trips)
+    conn.close()
+
+
+TRIPS = [
+    ('2024-03-04', 'Acme', 'Cement', 'Dar - Moshi', 1500.5, 300.25, 'Juma'),
+    ('2024-03-10', 'Zoë Ltd', 'Maize', 'Dar - Arusha', 900, 150, 'Neema'),
+    ('2024-04-01', 'Acme', 'Cement', 'Dar - Moshi', 1200, 250, 'Juma'),
+]
+
+
+@pytest.fixture
+def slow_query_log(tmp_path):
+    """Log every statement, with its plan, to a file in tmp_path"""
+    instrumentation = get_instrumentation()
+    saved = instrumentation.slow_query_ms, instrumentation.slow_query_log
+    instrumentation.slow_query_ms = 0
+    instrumentation.slow_query_log = str(tmp_path / "slow_queries.log")
+    yield tmp_path / "slow_queries.log"
+    instrumentation.slow_query_ms, instrumentation.slow_query_log = saved
+
+
+def test_migration_statements_are_explained_inside_their_transaction(tmp_path, slow_query_log):
+    path = str(tmp_path / "trips.db")
+    create_database(path, 5, TRIPS)
+
+    migrations.migrate(Database(path))
+
+    log = slow_query_log.read_text()
+    assert "(no plan" not in log
+    # Step 6 fills in driver ids from the drivers table it has just created,
+    # which only the writer can see before the step commits
+    entry = next(entry for entry in log.split("\n\n")
+                 if "UPDATE trips SET driver_id = (SELECT id FROM drivers WHERE name = trips.driver_name)" in entry)
+    assert "  plan: SCAN trips" in entry
+
+
+def test_unreadable_dates_are_reported_once(tmp_path):
+    path = str(tmp_path / "trips.db")
+    create_database(path, 9, [
+        ('2024-03-04', 'Acme', 'Cement', 'Dar - Moshi', 150050, 30025, 'Juma'),
+        ('2024-02-30', 'Acme', 'Cement', 'Dar - Moshi', 120000, 25000, 'Juma'),
+        ('2023-02-29', 'Zoë Ltd', 'Maize', 'Dar - Arusha', 90000, 15000, 'Neema'),
+    ])
+    db = Database(path)
+
+    warning = migrations.invalid_dates_warning(db, migrations.migrate(db))
+    assert warning.startswith("2 dates could not be read while upgrading the database (2 trips)")
+    assert "invalid_dates" in warning
+    assert db.query("SELECT value FROM invalid_dates ORDER BY row_id") == [('2024-02-30',), ('2023-02-29',)]
+    assert db.query("SELECT date FROM trips WHERE id IN (2, 3)") == [(0,), (0,)]
+
+    assert migrations.invalid_dates_warning(db, migrations.migrate(db)) is None
+
+
+def test_clean_upgrade_has_no_date_warning(tmp_path):
+    path = str(tmp_path / "trips.db")
+    create_database(path, 9, [('2024-03-04', 'Acme', 'Cement', 'Dar - Moshi', 150050, 30025, 'Juma')])
+    db = Database(path)
+
+    assert migrations.invalid_dates_warning(db, migrations.migrate(db)) is None
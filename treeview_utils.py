@@ -0,0 +1,34 @@
+def sorted_index(tree, sort_key, key, descending=False):
+    """Binary search for the position of key among a sorted tree's rows
+
+    sort_key(values) must return the key each row is ordered by, so only
+    O(log n) rows are read back from the widget.
+    """
+    children = tree.get_children()
+    lo, hi = 0, len(children)
+
+    while lo < hi:
+        mid = (lo + hi) // 2
+        mid_key = sort_key(tree.item(children[mid], "values"))
+        before = mid_key > key if descending else mid_key < key
+        if before:
+            lo = mid + 1
+        else:
+            hi = mid
+
+    return lo
+
+
+def upsert_row(tree, iid, values, sort_key, descending=False, tags=()):
+    """Insert a row at its sorted position, replacing any row with the same id"""
+    if tree.exists(iid):
+        tree.delete(iid)
+
+    index = sorted_index(tree, sort_key, sort_key(values), descending)
+    tree.insert("", index, iid=iid, values=values, tags=tags)
+
+
+def remove_row(tree, iid):
+    """Remove a row by id if it is currently shown"""
+    if tree.exists(iid):
+        tree.delete(iid)
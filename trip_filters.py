@@ -0,0 +1,69 @@
+from formatting import to_day_number
+from search import match_expression
+
+
+class TripFilter:
+    """Criteria for narrowing the trip list, compiled into one parameterized WHERE clause
+
+    Every criterion is optional. Client, cargo type and route match whole
+    values, ignoring case, so each can be answered from its composite
+    (column, date, id) index; dates are inclusive YYYY-MM-DD (or day
+    number) bounds and amounts are inclusive bounds.
+    """
+
+    def __init__(self, date_from=None, date_to=None, driver=None, client=None, cargo=None, route=None,
+                 min_income=None, max_income=None, min_expenses=None, max_expenses=None, search=None):
+        self.date_from = date_from
+        self.date_to = date_to
+        self.driver = driver
+        self.client = client
+        self.cargo = cargo
+        self.route = route
+        self.min_income = min_income
+        self.max_income = max_income
+        self.min_expenses = min_expenses
+        self.max_expenses = max_expenses
+        self.search = search
+
+    def where(self):
+        """Return the WHERE clause (without the keyword) and its parameters"""
+        conditions, params = [], []
+
+        def add(condition, value):
+            if value is not None and value != '':
+                conditions.append(condition)
+                params.append(value)
+
+        add("driver_name = ?", self.driver)
+        add("client_name = ? COLLATE NOCASE", self.client)
+        add("cargo_type = ? COLLATE NOCASE", self.cargo)
+        add("route = ? COLLATE NOCASE", self.route)
+        add("date >= ?", to_day_number(self.date_from) if self.date_from else None)
+        add("date <= ?", to_day_number(self.date_to) if self.date_to else None)
+        add("trip_income >= ?", self.min_income)
+        add("trip_income <= ?", self.max_income)
+        add("fuel_expenses >= ?", self.min_expenses)
+        add("fuel_expenses <= ?", self.max_expenses)
+
+        # Words from the search box are looked up in the full-text index
+        if self.search:
+            add("id IN (SELECT rowid FROM trips_fts WHERE trips_fts MATCH ?)", match_expression(self.search))
+
+        return " AND ".join(conditions), params
+
+    def summary_query(self):
+        """Return SQL and parameters for the count and totals of matching trips, in one pass"""
+        where, params = self.where()
+
+        # Unfiltered totals come from the per-driver summary rather than every trip
+        if not where:
+            return '''
+            SELECT COALESCE(SUM(trip_count), 0), COALESCE(SUM(total_income), 0), COALESCE(SUM(total_expenses), 0)
+            FROM driver_payment_summary
+            ''', []
+
+        return f'''
+        SELECT COUNT(*), COALESCE(SUM(trip_income), 0), COALESCE(SUM(fuel_expenses), 0)
+        FROM trips
+        WHERE {where}
+        ''', params
@@ -0,0 +1,146 @@
+import codecs
+import csv
+import os
+
+from formatting import to_day_number, to_minor_units
+
+# Rows inserted per transaction
+IMPORT_BATCH_SIZE = 5000
+
+# Trips table columns and the CSV headers accepted for each, compared case-insensitively.
+# The headers written by the trip CSV export are accepted, so an export can be imported again.
+IMPORT_COLUMNS = {
+    'date': ('date',),
+    'client_name': ('client_name', 'client', 'client name'),
+    'cargo_type': ('cargo_type', 'cargo', 'cargo type'),
+    'route': ('route',),
+    'trip_income': ('trip_income', 'income', 'income (tzs)', 'trip income (tzs)'),
+    'fuel_expenses': ('fuel_expenses', 'expenses', 'expenses (tzs)', 'fuel expenses (tzs)'),
+    'driver_name': ('driver_name', 'driver', 'driver name'),
+}
+
+# Drivers are registered for the whole batch first, so each trip links to
+# its driver as it is inserted instead of through the trips trigger
+INSERT_DRIVER = "INSERT OR IGNORE INTO drivers (name) VALUES (?)"
+
+INSERT_TRIP = '''
+INSERT INTO trips (date, client_name, cargo_type, route, trip_income, fuel_expenses, driver_name, driver_id)
+VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, (SELECT id FROM drivers WHERE name = ?7))
+'''
+
+
+def validate_trip(date, client, cargo, route, income, expenses, driver):
+    """Check the fields of a trip and return them ready to insert
+
+    Applies the same rules as the trip form; the date is returned as a
+    day number and amounts in minor units. Raises ValueError with a message for the user if a
+    field is invalid.
+    """
+    fields = [str(value).strip() if value is not None else '' for value in
+              (date, client, cargo, route, income, expenses, driver)]
+    date, client, cargo, route, income, expenses, driver = fields
+
+    if not all(fields):
+        raise ValueError("All fields are required!")
+
+    date = to_day_number(date)
+
+    try:
+        income = to_minor_units(income)
+        expenses = to_minor_units(expenses)
+    except ValueError:
+        raise ValueError("Income and expenses must be valid numbers!")
+
+    return (date, client, cargo, route, income, expenses, driver)
+
+
+def _column_positions(header):
+    """Map each trips column to its position in a CSV header row"""
+    positions = {}
+    normalized = [name.strip().lower() for name in header]
+    for column, aliases in IMPORT_COLUMNS.items():
+        for alias in aliases:
+            if alias in normalized:
+                positions[column] = normalized.index(alias)
+                break
+
+    missing = [column for column in IMPORT_COLUMNS if column not in positions]
+    if missing:
+        raise ValueError(f"CSV file is missing columns: {', '.join(missing)}")
+    return [positions[column] for column in IMPORT_COLUMNS]
+
+
+def import_trips_from_csv(db, file_path, error_path=None, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """Stream trips from a CSV file into the database
+
+    Each row is validated with validate_trip and valid rows are inserted
+    with executemany, batch_size rows per transaction. Rejected rows are
+    written with their line number and the reason to a CSV error report
+    at error_path (by default next to the file), which is only created if
+    a row is rejected. progress(bytes_read, file_size) is called after
+    each batch. Returns (imported, rejected, error_path or None).
+    """
+    error_path = error_path or os.path.splitext(file_path)[0] + "_errors.csv"
+    file_size = os.path.getsize(file_path)
+    imported = rejected = 0
+    error_file = error_writer = None
+
+    # The utf-8-sig codec drops a byte order mark, so count it up front
+    with open(file_path, 'rb') as raw:
+        bytes_read = [len(codecs.BOM_UTF8) if raw.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8 else 0]
+
+    def lines(csvfile):
+        # Count what has been read, since tell() is not available while csv iterates.
+        # Lines keep their own line endings, so their encoded lengths add up to the file size.
+        for line in csvfile:
+            bytes_read[0] += len(line.encode('utf-8'))
+            yield line
+
+    def insert(batch):
+        with db.transaction() as cursor:
+            cursor.executemany(INSERT_DRIVER, [(name,) for name in {trip[6] for trip in batch}])
+            cursor.executemany(INSERT_TRIP, batch)
+        if progress is not None:
+            progress(bytes_read[0], file_size)
+
+    try:
+        with open(file_path, newline='', encoding='utf-8-sig') as csvfile:
+            reader = csv.reader(lines(csvfile))
+            header = next(reader, None)
+            if header is None:
+                raise ValueError("CSV file is empty")
+            positions = _column_positions(header)
+
+            batch = []
+            for row in reader:
+                if not any(value.strip() for value in row):
+                    continue  # Skip blank lines
+
+                try:
+                    if len(row) < len(header):
+                        raise ValueError("Row has fewer columns than the header")
+                    batch.append(validate_trip(*(row[i] for i in positions)))
+                except ValueError as e:
+                    if error_writer is None:
+                        error_file = open(error_path, 'w', newline='', encoding='utf-8')
+                        error_writer = csv.writer(error_file)
+                        error_writer.writerow(["Line", "Error"] + header)
+                    error_writer.writerow([reader.line_num, str(e)] + row)
+                    rejected += 1
+                    continue
+
+                if len(batch) >= batch_size:
+                    insert(batch)
+                    imported += len(batch)
+                    batch = []
+
+            if batch:
+                insert(batch)
+                imported += len(batch)
+            elif progress is not None:
+                progress(bytes_read[0], file_size)
+    finally:
+        if error_file is not None:
+            error_file.close()
+
+    return imported, rejected, error_path if rejected else None
@@ -1,15 +1,42 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import sqlite3
 from tkcalendar import DateEntry
 from datetime import datetime
-import csv
 import os
+from collections import deque
+from database import get_db
+from paging import KeysetPager
+from background import QueryExecutor
+from formatting import format_amount, format_trip, format_trip_report_row, to_minor_units
+from export_jobs import ExportJobManager
+from trip_import import import_trips_from_csv
+from drivers import get_driver_cache
+from trip_filters import TripFilter
+from reports import TRIP_COLUMNS, TRIP_HEADERS
 
 class TripManagement:
-    def __init__(self, parent):
+    # Rows fetched per page, and how many pages the grid keeps loaded at once
+    PAGE_SIZE = 200
+    MAX_LOADED_PAGES = 5
+    
+    # Milliseconds to wait after the last keystroke before searching
+    SEARCH_DELAY = 250
+    
+    TRIP_COLUMNS = TRIP_COLUMNS
+    
+    def __init__(self, parent, executor=None, export_jobs=None):
         self.parent = parent
+        self.executor = executor or QueryExecutor(parent)
+        self.export_jobs = export_jobs or ExportJobManager(parent)
+        
+        # Window of trip pages currently shown in the grid
+        self.pager = None
+        self.pages = deque()
+        self.at_start = True
+        self.at_end = True
+        self.paging_scheduled = False
+        self.search_scheduled = None
         
         # Create the widgets
         self.create_widgets()
@@ -25,6 +52,9 @@ class TripManagement:
         control_frame = ttk.Frame(self.parent)
         control_frame.pack(fill=tk.X, padx=10, pady=5)
         
+        filter_frame = ttk.LabelFrame(self.parent, text="Filters")
+        filter_frame.pack(fill=tk.X, padx=10, pady=5)
+        
         table_frame = ttk.LabelFrame(self.parent, text="Trip Records")
         table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
@@ -41,7 +71,8 @@ class TripManagement:
         self.client_entry.grid(row=0, column=3, padx=5, pady=5, sticky=tk.W)
         
         ttk.Label(row1, text="Driver Name:").grid(row=0, column=4, padx=5, pady=5, sticky=tk.W)
-        self.driver_entry = ttk.Entry(row1, width=20)
+        self.driver_entry = ttk.Combobox(row1, width=20)
+        self.driver_entry.bind("<KeyRelease>", self.suggest_drivers)
         self.driver_entry.grid(row=0, column=5, padx=5, pady=5, sticky=tk.W)
         
         # Form widgets - Row 2
@@ -89,10 +120,77 @@ class TripManagement:
         self.driver_filter = ttk.Combobox(control_frame, width=20)
         self.driver_filter.pack(side=tk.LEFT, padx=5, pady=5)
         self.driver_filter.bind("<<ComboboxSelected>>", self.filter_trips)
+        self.driver_filter.bind("<KeyRelease>", self.suggest_drivers)
+        self.driver_filter.bind("<Return>", self.filter_trips)
+        
+        ttk.Label(control_frame, text="Search:").pack(side=tk.LEFT, padx=5, pady=5)
+        self.search_var = tk.StringVar()
+        self.search_entry = ttk.Entry(control_frame, width=25, textvariable=self.search_var)
+        self.search_entry.pack(side=tk.LEFT, padx=5, pady=5)
+        self.search_var.trace_add("write", self.schedule_search)
+        self.search_entry.bind("<Return>", self.filter_trips)
         
-        ttk.Button(control_frame, text="Reset Filter", command=self.load_trips).pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Button(control_frame, text="Reset Filter", command=self.reset_filters).pack(side=tk.LEFT, padx=5, pady=5)
         ttk.Button(control_frame, text="Export to CSV", command=self.export_to_csv).pack(side=tk.RIGHT, padx=5, pady=5)
         ttk.Button(control_frame, text="Export to PDF", command=self.export_to_pdf).pack(side=tk.RIGHT, padx=5, pady=5)
+        self.import_button = ttk.Button(control_frame, text="Import CSV", command=self.import_from_csv)
+        self.import_button.pack(side=tk.RIGHT, padx=5, pady=5)
+        self.import_status = ttk.Label(control_frame, text="")
+        self.import_status.pack(side=tk.RIGHT, padx=5, pady=5)
+        
+        # Filter widgets - Row 1
+        filter_row1 = ttk.Frame(filter_frame)
+        filter_row1.pack(fill=tk.X, padx=5, pady=2)
+        
+        ttk.Label(filter_row1, text="From:").pack(side=tk.LEFT, padx=5)
+        self.from_filter = DateEntry(filter_row1, width=12, background='darkblue', foreground='white', date_pattern='yyyy-mm-dd')
+        self.from_filter.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(filter_row1, text="To:").pack(side=tk.LEFT, padx=5)
+        self.to_filter = DateEntry(filter_row1, width=12, background='darkblue', foreground='white', date_pattern='yyyy-mm-dd')
+        self.to_filter.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(filter_row1, text="Client:").pack(side=tk.LEFT, padx=5)
+        self.client_filter = ttk.Entry(filter_row1, width=18)
+        self.client_filter.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(filter_row1, text="Cargo:").pack(side=tk.LEFT, padx=5)
+        self.cargo_filter = ttk.Entry(filter_row1, width=14)
+        self.cargo_filter.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(filter_row1, text="Route:").pack(side=tk.LEFT, padx=5)
+        self.route_filter = ttk.Entry(filter_row1, width=18)
+        self.route_filter.pack(side=tk.LEFT, padx=5)
+        
+        # Filter widgets - Row 2
+        filter_row2 = ttk.Frame(filter_frame)
+        filter_row2.pack(fill=tk.X, padx=5, pady=2)
+        
+        ttk.Label(filter_row2, text="Income from:").pack(side=tk.LEFT, padx=5)
+        self.min_income_filter = ttk.Entry(filter_row2, width=10)
+        self.min_income_filter.pack(side=tk.LEFT, padx=5)
+        ttk.Label(filter_row2, text="to:").pack(side=tk.LEFT)
+        self.max_income_filter = ttk.Entry(filter_row2, width=10)
+        self.max_income_filter.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(filter_row2, text="Expenses from:").pack(side=tk.LEFT, padx=5)
+        self.min_expenses_filter = ttk.Entry(filter_row2, width=10)
+        self.min_expenses_filter.pack(side=tk.LEFT, padx=5)
+        ttk.Label(filter_row2, text="to:").pack(side=tk.LEFT)
+        self.max_expenses_filter = ttk.Entry(filter_row2, width=10)
+        self.max_expenses_filter.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(filter_row2, text="Apply Filters", command=self.filter_trips).pack(side=tk.LEFT, padx=10)
+        
+        self.summary_label = ttk.Label(filter_row2, text="")
+        self.summary_label.pack(side=tk.RIGHT, padx=5)
+        
+        # Date filters start empty; Return in any filter field applies the filters
+        self.from_filter.delete(0, tk.END)
+        self.to_filter.delete(0, tk.END)
+        for entry in (self.from_filter, self.to_filter, self.client_filter, self.cargo_filter, self.route_filter,
+                      self.min_income_filter, self.max_income_filter, self.min_expenses_filter, self.max_expenses_filter):
+            entry.bind("<Return>", self.filter_trips)
         
         # Create treeview for trips
         columns = ("id", "date", "client", "cargo", "route", "income", "expenses", "driver")
@@ -118,85 +216,253 @@ class TripManagement:
         self.tree.column("expenses", width=100)
         self.tree.column("driver", width=120)
         
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscroll=scrollbar.set)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        # Add scrollbar, paging more trips in as it nears either end
+        self.scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscroll=self.on_tree_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.tree.pack(fill=tk.BOTH, expand=True)
         
         # Bind select event
         self.tree.bind("<<TreeviewSelect>>", self.on_select)
     
+    def trip_pager(self, where='', params=()):
+        """Create a pager over trips, newest first, with an optional filter"""
+        return KeysetPager(get_db(), "trips", self.TRIP_COLUMNS, key=("date", "id"),
+                           where=where, params=params, page_size=self.PAGE_SIZE)
+    
+    def show_trips(self, pager):
+        """Replace the grid contents with the first page of a pager"""
+        self.pager = pager
+        self.pages.clear()
+        self.tree.delete(*self.tree.get_children())
+        self.at_start = True
+        self.at_end = False
+        
+        self.fetch_page(pager.first_page, self.append_page)
+    
+    def fetch_page(self, fetch, on_page):
+        """Fetch and format a page of trips on a worker thread"""
+        self.paging_scheduled = True
+        
+        def work(task):
+            trips = fetch()
+            return trips, [format_trip(trip) for trip in trips]
+        
+        def done(page):
+            self.paging_scheduled = False
+            on_page(*page)
+        
+        def failed(e):
+            self.paging_scheduled = False
+            messagebox.showerror("Error", f"Failed to load trips: {str(e)}")
+        
+        # A newer page request (e.g. a changed filter) cancels this one
+        self.executor.submit("trip-page", work, on_result=done, on_error=failed)
+    
+    def append_page(self, trips, rows):
+        """Add a page below the loaded window, dropping the top page if the window is full"""
+        if len(trips) < self.pager.page_size:
+            self.at_end = True
+        if not trips:
+            return
+        
+        top, total = self.tree.yview()[0], len(self.tree.get_children())
+        
+        for trip, values in zip(trips, rows):
+            self.tree.insert("", tk.END, iid=str(trip[0]), values=values)
+        self.pages.append(trips)
+        
+        if len(self.pages) > self.MAX_LOADED_PAGES:
+            dropped = self.pages.popleft()
+            self.tree.delete(*[str(trip[0]) for trip in dropped])
+            self.at_start = False
+            
+            # Keep the same rows on screen after the rows above them went away
+            remaining = total + len(trips) - len(dropped)
+            self.tree.yview_moveto(max(top * total - len(dropped), 0) / max(remaining, 1))
+    
+    def prepend_page(self, trips, rows):
+        """Add a page above the loaded window, dropping the bottom page if the window is full"""
+        if len(trips) < self.pager.page_size:
+            self.at_start = True
+        if not trips:
+            return
+        
+        top, total = self.tree.yview()[0], len(self.tree.get_children())
+        
+        for index, (trip, values) in enumerate(zip(trips, rows)):
+            self.tree.insert("", index, iid=str(trip[0]), values=values)
+        self.pages.appendleft(trips)
+        
+        if len(self.pages) > self.MAX_LOADED_PAGES:
+            dropped = self.pages.pop()
+            self.tree.delete(*[str(trip[0]) for trip in dropped])
+            self.at_end = False
+        
+        # Keep the same rows on screen after rows were inserted above them
+        remaining = len(self.tree.get_children())
+        self.tree.yview_moveto((top * total + len(trips)) / max(remaining, 1))
+    
+    def on_tree_scroll(self, first, last):
+        """Keep the scrollbar in sync and page in more trips near either end"""
+        self.scrollbar.set(first, last)
+        
+        if self.pager is None or self.paging_scheduled or not self.pages:
+            return
+        
+        pager = self.pager
+        if float(last) > 0.9 and not self.at_end:
+            key = pager.row_key(self.pages[-1][-1])
+            self.fetch_page(lambda: pager.page_after(key), self.append_page)
+        elif float(first) < 0.1 and not self.at_start:
+            key = pager.row_key(self.pages[0][0])
+            self.fetch_page(lambda: pager.page_before(key), self.prepend_page)
+    
     def load_trips(self):
-        """Load all trips from the database"""
-        # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        """Load the newest trips; older ones are paged in while scrolling"""
+        # Get the first page of trips
+        self.show_trips(self.trip_pager())
+        self.load_summary(TripFilter())
+        
+        # Load drivers for filter from the driver cache
+        self.executor.submit(
+            "trip-drivers",
+            lambda task: get_driver_cache().names(),
+            on_result=lambda drivers: self.driver_filter.configure(values=drivers),
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to load trips: {str(e)}"))
+    
+    def suggest_drivers(self, event):
+        """Offer the drivers whose names start with what has been typed"""
+        if event.keysym in ("Return", "Up", "Down", "Escape", "Tab"):
+            return
+        
+        combobox = event.widget
+        combobox.configure(values=get_driver_cache().complete(combobox.get()))
+    
+    def build_filter(self):
+        """Read the filter widgets into a TripFilter, or show an error and return None"""
+        def date(entry):
+            text = entry.get().strip()
+            if text:
+                datetime.strptime(text, '%Y-%m-%d')  # ValueError is reported below
+            return text or None
+        
+        def amount(entry):
+            text = entry.get().strip()
+            return to_minor_units(text) if text else None
         
         try:
-            # Connect to the database
-            conn = sqlite3.connect('easylogipro.db')
-            cursor = conn.cursor()
-            
-            # Get all trips
-            cursor.execute("SELECT * FROM trips ORDER BY date DESC")
-            trips = cursor.fetchall()
-            
-            # Add trips to treeview
-            for trip in trips:
-                trip_id, date, client, cargo, route, income, expenses, driver = trip
-                
-                income_formatted = f"{float(income):.2f}"
-                expenses_formatted = f"{float(expenses):.2f}"
-                
-                self.tree.insert("", tk.END, values=(trip_id, date, client, cargo, route, 
-                                                   income_formatted, expenses_formatted, driver))
-            
-            # Load drivers for filter
-            cursor.execute("SELECT DISTINCT driver_name FROM trips ORDER BY driver_name")
-            drivers = [row[0] for row in cursor.fetchall()]
-            self.driver_filter['values'] = drivers
-            
-            conn.close()
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load trips: {str(e)}")
+            date_from = date(self.from_filter)
+            date_to = date(self.to_filter)
+        except ValueError:
+            messagebox.showerror("Validation Error", "Dates must be in YYYY-MM-DD format!")
+            return None
+        
+        try:
+            bounds = [amount(entry) for entry in (self.min_income_filter, self.max_income_filter,
+                                                  self.min_expenses_filter, self.max_expenses_filter)]
+        except ValueError:
+            messagebox.showerror("Validation Error", "Income and expense bounds must be valid numbers!")
+            return None
+        
+        return TripFilter(date_from=date_from, date_to=date_to, driver=self.driver_filter.get() or None,
+                          client=self.client_filter.get().strip() or None,
+                          cargo=self.cargo_filter.get().strip() or None,
+                          route=self.route_filter.get().strip() or None,
+                          min_income=bounds[0], max_income=bounds[1],
+                          min_expenses=bounds[2], max_expenses=bounds[3],
+                          search=self.search_var.get())
     
     def filter_trips(self, event=None):
-        """Filter trips by driver"""
-        selected_driver = self.driver_filter.get()
+        """Show the trips matching every filter, with their count and totals"""
+        if self.search_scheduled is not None:
+            self.parent.after_cancel(self.search_scheduled)
+            self.search_scheduled = None
         
-        if not selected_driver:
-            self.load_trips()
+        trip_filter = self.build_filter()
+        if trip_filter is None:
             return
         
-        try:
-            # Clear existing items
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-            
-            # Connect to the database
-            conn = sqlite3.connect('easylogipro.db')
-            cursor = conn.cursor()
-            
-            # Get filtered trips
-            cursor.execute("SELECT * FROM trips WHERE driver_name=? ORDER BY date DESC", (selected_driver,))
-            trips = cursor.fetchall()
+        # Get the first page of filtered trips
+        self.show_trips(self.trip_pager(*trip_filter.where()))
+        self.load_summary(trip_filter)
+    
+    def load_summary(self, trip_filter):
+        """Count and total the matching trips in one query on a worker thread"""
+        def show_summary(row):
+            count, income, expenses = row
+            self.summary_label.config(
+                text=f"{count:,} trips | Income: {format_amount(income)} | Expenses: {format_amount(expenses)}"
+                     f" | Net: {format_amount(income - expenses)}")
+        
+        self.executor.submit(
+            "trip-summary", lambda task: get_db().query_one(*trip_filter.summary_query()),
+            on_result=show_summary,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to total trips: {str(e)}"))
+    
+    def schedule_search(self, *args):
+        """Search once typing pauses rather than on every keystroke"""
+        if self.search_scheduled is not None:
+            self.parent.after_cancel(self.search_scheduled)
+        self.search_scheduled = self.parent.after(self.SEARCH_DELAY, self.filter_trips)
+    
+    def reset_filters(self):
+        """Clear every filter and the search box and show all trips"""
+        self.driver_filter.set("")
+        for entry in (self.from_filter, self.to_filter, self.client_filter, self.cargo_filter, self.route_filter,
+                      self.min_income_filter, self.max_income_filter, self.min_expenses_filter, self.max_expenses_filter):
+            entry.delete(0, tk.END)
+        self.search_var.set("")
+        
+        # Clearing the box schedules a search; the full reload below replaces it
+        if self.search_scheduled is not None:
+            self.parent.after_cancel(self.search_scheduled)
+            self.search_scheduled = None
+        self.load_trips()
+    
+    # Import from CSV
+    def import_from_csv(self):
+        """Bulk import trips from a CSV file"""
+        file_path = filedialog.askopenfilename(
+            filetypes=[("CSV files", "*.csv")],
+            title="Import Trips"
+        )
+        
+        if not file_path:
+            return  # User cancelled
+        
+        def show_progress(value):
+            done, total = value
+            self.import_status.config(text=f"Importing... {done * 100 // total if total else 0}%")
+        
+        def done(result):
+            imported, rejected, error_path = result
+            self.import_button.config(state=tk.NORMAL)
+            self.import_status.config(text="")
             
-            # Add trips to treeview
-            for trip in trips:
-                trip_id, date, client, cargo, route, income, expenses, driver = trip
-                
-                income_formatted = f"{float(income):.2f}"
-                expenses_formatted = f"{float(expenses):.2f}"
-                
-                self.tree.insert("", tk.END, values=(trip_id, date, client, cargo, route, 
-                                                   income_formatted, expenses_formatted, driver))
+            # Refresh the grid and driver list once for the whole import
+            self.load_trips()
             
-            conn.close()
+            message = f"{imported:,} trips imported."
+            if rejected:
+                message += f"\n{rejected:,} rows were rejected; see {error_path} for details."
+            messagebox.showinfo("Import Complete", message)
+        
+        def failed(e):
+            self.import_button.config(state=tk.NORMAL)
+            self.import_status.config(text="")
             
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to filter trips: {str(e)}")
+            # Batches committed before the failure are already in the table
+            self.load_trips()
+            messagebox.showerror("Import Error", f"Failed to import trips: {str(e)}")
+        
+        self.import_button.config(state=tk.DISABLED)
+        
+        # Validate and insert the rows in batched transactions on a worker thread
+        self.executor.submit(
+            "trip-import",
+            lambda task: import_trips_from_csv(get_db(), file_path, progress=lambda done, total: task.report_progress((done, total))),
+            on_result=done, on_error=failed, on_progress=show_progress)
     
     # Export to CSV
     def export_to_csv(self):
@@ -212,21 +478,16 @@ class TripManagement:
             if not file_path:
                 return  # User cancelled
             
-            # Get data from treeview
-            trip_data = []
-            
-            headers = ["ID", "Date", "Client", "Cargo Type", "Route", "Income (TZS)", "Expenses (TZS)", "Driver"]
-            trip_data.append(headers)
+            headers = TRIP_HEADERS
+            sql, params = self.pager.query()
+            count_sql, count_params = self.pager.count_query()
             
-            for item_id in self.tree.get_children():
-                trip_data.append(self.tree.item(item_id, "values"))
-            
-            # Write to CSV
-            with open(file_path, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerows(trip_data)
-                
-            messagebox.showinfo("Export Successful", f"Trip data exported to {file_path}")
+            # Stream every trip matching the current filter from a worker process
+            self.export_jobs.submit(
+                "csv", "Trip Report (CSV)", file_path, sql, params, headers,
+                count_sql=count_sql, count_params=count_params, format_row=format_trip,
+                on_done=lambda count: messagebox.showinfo("Export Successful", f"{count:,} trips exported to {file_path}"),
+                on_error=lambda e: messagebox.showerror("Export Error", f"Failed to export data: {str(e)}"))
             
         except Exception as e:
             messagebox.showerror("Export Error", f"Failed to export data: {str(e)}")
@@ -235,10 +496,7 @@ class TripManagement:
     def export_to_pdf(self):
         """Export trip data to PDF file"""
         try:
-            from reportlab.lib import colors
             from reportlab.lib.pagesizes import landscape, letter
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet
             
             # Ask user for save location
             file_path = filedialog.asksaveasfilename(
@@ -250,45 +508,17 @@ class TripManagement:
             if not file_path:
                 return  # User cancelled
             
-            # Create PDF document
-            doc = SimpleDocTemplate(file_path, pagesize=landscape(letter))
-            elements = []
-            
-            # Add title
-            styles = getSampleStyleSheet()
-            title = Paragraph("Trip Report", styles['Title'])
-            date_text = Paragraph(f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal'])
-            elements.append(title)
-            elements.append(date_text)
-            elements.append(Spacer(1, 20))
-            
-            # Prepare data
-            data = [["Date", "Client", "Cargo Type", "Route", "Income (TZS)", "Expenses (TZS)", "Driver"]]
-            
-            for item_id in self.tree.get_children():
-                values = self.tree.item(item_id, "values")
-                data.append(values[1:])  # Skip ID column
-            
-            # Create table
-            table = Table(data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('ALIGN', (4, 1), (5, -1), 'RIGHT'),  # Align income and expenses columns right
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('BOX', (0, 0), (-1, -1), 2, colors.black),
-            ]))
-            
-            elements.append(table)
-            
-            # Build PDF
-            doc.build(elements)
+            headers = ["Date", "Client", "Cargo Type", "Route", "Income (TZS)", "Expenses (TZS)", "Driver"]
+            sql, params = self.pager.query()
+            count_sql, count_params = self.pager.count_query()
             
-            messagebox.showinfo("Export Successful", f"Trip data exported to {file_path}")
+            # Lay out the trips page by page in a worker process, subtotalling income and expenses
+            self.export_jobs.submit(
+                "pdf", "Trip Report", file_path, sql, params, headers,
+                count_sql=count_sql, count_params=count_params, format_row=format_trip_report_row,
+                col_widths=[2, 3, 2, 4, 2, 2, 3], subtotals={4: 5, 5: 6}, pagesize=landscape(letter),
+                on_done=lambda count: messagebox.showinfo("Export Successful", f"{count:,} trips exported to {file_path}"),
+                on_error=lambda e: messagebox.showerror("Export Error", f"Failed to export data: {str(e)}"))
             
         except ImportError:
             messagebox.showerror("Missing Library", "ReportLab is required for PDF export. Please install it with 'pip install reportlab'")
@@ -1,12 +1,17 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
 from tkcalendar import DateEntry
+from database import get_db
+from formatting import format_maintenance_record, to_day_number, to_minor_units
+from reports import MAINTENANCE_QUERY
+from background import QueryExecutor
+from treeview_utils import upsert_row, remove_row
 
 class VehicleMaintenance:
-    def __init__(self, parent):
+    def __init__(self, parent, executor=None):
         self.parent = parent
+        self.executor = executor or QueryExecutor(parent)
         
         # Create widgets
         self.create_widgets()
@@ -66,6 +71,9 @@ class VehicleMaintenance:
         self.clear_button = ttk.Button(button_frame, text="Clear Form", command=self.clear_form)
         self.clear_button.pack(side=tk.LEFT, padx=5, pady=5)
         
+        self.refresh_button = ttk.Button(button_frame, text="Refresh", command=self.load_maintenance_records)
+        self.refresh_button.pack(side=tk.RIGHT, padx=5, pady=5)
+        
         # Create Treeview
         columns = ("id", "vehicle_plate_number", "service_date", "description", "cost")
         self.tree = ttk.Treeview(table_frame, columns=columns, show="headings", selectmode="browse")
@@ -102,22 +110,33 @@ class VehicleMaintenance:
         for item in self.tree.get_children():
             self.tree.delete(item)
         
-        # Connect to the database
-        conn = sqlite3.connect('easylogipro.db')
-        cursor = conn.cursor()
-        
-        # Get all records ordered by date
-        cursor.execute("SELECT * FROM maintenance ORDER BY service_date DESC")
-        records = cursor.fetchall()
-        
-        # Add records to treeview
-        for record in records:
-            record_id, plate, date, description, cost = record
-            cost_formatted = f"{float(cost):.2f}"
+        def fetch_records(task):
+            # Get all records ordered by date
+            rows = get_db().iterate(MAINTENANCE_QUERY)
             
-            self.tree.insert("", tk.END, values=(record_id, plate, date, description, cost_formatted))
+            for record in rows:
+                yield self.format_record(record)
+        
+        def add_records(rows):
+            # Add records to treeview
+            for values in rows:
+                # A record saved while the load runs is already shown, up to date
+                if not self.tree.exists(str(values[0])):
+                    self.tree.insert("", tk.END, iid=str(values[0]), values=values)
         
-        conn.close()
+        # Query and format on a worker thread, filling the tree in batches
+        self.executor.submit(
+            "maintenance", fetch_records, on_batch=add_records,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to load maintenance records: {str(e)}"))
+    
+    def format_record(self, record):
+        return format_maintenance_record(record)
+    
+    def show_record(self, record):
+        """Insert or move a single record to its place in the tree"""
+        values = self.format_record(record)
+        upsert_row(self.tree, str(values[0]), values,
+                   sort_key=lambda row: (str(row[2]), int(row[0])), descending=True)
     
     def clear_form(self):
         self.plate_entry.delete(0, tk.END)
@@ -138,11 +157,17 @@ class VehicleMaintenance:
             
             # Check if cost is a valid number
             try:
-                float(self.cost_entry.get())
+                to_minor_units(self.cost_entry.get())
             except ValueError:
                 messagebox.showerror("Validation Error", "Cost must be a valid number!")
                 return False
             
+            try:
+                to_day_number(self.date_entry.get())
+            except ValueError as e:
+                messagebox.showerror("Validation Error", str(e))
+                return False
+            
             return True
         except Exception as e:
             messagebox.showerror("Error", f"Validation error: {str(e)}")
@@ -155,25 +180,18 @@ class VehicleMaintenance:
         try:
             # Get values from form
             plate = self.plate_entry.get()
-            date = self.date_entry.get()
+            date = to_day_number(self.date_entry.get())
             description = self.description_entry.get()
-            cost = float(self.cost_entry.get())
-            
-            # Connect to database
-            conn = sqlite3.connect('easylogipro.db')
-            cursor = conn.cursor()
+            cost = to_minor_units(self.cost_entry.get())
             
             # Insert new record
-            cursor.execute('''
+            record_id = get_db().execute('''
             INSERT INTO maintenance (vehicle_plate_number, service_date, description, cost)
             VALUES (?, ?, ?, ?)
             ''', (plate, date, description, cost))
             
-            conn.commit()
-            conn.close()
-            
-            # Refresh records and clear form
-            self.load_maintenance_records()
+            # Show the new record and clear form
+            self.show_record((record_id, plate, date, description, cost))
             self.clear_form()
             messagebox.showinfo("Success", "Maintenance record added successfully!")
             
@@ -217,31 +235,24 @@ class VehicleMaintenance:
             
             # Get updated values
             plate = self.plate_entry.get()
-            date = self.date_entry.get()
+            date = to_day_number(self.date_entry.get())
             description = self.description_entry.get()
-            cost = float(self.cost_entry.get())
+            cost = to_minor_units(self.cost_entry.get())
             
             # Confirm update
             confirm = messagebox.askyesno("Confirm Update", "Are you sure you want to update this maintenance record?")
             if not confirm:
                 return
             
-            # Connect to database
-            conn = sqlite3.connect('easylogipro.db')
-            cursor = conn.cursor()
-            
             # Update record
-            cursor.execute('''
+            get_db().execute('''
             UPDATE maintenance
             SET vehicle_plate_number=?, service_date=?, description=?, cost=?
             WHERE id=?
             ''', (plate, date, description, cost, record_id))
             
-            conn.commit()
-            conn.close()
-            
-            # Refresh records and clear form
-            self.load_maintenance_records()
+            # Update the record in place and clear form
+            self.show_record((record_id, plate, date, description, cost))
             self.clear_form()
             messagebox.showinfo("Success", "Maintenance record updated successfully!")
             
@@ -259,18 +270,11 @@ class VehicleMaintenance:
             if not confirm:
                 return
             
-            # Connect to database
-            conn = sqlite3.connect('easylogipro.db')
-            cursor = conn.cursor()
-            
             # Delete record
-            cursor.execute("DELETE FROM maintenance WHERE id=?", (record_id,))
-            
-            conn.commit()
-            conn.close()
+            get_db().execute("DELETE FROM maintenance WHERE id=?", (record_id,))
             
-            # Refresh records and clear form
-            self.load_maintenance_records()
+            # Remove the record from the tree and clear form
+            remove_row(self.tree, selected_item)
             self.clear_form()
             messagebox.showinfo("Success", "Maintenance record deleted successfully!")
             